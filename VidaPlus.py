@@ -17,7 +17,7 @@ Data: 2024
 """
 
 # Importações necessárias do Flask e extensões
-from flask import Flask, Blueprint, request, jsonify
+from flask import Flask, Blueprint, Response, request, jsonify, current_app, send_file
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, JWTManager
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
@@ -26,11 +26,45 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta, timezone, date
 from dotenv import load_dotenv
+from functools import wraps
+import click
+import csv
 import os
 import re
 import json
 import uuid
-from sqlalchemy import func, and_, extract
+import zlib
+import gzip
+import socket
+import base64
+import hmac
+import hashlib
+import time
+import queue
+import bisect
+import itertools
+import threading
+import unicodedata
+from sqlalchemy import func, and_, extract, text, case, event
+from sqlalchemy.orm import joinedload, Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.orm.attributes import set_committed_value
+
+# NumPy é opcional: usado apenas pelas análises de utilização da agenda
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# PyArrow é opcional: com ele os snapshots para BI são gravados em Parquet;
+# sem ele, em arquivos .npz compactados (NumPy)
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
 
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -76,6 +110,7 @@ class Paciente(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
     cpf = db.Column(db.String(14), unique=True, nullable=False)
+    cpf_numero = db.Column(db.BigInteger, unique=True, index=True)  # CPF apenas com dígitos, usado nas buscas
     nome = db.Column(db.String(100), nullable=False)
     data_nascimento = db.Column(db.Date, nullable=False)
     sexo = db.Column(db.String(1), nullable=False)  # M, F, O
@@ -85,6 +120,13 @@ class Paciente(db.Model):
     alergias = db.Column(db.Text)
     medicamentos_uso = db.Column(db.Text)
     historico_familiar = db.Column(db.Text)
+    excluido_em = db.Column(db.DateTime)  # exclusão lógica (DELETE ?modo=logica)
+    
+    # Índice parcial: a listagem (ordenada por nome) só percorre pacientes não excluídos
+    __table_args__ = (
+        db.Index('ix_pacientes_ativos_nome', 'nome',
+                 sqlite_where=text('excluido_em IS NULL'), postgresql_where=text('excluido_em IS NULL')),
+    )
     
     # Relacionamentos
     usuario = db.relationship('Usuario', backref='paciente', uselist=False)
@@ -108,6 +150,12 @@ class Profissional(db.Model):
     email_profissional = db.Column(db.String(120))
     data_admissao = db.Column(db.Date, default=datetime.utcnow().date)
     ativo = db.Column(db.Boolean, default=True)
+    excluido_em = db.Column(db.DateTime)  # exclusão lógica (DELETE ?modo=logica)
+    
+    __table_args__ = (
+        db.Index('ix_profissionais_ativos_nome', 'nome',
+                 sqlite_where=text('excluido_em IS NULL'), postgresql_where=text('excluido_em IS NULL')),
+    )
     
     # Relacionamentos
     usuario = db.relationship('Usuario', backref='profissional', uselist=False)
@@ -152,6 +200,18 @@ class Consulta(db.Model):
     status = db.Column(db.String(20), default='agendada')
     observacoes = db.Column(db.Text)
     link_telemedicina = db.Column(db.String(255))
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Índices: o primeiro cobre os relatórios por período (data_hora + colunas
+    # agrupadas), permitindo agregar lendo apenas o índice; os de atualizado_em
+    # atendem a sincronização incremental (?modified_since=)
+    __table_args__ = (
+        db.Index('ix_consultas_data_hora', 'data_hora', 'profissional_id', 'unidade_id', 'status'),
+        db.Index('ix_consultas_profissional_data', 'profissional_id', 'data_hora'),
+        db.Index('ix_consultas_unidade_data', 'unidade_id', 'data_hora'),
+        db.Index('ix_consultas_atualizado_em', 'atualizado_em'),
+        db.Index('ix_consultas_paciente_atualizado_em', 'paciente_id', 'atualizado_em'),
+    )
     
     # Relacionamentos removidos - tabelas não utilizadas
     
@@ -176,14 +236,90 @@ class Prescricao(db.Model):
     duracao = db.Column(db.String(50))
     observacoes = db.Column(db.Text)
     status = db.Column(db.String(20), default='ativa')
+    data_fim = db.Column(db.DateTime)  # calculada da duração (veja definir_data_fim); nula = uso contínuo
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_prescricoes_data_profissional', 'data_prescricao', 'profissional_id'),
+        # Prescrições vigentes de um paciente (?ativas_em=) e encerramento das vencidas
+        db.Index('ix_prescricoes_paciente_data_fim', 'paciente_id', 'data_fim'),
+        db.Index('ix_prescricoes_status_data_fim', 'status', 'data_fim'),
+        db.Index('ix_prescricoes_atualizado_em', 'atualizado_em'),
+        db.Index('ix_prescricoes_paciente_atualizado_em', 'paciente_id', 'atualizado_em'),
+    )
     
     def __repr__(self):
         return f'<Prescricao {self.paciente.nome} - {self.data_prescricao}>'
 
+class Medicamento(db.Model):
+    """Catálogo de medicamentos, extraído do texto livre de prescrições e pacientes (veja extrair_medicamentos)"""
+    
+    __tablename__ = 'medicamentos'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(100), unique=True, nullable=False)  # normalizado: sem acentos, minúsculas, sem dose
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+
+class PrescricaoMedicamento(db.Model):
+    """Vínculo prescrição-medicamento; paciente_id é copiado da prescrição para a busca reversa usar só o índice"""
+    
+    __tablename__ = 'prescricoes_medicamentos'
+    __table_args__ = (
+        db.Index('ix_prescricoes_medicamentos_medicamento_paciente', 'medicamento_id', 'paciente_id'),
+    )
+    
+    prescricao_id = db.Column(db.Integer, db.ForeignKey('prescricoes.id'), primary_key=True)
+    medicamento_id = db.Column(db.Integer, db.ForeignKey('medicamentos.id'), primary_key=True)
+    paciente_id = db.Column(db.Integer, nullable=False)
+
+class PacienteMedicamento(db.Model):
+    """Vínculo paciente-medicamento a partir de pacientes.medicamentos_uso (uso declarado no cadastro)"""
+    
+    __tablename__ = 'pacientes_medicamentos'
+    __table_args__ = (
+        db.Index('ix_pacientes_medicamentos_medicamento_paciente', 'medicamento_id', 'paciente_id'),
+    )
+    
+    paciente_id = db.Column(db.Integer, db.ForeignKey('pacientes.id'), primary_key=True)
+    medicamento_id = db.Column(db.Integer, db.ForeignKey('medicamentos.id'), primary_key=True)
+
 # Tabela Telemedicina removida - não utilizada no sistema atual
 
+class ResumoConsultaDiario(db.Model):
+    """Totais diários de consultas, mantidos na mesma transação das escritas em consultas"""
+    
+    __tablename__ = 'resumo_consultas_diario'
+    
+    dia = db.Column(db.Date, primary_key=True)
+    unidade_id = db.Column(db.Integer, primary_key=True)
+    profissional_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    tipo = db.Column(db.String(20), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ResumoConsultaDiario {self.dia} - {self.status}: {self.total}>'
+
+class ResumoPrescricaoDiario(db.Model):
+    """Totais diários de prescrições por profissional"""
+    
+    __tablename__ = 'resumo_prescricoes_diario'
+    
+    dia = db.Column(db.Date, primary_key=True)
+    profissional_id = db.Column(db.Integer, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ResumoPrescricaoDiario {self.dia}: {self.total}>'
+
 class Auditoria(db.Model):
-    """Modelo para logs de auditoria"""
+    """
+    Modelo para logs de auditoria (tabela original, não particionada).
+    
+    Novos registros são gravados nos segmentos mensais auditoria_AAAAMM
+    (veja registrar_auditoria); esta tabela só recebe dados de versões
+    anteriores, migrados para os segmentos na inicialização.
+    """
     
     __tablename__ = 'auditoria'
     
@@ -203,10 +339,26 @@ class Auditoria(db.Model):
     def __repr__(self):
         return f'<Auditoria {self.usuario.email} - {self.acao} - {self.tabela}>'
 
+class Sequencia(db.Model):
+    """
+    Contadores persistidos: o último id de auditoria emitido (não depende das
+    linhas que sobrevivem a migrações e purgas, então nunca volta) e a versão
+    das regras com que dados derivados foram calculados (veja versao_gravada).
+    """
+    
+    __tablename__ = 'sequencias'
+    
+    nome = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.BigInteger, nullable=False, default=0)
+
 class Notificacao(db.Model):
     """Modelo para notificações do sistema"""
     
     __tablename__ = 'notificacoes'
+    __table_args__ = (
+        # Lista de notificações e contagem de não lidas por usuário
+        db.Index('ix_notificacoes_usuario_lida_data', 'usuario_id', 'lida', 'data_criacao'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
@@ -222,30 +374,428 @@ class Notificacao(db.Model):
     def __repr__(self):
         return f'<Notificacao {self.usuario.email} - {self.titulo}>'
 
+class NotificacoesNaoLidas(db.Model):
+    """Contador de notificações não lidas por usuário (mantido na criação e na leitura)"""
+    
+    __tablename__ = 'notificacoes_nao_lidas'
+    
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+class LembreteEnviado(db.Model):
+    """Lembretes de consulta já enviados (garante um único envio por consulta, tipo e horário)"""
+    
+    __tablename__ = 'lembretes_enviados'
+    
+    consulta_id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(10), primary_key=True)  # 24h, 1h
+    data_hora_consulta = db.Column(db.DateTime, primary_key=True)
+    data_envio = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Lideranca(db.Model):
+    """Leases de liderança: apenas um processo executa cada tarefa exclusiva por vez"""
+    
+    __tablename__ = 'liderancas'
+    
+    nome = db.Column(db.String(50), primary_key=True)
+    dono = db.Column(db.String(100), nullable=False)
+    expira_em = db.Column(db.DateTime, nullable=False)
+
+class TarefaRelatorio(db.Model):
+    """Fila persistente de relatórios e exportações executados em segundo plano"""
+    
+    __tablename__ = 'tarefas_relatorio'
+    __table_args__ = (
+        db.Index('ix_tarefas_relatorio_status', 'status', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    tipo = db.Column(db.String(30), nullable=False)  # consultas, cancelamentos, prescricoes, heatmap, consultas_csv
+    parametros = db.Column(db.Text)  # JSON
+    status = db.Column(db.String(20), default='pendente')  # pendente, executando, concluida, erro, expirada
+    progresso = db.Column(db.Integer, default=0)  # 0 a 100
+    arquivo = db.Column(db.String(255))
+    tipo_conteudo = db.Column(db.String(50))
+    tamanho = db.Column(db.BigInteger)
+    erro = db.Column(db.Text)
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    data_inicio = db.Column(db.DateTime)
+    data_conclusao = db.Column(db.DateTime)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    expira_em = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<TarefaRelatorio {self.id} - {self.tipo} - {self.status}>'
+
+class Alteracao(db.Model):
+    """
+    Feed de alterações para sincronização incremental: uma linha por escrita
+    em pacientes, profissionais, consultas e prescricoes, gravada na mesma
+    transação (veja registrar_alteracoes). O id é a sequência do feed.
+    """
+    
+    __tablename__ = 'alteracoes'
+    __table_args__ = {'sqlite_autoincrement': True}  # ids não são reutilizados após a retenção
+    
+    id = db.Column(db.Integer, primary_key=True)
+    tabela = db.Column(db.String(50), nullable=False)
+    registro_id = db.Column(db.Integer, nullable=False)
+    operacao = db.Column(db.String(10), nullable=False)  # INSERT, UPDATE, DELETE
+    data_hora = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Alteracao {self.id} - {self.operacao} {self.tabela} {self.registro_id}>'
+
+class RegistroExcluido(db.Model):
+    """Tombstones de consultas e prescrições excluídas, para a sincronização incremental (?modified_since=)"""
+    
+    __tablename__ = 'registros_excluidos'
+    __table_args__ = (
+        db.Index('ix_registros_excluidos_paciente', 'tabela', 'paciente_id', 'data_exclusao'),
+        db.Index('ix_registros_excluidos_data', 'tabela', 'data_exclusao'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    tabela = db.Column(db.String(50), nullable=False)
+    registro_id = db.Column(db.Integer, nullable=False)
+    paciente_id = db.Column(db.Integer)
+    profissional_id = db.Column(db.Integer)
+    data_exclusao = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class RespostaIdempotente(db.Model):
+    """Respostas de criações feitas com Idempotency-Key, devolvidas novamente nas repetições (veja idempotente)"""
+    
+    __tablename__ = 'respostas_idempotentes'
+    __table_args__ = (
+        db.UniqueConstraint('usuario_id', 'chave', name='uq_respostas_idempotentes_chave'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, nullable=False)
+    chave = db.Column(db.String(255), nullable=False)
+    impressao = db.Column(db.String(64), nullable=False)  # SHA-256 do método, caminho e corpo
+    status = db.Column(db.String(20), nullable=False, default='processando')  # processando, concluida
+    codigo_http = db.Column(db.Integer)
+    corpo = db.Column(db.Text)
+    tipo_conteudo = db.Column(db.String(100))
+    data_criacao = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expira_em = db.Column(db.DateTime, nullable=False)
+
 # =============================================================================
 # FUNÇÕES UTILITÁRIAS
 # =============================================================================
 
 def registrar_auditoria(usuario_id, acao, tabela, registro_id=None, dados_anteriores=None, dados_novos=None):
-    """Função utilitária para registrar ações de auditoria"""
+    """Função utilitária para registrar ações de auditoria (no segmento do mês corrente)"""
     try:
         ip = request.remote_addr
-        auditoria = Auditoria(
+        data_hora = datetime.utcnow()
+        segmento = garantir_segmento_auditoria(nome_segmento_auditoria(data_hora))
+        db.session.execute(segmento.insert().values(
             usuario_id=usuario_id,
             acao=acao,
             tabela=tabela,
+            id=proximo_id_auditoria(),
             registro_id=registro_id,
             dados_anteriores=dados_anteriores,
             dados_novos=dados_novos,
             ip=ip,
-            data_hora=datetime.utcnow()
-        )
-        db.session.add(auditoria)
+            data_hora=data_hora
+        ))
         db.session.commit()
     except Exception as e:
         print(f"Erro ao registrar auditoria: {e}")
         db.session.rollback()
 
+def diferencas_pendentes(objeto):
+    """
+    Campos do objeto alterados e ainda não gravados, a partir do histórico de
+    atributos do SQLAlchemy. Atribuir o mesmo valor não conta como alteração.
+    Retorna (anteriores, novos), dois dicionários com apenas os campos alterados.
+    """
+    estado = db.inspect(objeto)
+    anteriores, novos = {}, {}
+    for coluna in estado.mapper.column_attrs:
+        historico = estado.attrs[coluna.key].history
+        if historico.has_changes():
+            anteriores[coluna.key] = historico.deleted[0] if historico.deleted else None
+            novos[coluna.key] = historico.added[0] if historico.added else None
+    return anteriores, novos
+
+def json_auditoria(dados):
+    return json.dumps(dados, default=lambda valor: valor.isoformat())
+
+TABELAS_FEED_ALTERACOES = ('pacientes', 'profissionais', 'consultas', 'prescricoes')
+
+@event.listens_for(Session, 'after_flush')
+def registrar_alteracoes(sessao, contexto):
+    """
+    Grava no feed (tabela alteracoes) as escritas do flush nas tabelas do
+    feed, na mesma transação: o feed nunca registra escrita desfeita nem
+    perde escrita confirmada. Atualizações em massa (query.update/delete)
+    não passam por aqui e precisam registrar suas alterações.
+    """
+    linhas = []
+    agora = datetime.utcnow()
+    for operacao, objetos in (('INSERT', sessao.new), ('UPDATE', sessao.dirty), ('DELETE', sessao.deleted)):
+        for objeto in objetos:
+            tabela = getattr(objeto, '__tablename__', None)
+            if tabela not in TABELAS_FEED_ALTERACOES:
+                continue
+            tipo = operacao
+            if operacao == 'UPDATE':
+                if not sessao.is_modified(objeto, include_collections=False):
+                    continue
+                # Exclusão lógica: para os consumidores o registro deixou de existir
+                if getattr(objeto, 'excluido_em', None) is not None and db.inspect(objeto).attrs.excluido_em.history.added:
+                    tipo = 'DELETE'
+            linhas.append({'tabela': tabela, 'registro_id': objeto.id, 'operacao': tipo, 'data_hora': agora})
+    if linhas:
+        sessao.connection().execute(Alteracao.__table__.insert(), linhas)
+
+def registrar_alteracoes_em_massa(tabela, ids, operacao):
+    """Registra no feed escritas feitas com UPDATE/DELETE em massa, que não passam pelo flush do ORM"""
+    agora = datetime.utcnow()
+    if ids:
+        db.session.execute(Alteracao.__table__.insert(), [
+            {'tabela': tabela, 'registro_id': registro_id, 'operacao': operacao, 'data_hora': agora}
+            for registro_id in ids
+        ])
+
+@event.listens_for(Session, 'after_flush')
+def registrar_exclusoes(sessao, contexto):
+    """Grava os tombstones das consultas e prescrições excluídas no flush, na mesma transação"""
+    agora = datetime.utcnow()
+    linhas = [{
+        'tabela': objeto.__tablename__,
+        'registro_id': objeto.id,
+        'paciente_id': objeto.paciente_id,
+        'profissional_id': objeto.profissional_id,
+        'data_exclusao': agora
+    } for objeto in sessao.deleted if isinstance(objeto, (Consulta, Prescricao))]
+    if linhas:
+        sessao.connection().execute(RegistroExcluido.__table__.insert(), linhas)
+
+# Os payloads (dados_anteriores/dados_novos) são gravados comprimidos com
+# deflate e um dicionário compartilhado com os trechos de JSON mais comuns da
+# auditoria: payloads curtos, que o zlib sozinho quase não reduz, caem para
+# cerca de um terço. O primeiro byte indica a versão do dicionário. O
+# resultado é gravado em base64, com o prefixo PREFIXO_PAYLOAD_COMPRIMIDO, na
+# mesma coluna de texto de antes: nenhum banco precisa migrar o tipo da coluna,
+# e os payloads em texto gravados antes da compressão continuam legíveis.
+DICIONARIOS_AUDITORIA = {
+    1: (
+        '{"senha_hash": "***"}'
+        '{"email": "", "tipo": "paciente", "ativo": true}'
+        '{"nome": "", "cpf": "", "email": "@gmail.com"}'
+        '{"nome": "", "crm_coren": "", "email": "@vidaplus.com"}'
+        '{"paciente_id": , "profissional_id": , "medicamentos": "", "dosagem": "1x ao dia", "duracao": "7 dias", "status": "ativa"}'
+        '{"status": "cancelada"}{"status": "realizada"}'
+        '{"paciente_id": , "profissional_id": , "unidade_id": , "data_hora": "2024-01-01T00:00:00", "tipo": "presencial", "status": "agendada"}'
+        '{"ultimo_acesso": "2024-01-01T00:00:00.000000"}'
+    ).encode()
+}
+VERSAO_DICIONARIO_AUDITORIA = 1
+PREFIXO_PAYLOAD_COMPRIMIDO = 'z:'
+
+def comprimir_payload(texto):
+    if texto is None:
+        return None
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15, zdict=DICIONARIOS_AUDITORIA[VERSAO_DICIONARIO_AUDITORIA])
+    comprimido = bytes([VERSAO_DICIONARIO_AUDITORIA]) + compressor.compress(texto.encode()) + compressor.flush()
+    return PREFIXO_PAYLOAD_COMPRIMIDO + base64.b64encode(comprimido).decode()
+
+def descomprimir_payload(valor):
+    """
+    Texto do payload. Valores sem o prefixo (gravados antes da compressão) são
+    devolvidos como estão; bytes são payloads comprimidos gravados como BLOB
+    por versões anteriores no SQLite.
+    """
+    if valor is None:
+        return None
+    if isinstance(valor, str):
+        if not valor.startswith(PREFIXO_PAYLOAD_COMPRIMIDO):
+            return valor
+        valor = base64.b64decode(valor[len(PREFIXO_PAYLOAD_COMPRIMIDO):])
+    valor = bytes(valor)
+    descompressor = zlib.decompressobj(-15, zdict=DICIONARIOS_AUDITORIA[valor[0]])
+    return (descompressor.decompress(valor[1:]) + descompressor.flush()).decode()
+
+class PayloadAuditoria(db.TypeDecorator):
+    """Coluna de payload comprimida na gravação; a leitura devolve o valor bruto (veja descomprimir_payload)"""
+    
+    impl = db.Text
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        return comprimir_payload(value)
+    
+    def result_processor(self, dialect, coltype):
+        return None
+
+# Auditoria particionada por mês: cada mês fica numa tabela própria
+# (auditoria_AAAAMM) com os campos do modelo Auditoria. As consultas por
+# intervalo de datas só leem os segmentos do intervalo, e a retenção descarta
+# meses inteiros com DROP TABLE. Os ids continuam globais e crescentes: vêm
+# do contador persistido em `sequencias` (veja proximo_id_auditoria).
+metadata_auditoria = db.MetaData()
+segmentos_auditoria_criados = set()  # cache do roteador (segmentos já criados neste processo)
+lock_segmentos_auditoria = threading.Lock()
+
+def nome_segmento_auditoria(data_hora):
+    return f'auditoria_{data_hora.year:04d}{data_hora.month:02d}'
+
+def tabela_segmento_auditoria(nome):
+    """Definição (Table) do segmento `nome`"""
+    if nome in metadata_auditoria.tables:
+        return metadata_auditoria.tables[nome]
+    return db.Table(
+        nome, metadata_auditoria,
+        db.Column('id', db.Integer, primary_key=True),
+        db.Column('usuario_id', db.Integer, nullable=False),
+        db.Column('acao', db.String(50), nullable=False),
+        db.Column('tabela', db.String(50), nullable=False),
+        db.Column('registro_id', db.Integer),
+        db.Column('dados_anteriores', PayloadAuditoria),
+        db.Column('dados_novos', PayloadAuditoria),
+        db.Column('ip', db.String(45)),
+        db.Column('data_hora', db.DateTime, nullable=False),
+        db.Index(f'ix_{nome}_registro', 'tabela', 'registro_id'),
+        db.Index(f'ix_{nome}_usuario', 'usuario_id'),
+        db.Index(f'ix_{nome}_acao', 'acao'),
+        db.Index(f'ix_{nome}_data_hora', 'data_hora'),
+        sqlite_autoincrement=True
+    )
+
+def listar_segmentos_auditoria(decrescente=False):
+    """Segmentos existentes no banco, em ordem cronológica (lidos do catálogo a cada chamada)"""
+    nomes = [nome for nome in db.inspect(db.engine).get_table_names() if re.fullmatch(r'auditoria_\d{6}', nome)]
+    return [tabela_segmento_auditoria(nome) for nome in sorted(nomes, reverse=decrescente)]
+
+def segmentos_auditoria_no_intervalo(inicio=None, fim=None, decrescente=False):
+    """Poda: apenas os segmentos cujo mês intersecta [inicio, fim)"""
+    primeiro = nome_segmento_auditoria(inicio) if inicio else None
+    ultimo = nome_segmento_auditoria(fim - timedelta(microseconds=1)) if fim else None
+    return [
+        segmento for segmento in listar_segmentos_auditoria(decrescente)
+        if (primeiro is None or segmento.name >= primeiro) and (ultimo is None or segmento.name <= ultimo)
+    ]
+
+def maior_id_auditoria_gravado():
+    """Maior id entre os registros de auditoria existentes (segmentos e tabela original)"""
+    for segmento in listar_segmentos_auditoria(decrescente=True):
+        maior = db.session.query(func.max(segmento.c.id)).scalar()
+        if maior is not None:
+            return maior
+    return db.session.query(func.coalesce(func.max(Auditoria.id), 0)).scalar()
+
+def iniciar_sequencia_auditoria():
+    """
+    Cria o contador de ids de auditoria em bancos anteriores a ele, a partir
+    do maior id gravado. É a única leitura do MAX: depois disso o contador
+    só avança, mesmo que purgas e migrações removam os registros mais novos.
+    """
+    inserir_ignorando_conflitos(Sequencia.__table__, [{'nome': 'auditoria', 'valor': maior_id_auditoria_gravado()}])
+    db.session.commit()
+
+def proximo_id_auditoria():
+    """Reserva o próximo id de auditoria (na transação do chamador, que grava o registro)"""
+    avancar = Sequencia.__table__.update().where(Sequencia.nome == 'auditoria').values(
+        valor=Sequencia.valor + 1
+    ).returning(Sequencia.valor)
+    valor = db.session.execute(avancar).scalar()
+    if valor is None:
+        iniciar_sequencia_auditoria()
+        valor = db.session.execute(avancar).scalar()
+    return valor
+
+def versao_gravada(nome):
+    """Versão de um conjunto de regras com que os dados derivados foram calculados (0 se nunca)"""
+    registro = db.session.get(Sequencia, nome)
+    return registro.valor if registro else 0
+
+def gravar_versao(nome, valor):
+    """Registra a versão das regras aplicada (na transação do chamador)"""
+    inserir_ignorando_conflitos(Sequencia.__table__, [{'nome': nome, 'valor': valor}])
+    db.session.execute(Sequencia.__table__.update().where(Sequencia.nome == nome).values(valor=valor))
+
+def ultimo_id_auditoria():
+    """Último id de auditoria emitido (marca d'água dos snapshots), lido do contador persistido"""
+    valor = db.session.query(Sequencia.valor).filter(Sequencia.nome == 'auditoria').scalar()
+    return maior_id_auditoria_gravado() if valor is None else valor
+
+def garantir_segmento_auditoria(nome):
+    """Roteador: retorna a tabela do segmento, criando-a se necessário"""
+    if nome in segmentos_auditoria_criados:
+        return tabela_segmento_auditoria(nome)
+    
+    with lock_segmentos_auditoria:
+        segmento = tabela_segmento_auditoria(nome)
+        if nome not in segmentos_auditoria_criados:
+            segmento.create(bind=db.session.connection(), checkfirst=True)
+            db.session.commit()
+            segmentos_auditoria_criados.add(nome)
+    return segmento
+
+def buscar_auditoria(inicio=None, fim=None, condicao=None, limite=100, antes_de_id=None):
+    """
+    Registros de auditoria do mais recente para o mais antigo, lendo apenas
+    os segmentos do intervalo [inicio, fim) e parando assim que `limite`
+    linhas forem encontradas. `condicao(segmento)` retorna filtros extras.
+    """
+    linhas = []
+    for segmento in segmentos_auditoria_no_intervalo(inicio, fim, decrescente=True):
+        filtros = []
+        if inicio:
+            filtros.append(segmento.c.data_hora >= inicio)
+        if fim:
+            filtros.append(segmento.c.data_hora < fim)
+        if antes_de_id:
+            filtros.append(segmento.c.id < antes_de_id)
+        if condicao is not None:
+            filtros.append(condicao(segmento))
+        linhas += db.session.execute(
+            db.select(segmento).where(*filtros).order_by(segmento.c.id.desc()).limit(limite - len(linhas))
+        ).mappings().all()
+        if len(linhas) >= limite:
+            break
+    return linhas
+
+def segmentos_auditoria_apos_id(marca):
+    """Segmentos que podem conter ids maiores que `marca` (do mais recente até o que contém a marca)"""
+    segmentos = []
+    for segmento in listar_segmentos_auditoria(decrescente=True):
+        segmentos.append(segmento)
+        menor = db.session.query(func.min(segmento.c.id)).scalar()
+        if menor is not None and menor <= marca:
+            break
+    return segmentos
+
+def migrar_auditoria_para_segmentos(tamanho_lote=5000):
+    """Move os registros da tabela auditoria original para os segmentos mensais, preservando os ids"""
+    colunas = [coluna.name for coluna in Auditoria.__table__.columns]
+    while True:
+        linhas = db.session.execute(
+            db.select(Auditoria.__table__).order_by(Auditoria.id).limit(tamanho_lote)
+        ).mappings().all()
+        if not linhas:
+            return
+        
+        por_segmento = {}
+        for linha in linhas:
+            dados = {coluna: linha[coluna] for coluna in colunas}
+            dados['data_hora'] = dados['data_hora'] or datetime.utcnow()
+            por_segmento.setdefault(nome_segmento_auditoria(dados['data_hora']), []).append(dados)
+        for nome, registros in por_segmento.items():
+            db.session.execute(garantir_segmento_auditoria(nome).insert(), registros)
+        db.session.execute(Auditoria.__table__.delete().where(Auditoria.id <= linhas[-1]['id']))
+        # Os ids migrados são preservados: o contador (se já existir) não pode ficar abaixo deles
+        db.session.execute(Sequencia.__table__.update().where(
+            Sequencia.nome == 'auditoria', Sequencia.valor < linhas[-1]['id']
+        ).values(valor=linhas[-1]['id']))
+        db.session.commit()
+
 def validar_email(email):
     """Valida o formato do email"""
     padrao = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -292,6 +842,11 @@ def formatar_cpf(cpf):
     cpf = re.sub(r'[^0-9]', '', cpf)
     return f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
 
+def cpf_para_numero(cpf):
+    """Converte o CPF (em qualquer formatação) para inteiro; None se não houver dígitos"""
+    digitos = re.sub(r'[^0-9]', '', cpf or '')
+    return int(digitos) if digitos else None
+
 def validar_cnpj(cnpj):
     """Valida o formato e dígitos verificadores do CNPJ"""
     cnpj = re.sub(r'[^0-9]', '', cnpj)
@@ -336,116 +891,1526 @@ def criar_notificacao(usuario_id, titulo, mensagem, tipo='sistema'):
             data_criacao=datetime.utcnow()
         )
         db.session.add(notificacao)
+        ajustar_resumo(NotificacoesNaoLidas, {'usuario_id': usuario_id}, 1)
         db.session.commit()
+        hub_eventos.publicar([usuario_id], 'notificacao', serializar_notificacao(notificacao), evento_id=notificacao.id)
     except Exception as e:
         print(f"Erro ao criar notificação: {e}")
         db.session.rollback()
 
-def gerar_sala_virtual():
-    """Gera um identificador único para sala virtual"""
-    return f"sala_{uuid.uuid4().hex[:12]}"
+def criar_notificacoes_em_lote(itens, tipo='sistema'):
+    """
+    Cria várias notificações numa única transação. `itens` é uma lista de
+    (usuario_id, titulo, mensagem). Objetos já adicionados à sessão pelo
+    chamador são gravados no mesmo commit.
+    """
+    agora = datetime.utcnow()
+    notificacoes = [
+        Notificacao(usuario_id=usuario_id, titulo=titulo, mensagem=mensagem, tipo=tipo, lida=False, data_criacao=agora)
+        for usuario_id, titulo, mensagem in itens
+    ]
+    db.session.add_all(notificacoes)
+    
+    por_usuario = {}
+    for notificacao in notificacoes:
+        por_usuario[notificacao.usuario_id] = por_usuario.get(notificacao.usuario_id, 0) + 1
+    for usuario_id, quantidade in por_usuario.items():
+        ajustar_resumo(NotificacoesNaoLidas, {'usuario_id': usuario_id}, quantidade)
+    db.session.flush()
+    eventos = [(notificacao.usuario_id, serializar_notificacao(notificacao), notificacao.id) for notificacao in notificacoes]
+    db.session.commit()
+    
+    for usuario_id, dados, notificacao_id in eventos:
+        hub_eventos.publicar([usuario_id], 'notificacao', dados, evento_id=notificacao_id)
+    return notificacoes
 
-def gerar_link_acesso(sala_virtual):
-    """Gera o link de acesso para a sala virtual"""
-    base_url = "https://telemedicina.vidaplus.com"
-    return f"{base_url}/sala/{sala_virtual}"
+def serializar_paciente(paciente):
+    """Representação resumida de um paciente (listagens e recursos incluídos)"""
+    return {
+        'id': paciente.id,
+        'nome': paciente.nome,
+        'cpf': paciente.cpf,
+        'email': paciente.usuario.email,
+        'data_nascimento': paciente.data_nascimento.isoformat(),
+        'sexo': paciente.sexo,
+        'telefone': paciente.telefone,
+        'plano_saude': paciente.plano_saude,
+        'ativo': paciente.usuario.ativo
+    }
 
-def criar_dados_iniciais():
-    """Função para criar dados iniciais do sistema"""
-    if Usuario.query.first():
-        return  # Sistema já foi inicializado
+def serializar_profissional(profissional):
+    """Representação resumida de um profissional (listagens e recursos incluídos)"""
+    return {
+        'id': profissional.id,
+        'nome': profissional.nome,
+        'crm_coren': profissional.crm_coren,
+        'email': profissional.usuario.email,
+        'especialidade': profissional.especialidade,
+        'ativo': profissional.usuario.ativo
+    }
+
+def serializar_unidade(unidade):
+    """Representação resumida de uma unidade hospitalar"""
+    return {
+        'id': unidade.id,
+        'nome': unidade.nome,
+        'tipo': unidade.tipo,
+        'endereco': unidade.endereco,
+        'telefone': unidade.telefone,
+        'ativo': unidade.ativo
+    }
+
+def serializar_consulta(consulta):
+    """Representação de uma consulta nas listagens"""
+    return {
+        'id': consulta.id,
+        'paciente_id': consulta.paciente_id,
+        'profissional_id': consulta.profissional_id,
+        'unidade_id': consulta.unidade_id,
+        'paciente': consulta.paciente.nome,
+        'profissional': consulta.profissional.nome,
+        'unidade': consulta.unidade.nome,
+        'data_hora': consulta.data_hora.isoformat(),
+        'tipo': consulta.tipo,
+        'status': consulta.status,
+        'observacoes': consulta.observacoes,
+        'link_telemedicina': consulta.link_telemedicina,
+        'atualizado_em': consulta.atualizado_em.isoformat() if consulta.atualizado_em else None
+    }
+
+def serializar_prescricao(prescricao):
+    """Representação de uma prescrição nas listagens"""
+    return {
+        'id': prescricao.id,
+        'paciente_id': prescricao.paciente_id,
+        'profissional_id': prescricao.profissional_id,
+        'paciente': prescricao.paciente.nome,
+        'profissional': prescricao.profissional.nome,
+        'medicamentos': prescricao.medicamentos,
+        'dosagem': prescricao.dosagem,
+        'duracao': prescricao.duracao,
+        'status': prescricao.status,
+        'data_prescricao': prescricao.data_prescricao.isoformat(),
+        'data_fim': prescricao.data_fim.isoformat() if prescricao.data_fim else None,
+        'atualizado_em': prescricao.atualizado_em.isoformat() if prescricao.atualizado_em else None
+    }
+
+def validar_ids(valor, limite=500):
+    """Valida o parâmetro ids=1,2,3 (busca em lote), preservando a ordem e sem repetições"""
+    ids = []
+    for item in (valor or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        # Só dígitos ASCII e no máximo 18 (cabe no INTEGER de 64 bits do banco)
+        if not re.fullmatch(r'[0-9]{1,18}', item):
+            return {'valido': False, 'mensagem': f'ID inválido: {item}', 'ids': []}
+        if int(item) not in ids:
+            ids.append(int(item))
+    if not ids:
+        return {'valido': False, 'mensagem': 'Informe ao menos um ID em ids', 'ids': []}
+    if len(ids) > limite:
+        return {'valido': False, 'mensagem': f'Máximo de {limite} IDs por requisição', 'ids': []}
+    return {'valido': True, 'mensagem': 'IDs válidos', 'ids': ids}
+
+def buscar_em_lote(modelo, ids, opcoes=()):
+    """
+    Busca vários registros por ID com uma única consulta IN.
     
-    # Criação do usuário administrador
-    admin = Usuario(
-        email='admin@vidaplus.com',
-        tipo='admin',
-        ativo=True
-    )
-    admin.set_senha('admin123')
-    db.session.add(admin)
+    Objetos já presentes no identity map da sessão são reaproveitados sem ir
+    ao banco. Em modelos com exclusão lógica (excluido_em), os excluídos
+    contam como não encontrados, como em buscar_ativo. Retorna os registros
+    na ordem dos IDs solicitados e a lista de IDs não encontrados.
+    """
+    exclusao_logica = hasattr(modelo, 'excluido_em')
+    por_id = {}
+    faltantes = []
+    for registro_id in ids:
+        registro = db.session.identity_map.get(identity_key(modelo, registro_id))
+        if registro is None:
+            faltantes.append(registro_id)
+        elif not exclusao_logica or registro.excluido_em is None:
+            por_id[registro_id] = registro
     
-    # Criação da unidade hospitalar padrão
-    unidade = Unidade(
-        nome='Hospital VidaPlus Central',
-        tipo='hospital',
-        endereco='Rua das Flores, 123 - Centro - São Paulo/SP',
-        telefone='(11) 1234-5678',
-        cnpj='12.345.678/0001-90',
-        ativo=True
-    )
-    db.session.add(unidade)
-    db.session.commit()
+    if faltantes:
+        consulta = modelo.query.options(*opcoes).filter(modelo.id.in_(faltantes))
+        if exclusao_logica:
+            consulta = consulta.filter(modelo.excluido_em.is_(None))
+        for registro in consulta.all():
+            por_id[registro.id] = registro
     
-    # Criação de leitos removida - funcionalidade não utilizada no sistema atual
+    return {
+        'encontrados': [por_id[registro_id] for registro_id in ids if registro_id in por_id],
+        'nao_encontrados': [registro_id for registro_id in ids if registro_id not in por_id]
+    }
+
+def validar_intervalo_datas(data_inicio, data_fim, dias_padrao=30):
+    """
+    Valida o intervalo data_inicio/data_fim (YYYY-MM-DD) dos relatórios.
+    Sem datas informadas, usa os últimos `dias_padrao` dias até hoje.
+    Retorna os limites como datetimes [inicio, fim).
+    """
+    try:
+        fim = datetime.strptime(data_fim, '%Y-%m-%d').date() if data_fim else date.today()
+    except ValueError:
+        return {'valido': False, 'mensagem': 'Formato de data de fim inválido. Use YYYY-MM-DD'}
+    try:
+        inicio = datetime.strptime(data_inicio, '%Y-%m-%d').date() if data_inicio else fim - timedelta(days=dias_padrao)
+    except ValueError:
+        return {'valido': False, 'mensagem': 'Formato de data de início inválido. Use YYYY-MM-DD'}
+    if inicio > fim:
+        return {'valido': False, 'mensagem': 'Data de início posterior à data de fim'}
     
-    print("Dados iniciais criados com sucesso!")
-    print("Usuário admin: admin@vidaplus.com")
-    print("Senha: admin123")
-    print("IMPORTANTE: Altere a senha do administrador após o primeiro login!")
+    return {
+        'valido': True,
+        'mensagem': 'Intervalo válido',
+        'inicio': datetime.combine(inicio, datetime.min.time()),
+        'fim': datetime.combine(fim + timedelta(days=1), datetime.min.time())
+    }
 
-# =============================================================================
-# BLUEPRINTS E ROTAS
-# =============================================================================
+# Recuo aplicado a `sincronizado_em`: cobre escritas cujo atualizado_em foi
+# gerado antes da leitura mas cujo commit só terminou depois dela. O cliente
+# aplica os registros por id, então repetições na próxima sincronização são inofensivas.
+MARGEM_SINCRONIZACAO = timedelta(seconds=5)
 
-# Blueprint para autenticação
-auth_bp = Blueprint('auth', __name__)
+def validar_modified_since(valor):
+    """
+    Valida ?modified_since= (ISO 8601; sem fuso, é UTC). Marcas anteriores
+    à retenção dos tombstones são recusadas com `expirada`, pois exclusões
+    desse período já não podem ser informadas.
+    """
+    try:
+        data_hora = datetime.fromisoformat(valor.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return {'valido': False, 'mensagem': 'Formato de modified_since inválido. Use YYYY-MM-DDTHH:MM:SS (UTC)'}
+    if data_hora.tzinfo:
+        data_hora = data_hora.astimezone(timezone.utc).replace(tzinfo=None)
+    if data_hora < datetime.utcnow() - timedelta(days=current_app.config['RETENCAO_EXCLUSOES_DIAS']):
+        return {'valido': False, 'expirada': True,
+                'mensagem': 'modified_since anterior à retenção de exclusões; refaça a sincronização completa'}
+    
+    return {'valido': True, 'mensagem': 'Marca válida', 'data_hora': data_hora}
 
-@auth_bp.route('/login', methods=['POST'])
-def login():
-    """Endpoint para autenticação de usuários"""
+def listar_excluidos(tabela, desde, paciente_id=None, profissional_id=None):
+    """Ids excluídos de `tabela` após `desde` (tombstones), no escopo de paciente/profissional"""
+    query = db.session.query(RegistroExcluido.registro_id).filter(
+        RegistroExcluido.tabela == tabela,
+        RegistroExcluido.data_exclusao > desde
+    )
+    if paciente_id:
+        query = query.filter(RegistroExcluido.paciente_id == paciente_id)
+    if profissional_id:
+        query = query.filter(RegistroExcluido.profissional_id == profissional_id)
+    return [registro_id for registro_id, in query.order_by(RegistroExcluido.id).all()]
+
+def validar_include(valor, permitidos):
+    """Valida o parâmetro include=a,b,c contra os tipos relacionados permitidos"""
+    tipos = []
+    for tipo in (valor or '').split(','):
+        tipo = tipo.strip()
+        if not tipo:
+            continue
+        if tipo not in permitidos:
+            return {'valido': False, 'mensagem': f'Include inválido: {tipo}. Use: {", ".join(permitidos)}', 'tipos': []}
+        if tipo not in tipos:
+            tipos.append(tipo)
+    return {'valido': True, 'mensagem': 'Include válido', 'tipos': tipos}
+
+def carregar_incluidos(registros, tipos):
+    """
+    Carrega os recursos relacionados dos registros (side-loading).
+    
+    Executa uma única consulta IN por tipo relacionado e devolve cada recurso
+    uma só vez, mesmo que seja referenciado por vários registros. Os objetos
+    carregados são atribuídos aos registros (consulta.paciente/profissional/
+    unidade), de modo que a serialização posterior não gera novas consultas;
+    o identity map sozinho não basta, pois só guarda referências fracas.
+    """
+    fontes = {
+        'paciente': ('pacientes', Paciente, 'paciente_id', serializar_paciente, [joinedload(Paciente.usuario)]),
+        'profissional': ('profissionais', Profissional, 'profissional_id', serializar_profissional, [joinedload(Profissional.usuario)]),
+        'unidade': ('unidades', Unidade, 'unidade_id', serializar_unidade, [])
+    }
+    
+    incluidos = {}
+    for tipo in tipos:
+        chave, modelo, coluna, serializar, opcoes = fontes[tipo]
+        ids = {getattr(registro, coluna) for registro in registros}
+        if not ids:
+            incluidos[chave] = []
+            continue
+        relacionados = modelo.query.options(*opcoes).filter(modelo.id.in_(ids)).order_by(modelo.id).all()
+        por_id = {relacionado.id: relacionado for relacionado in relacionados}
+        for registro in registros:
+            set_committed_value(registro, tipo, por_id.get(getattr(registro, coluna)))
+        incluidos[chave] = [serializar(relacionado) for relacionado in relacionados]
+    return incluidos
+
+def reservar_chave_idempotencia(usuario_id, chave, impressao):
+    """
+    Tenta reservar a chave para a requisição atual; a restrição única
+    (usuario_id, chave) garante um único vencedor entre requisições
+    concorrentes, inclusive em processos diferentes. Chaves vencidas ou
+    abandonadas em 'processando' são liberadas antes. Retorna
+    (reservada, registro existente).
+    """
+    config = current_app.config
+    agora = datetime.utcnow()
+    db.session.execute(RespostaIdempotente.__table__.delete().where(
+        RespostaIdempotente.usuario_id == usuario_id,
+        RespostaIdempotente.chave == chave,
+        db.or_(
+            RespostaIdempotente.expira_em < agora,
+            and_(RespostaIdempotente.status == 'processando',
+                 RespostaIdempotente.data_criacao < agora - timedelta(seconds=config['IDEMPOTENCIA_ABANDONO_SEGUNDOS']))
+        )
+    ))
     try:
-        dados = request.get_json()
-        if not dados:
-            return jsonify({'erro': 'Dados não fornecidos'}), 400
-        
-        email = dados.get('email')
-        senha = dados.get('senha')
-        
-        if not email or not senha:
-            return jsonify({'erro': 'Email e senha são obrigatórios'}), 400
-        
-        usuario = Usuario.query.filter_by(email=email).first()
-        
-        if not usuario or not usuario.check_senha(senha):
-            return jsonify({'erro': 'Email ou senha inválidos'}), 401
-        
-        if not usuario.ativo:
-            return jsonify({'erro': 'Conta desativada. Entre em contato com o administrador.'}), 403
-        
-        usuario.ultimo_acesso = datetime.utcnow()
+        db.session.add(RespostaIdempotente(
+            usuario_id=usuario_id,
+            chave=chave,
+            impressao=impressao,
+            data_criacao=agora,
+            expira_em=agora + timedelta(hours=config['IDEMPOTENCIA_VALIDADE_HORAS'])
+        ))
         db.session.commit()
+        return True, None
+    except IntegrityError:
+        db.session.rollback()
+        return False, RespostaIdempotente.query.filter_by(usuario_id=usuario_id, chave=chave).first()
+
+def aguardar_resposta_idempotente(usuario_id, chave):
+    """Espera a requisição que reservou a chave terminar (até IDEMPOTENCIA_ESPERA_SEGUNDOS)"""
+    limite = time.monotonic() + current_app.config['IDEMPOTENCIA_ESPERA_SEGUNDOS']
+    while True:
+        db.session.rollback()  # nova leitura a cada volta, sem snapshot antigo
+        registro = RespostaIdempotente.query.filter_by(usuario_id=usuario_id, chave=chave).first()
+        if registro is None or registro.status == 'concluida' or time.monotonic() >= limite:
+            return registro
+        time.sleep(0.05)
+
+def liberar_chave_idempotencia(usuario_id, chave):
+    db.session.rollback()
+    RespostaIdempotente.query.filter_by(usuario_id=usuario_id, chave=chave).delete()
+    db.session.commit()
+
+def idempotente(funcao):
+    """
+    Honra o cabeçalho Idempotency-Key nos endpoints de criação (aplicar
+    abaixo de @jwt_required). A primeira requisição de cada usuário+chave
+    executa e tem a resposta gravada; repetições recebem a mesma resposta
+    (com Idempotent-Replayed: true) sem executar de novo, e duplicatas
+    concorrentes aguardam a primeira terminar. Respostas 5xx não são
+    gravadas, para que a repetição execute novamente; reutilizar a chave
+    com outro corpo responde 422.
+    """
+    @wraps(funcao)
+    def envolvida(*args, **kwargs):
+        chave = request.headers.get('Idempotency-Key')
+        if chave is None:
+            return funcao(*args, **kwargs)
+        if not 0 < len(chave) <= 255:
+            return jsonify({'erro': 'Idempotency-Key deve ter entre 1 e 255 caracteres'}), 400
         
-        token = create_access_token(identity=usuario.id)
+        usuario_id = get_jwt_identity()
+        impressao = hashlib.sha256(f'{request.method} {request.path}\n'.encode() + request.get_data()).hexdigest()
+        
+        # Se a primeira requisição falhar (5xx) e liberar a chave, a espera termina sem registro e tentamos reservar de novo
+        for _ in range(3):
+            reservada, registro = reservar_chave_idempotencia(usuario_id, chave, impressao)
+            if reservada:
+                break
+            if registro is not None and registro.impressao != impressao:
+                return jsonify({'erro': 'Idempotency-Key já utilizada com outra requisição'}), 422
+            registro = aguardar_resposta_idempotente(usuario_id, chave)
+            if registro is None:
+                continue
+            if registro.status != 'concluida':
+                return jsonify({'erro': 'Requisição com esta Idempotency-Key ainda em processamento'}), 409
+            resposta = Response(registro.corpo, status=registro.codigo_http, content_type=registro.tipo_conteudo)
+            resposta.headers['Idempotent-Replayed'] = 'true'
+            return resposta
+        else:
+            return jsonify({'erro': 'Requisição com esta Idempotency-Key ainda em processamento'}), 409
         
-        registrar_auditoria(
-            usuario_id=usuario.id,
-            acao='LOGIN',
-            tabela='usuarios',
-            registro_id=usuario.id,
-            dados_novos=json.dumps({'ultimo_acesso': usuario.ultimo_acesso.isoformat()})
-        )
+        try:
+            resposta = current_app.make_response(funcao(*args, **kwargs))
+        except Exception:
+            liberar_chave_idempotencia(usuario_id, chave)
+            raise
         
-        return jsonify({
-            'mensagem': 'Login realizado com sucesso',
-            'token': token,
-            'usuario': {
-                'id': usuario.id,
-                'email': usuario.email,
-                'tipo': usuario.tipo,
-                'ativo': usuario.ativo
-            }
-        }), 200
+        if resposta.status_code >= 500:
+            liberar_chave_idempotencia(usuario_id, chave)
+            return resposta
         
-    except Exception as e:
         db.session.rollback()
-        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+        RespostaIdempotente.query.filter_by(usuario_id=usuario_id, chave=chave).update({
+            'status': 'concluida',
+            'codigo_http': resposta.status_code,
+            'corpo': resposta.get_data(as_text=True),
+            'tipo_conteudo': resposta.content_type
+        })
+        db.session.commit()
+        return resposta
+    return envolvida
 
-@auth_bp.route('/registro', methods=['POST'])
-def registro():
-    """Endpoint para registro de novos usuários"""
-    try:
-        dados = request.get_json()
-        if not dados:
+def buscar_ativo(modelo, registro_id):
+    """Paciente ou profissional pelo id, tratando os excluídos logicamente como inexistentes"""
+    registro = db.session.get(modelo, registro_id)
+    if registro is None or registro.excluido_em is not None:
+        return None
+    return registro
+
+def excluir_cadastro(registro):
+    """
+    Exclusão física de paciente/profissional com comandos em conjunto: um
+    EXISTS por tabela dependente (em vez de carregar o histórico) e DELETEs
+    diretos para notificações, contador, respostas idempotentes, vínculos de
+    medicamentos, cadastro e usuário, independente do volume de dados do usuário. Retorna a mensagem
+    de erro quando há consultas ou prescrições associadas.
+    """
+    modelo = type(registro)
+    coluna = Consulta.paciente_id if modelo is Paciente else Consulta.profissional_id
+    if db.session.query(db.exists().where(coluna == registro.id)).scalar():
+        return f'Não é possível excluir {modelo.__name__.lower()} com consultas associadas'
+    coluna = Prescricao.paciente_id if modelo is Paciente else Prescricao.profissional_id
+    if db.session.query(db.exists().where(coluna == registro.id)).scalar():
+        return f'Não é possível excluir {modelo.__name__.lower()} com prescrições associadas'
+    
+    usuario = registro.usuario
+    for tabela_usuario in (Notificacao, NotificacoesNaoLidas, RespostaIdempotente):
+        db.session.execute(tabela_usuario.__table__.delete().where(tabela_usuario.usuario_id == usuario.id))
+    if modelo is Paciente:
+        db.session.execute(PacienteMedicamento.__table__.delete().where(PacienteMedicamento.paciente_id == registro.id))
+    db.session.execute(modelo.__table__.delete().where(modelo.id == registro.id))
+    db.session.execute(Usuario.__table__.delete().where(Usuario.id == usuario.id))
+    registrar_alteracoes_em_massa(modelo.__tablename__, [registro.id], 'DELETE')
+    # Os objetos já não existem no banco: retirados da sessão para não serem recarregados
+    db.session.expunge(registro)
+    db.session.expunge(usuario)
+    db.session.commit()
+    return None
+
+def gerar_sala_virtual():
+    """Gera um identificador único para sala virtual"""
+    return f"sala_{uuid.uuid4().hex[:12]}"
+
+def gerar_link_acesso(sala_virtual):
+    """Gera o link de acesso para a sala virtual"""
+    base_url = "https://telemedicina.vidaplus.com"
+    return f"{base_url}/sala/{sala_virtual}"
+
+# Índices de busca textual (SQLite FTS5) sobre nomes, planos e especialidades.
+# O tokenizador unicode61 com remove_diacritics normaliza caixa e acentos,
+# de modo que "joao" encontra "João". As tabelas usam conteúdo externo
+# (content=...), guardando apenas o índice, e são mantidas por triggers.
+INDICES_BUSCA = {
+    'pacientes_fts': ('pacientes', ['nome', 'plano_saude']),
+    'profissionais_fts': ('profissionais', ['nome', 'especialidade'])
+}
+
+busca_textual = {'disponivel': False}
+
+def criar_indices_busca(reconstruir=False):
+    """Cria (se necessário) os índices FTS5 e os triggers de sincronização"""
+    if db.engine.dialect.name != 'sqlite':
+        busca_textual['disponivel'] = False
+        return
+    
+    try:
+        for indice, (tabela, colunas) in INDICES_BUSCA.items():
+            existe = db.session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nome"),
+                {'nome': indice}
+            ).first()
+            
+            lista = ', '.join(colunas)
+            novos = ', '.join(f'new.{coluna}' for coluna in colunas)
+            antigos = ', '.join(f'old.{coluna}' for coluna in colunas)
+            
+            db.session.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {indice} USING fts5("
+                f"{lista}, content='{tabela}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            ))
+            db.session.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {indice}_ai AFTER INSERT ON {tabela} BEGIN "
+                f"INSERT INTO {indice}(rowid, {lista}) VALUES (new.id, {novos}); END"
+            ))
+            db.session.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {indice}_ad AFTER DELETE ON {tabela} BEGIN "
+                f"INSERT INTO {indice}({indice}, rowid, {lista}) VALUES ('delete', old.id, {antigos}); END"
+            ))
+            db.session.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {indice}_au AFTER UPDATE OF {lista} ON {tabela} BEGIN "
+                f"INSERT INTO {indice}({indice}, rowid, {lista}) VALUES ('delete', old.id, {antigos}); "
+                f"INSERT INTO {indice}(rowid, {lista}) VALUES (new.id, {novos}); END"
+            ))
+            
+            # Indexa os registros existentes quando o índice acaba de ser criado
+            if reconstruir or not existe:
+                db.session.execute(text(f"INSERT INTO {indice}({indice}) VALUES ('rebuild')"))
+        
+        db.session.commit()
+        busca_textual['disponivel'] = True
+    except Exception as e:
+        print(f"⚠️ Busca textual indisponível (FTS5): {e}")
+        db.session.rollback()
+        busca_textual['disponivel'] = False
+
+def montar_busca_textual(indice, filtros):
+    """
+    Monta uma subconsulta (id, rank) sobre o índice FTS5 a partir dos filtros
+    {coluna: texto}. Cada palavra do texto vira um termo de prefixo, e todas
+    precisam estar presentes. Retorna None se não houver termos pesquisáveis.
+    """
+    expressoes = []
+    for coluna, valor in filtros.items():
+        termos = re.findall(r'\w+', valor)
+        if termos:
+            expressoes.append(f"{coluna} : (" + ' '.join(f'"{termo}"*' for termo in termos) + ")")
+    if not expressoes:
+        return None
+    
+    return text(
+        f"SELECT rowid AS id, rank FROM {indice} WHERE {indice} MATCH :expressao"
+    ).bindparams(expressao=' AND '.join(expressoes)).columns(
+        id=db.Integer, rank=db.Float
+    ).subquery()
+
+def normalizar_texto(texto):
+    """Remove acentos, colapsa espaços e converte para minúsculas"""
+    texto = re.sub(r'[\u0300-\u036f]', '', unicodedata.normalize('NFKD', texto or ''))
+    return ' '.join(texto.casefold().split())
+
+class IndiceAutocomplete:
+    """
+    Índice em memória para autocompletar nomes de pacientes.
+    
+    Mantém uma lista ordenada de (chave normalizada, id), com uma entrada
+    para cada palavra do nome ("joao da silva", "da silva", "silva"), o que
+    permite encontrar tanto o nome quanto o sobrenome por prefixo com busca
+    binária. O índice é construído na inicialização e atualizado a cada
+    cadastro, alteração ou exclusão de paciente feita por este processo.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.chaves = []   # lista ordenada de (chave, id)
+        self.nomes = {}    # id -> nome original
+    
+    @staticmethod
+    def gerar_chaves(nome, registro_id):
+        chave = normalizar_texto(nome)
+        chaves = [(chave, registro_id)]
+        posicao = chave.find(' ')
+        while posicao != -1:
+            chaves.append((chave[posicao + 1:], registro_id))
+            posicao = chave.find(' ', posicao + 1)
+        return chaves
+    
+    def reconstruir(self, registros):
+        """Reconstrói o índice a partir de pares (id, nome)"""
+        chaves = []
+        nomes = {}
+        for registro_id, nome in registros:
+            nomes[registro_id] = nome
+            chaves.extend(self.gerar_chaves(nome, registro_id))
+        chaves.sort()
+        with self.lock:
+            self.chaves = chaves
+            self.nomes = nomes
+    
+    def remover(self, registro_id):
+        with self.lock:
+            nome = self.nomes.pop(registro_id, None)
+            if nome is None:
+                return
+            for chave in self.gerar_chaves(nome, registro_id):
+                posicao = bisect.bisect_left(self.chaves, chave)
+                if posicao < len(self.chaves) and self.chaves[posicao] == chave:
+                    del self.chaves[posicao]
+    
+    def atualizar(self, registro_id, nome):
+        self.remover(registro_id)
+        with self.lock:
+            self.nomes[registro_id] = nome
+            for chave in self.gerar_chaves(nome, registro_id):
+                bisect.insort(self.chaves, chave)
+    
+    def buscar(self, prefixo, limite=10):
+        """Retorna até `limite` pacientes cujo nome (ou sobrenome) começa com o prefixo"""
+        prefixo = normalizar_texto(prefixo)
+        if not prefixo:
+            return []
+        
+        resultados = []
+        vistos = set()
+        with self.lock:
+            posicao = bisect.bisect_left(self.chaves, (prefixo,))
+            while posicao < len(self.chaves) and len(resultados) < limite:
+                chave, registro_id = self.chaves[posicao]
+                if not chave.startswith(prefixo):
+                    break
+                if registro_id not in vistos:
+                    vistos.add(registro_id)
+                    resultados.append({'id': registro_id, 'nome': self.nomes[registro_id]})
+                posicao += 1
+        return resultados
+
+autocomplete_pacientes = IndiceAutocomplete()
+
+def migrar_cpf_numerico():
+    """
+    Migração da coluna pacientes.cpf_numero em bancos criados antes dela:
+    adiciona a coluna, preenche a partir do CPF formatado e cria o índice único.
+    """
+    colunas = [coluna['name'] for coluna in db.inspect(db.engine).get_columns('pacientes')]
+    if 'cpf_numero' not in colunas:
+        db.session.execute(text("ALTER TABLE pacientes ADD COLUMN cpf_numero BIGINT"))
+    
+    pendentes = db.session.query(Paciente.id, Paciente.cpf).filter(Paciente.cpf_numero.is_(None)).all()
+    for paciente_id, cpf in pendentes:
+        db.session.execute(
+            Paciente.__table__.update().where(Paciente.id == paciente_id).values(cpf_numero=cpf_para_numero(cpf))
+        )
+    
+    db.session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_pacientes_cpf_numero ON pacientes (cpf_numero)"))
+    db.session.commit()
+
+def migrar_atualizado_em():
+    """
+    Migração de consultas/prescricoes.atualizado_em em bancos criados antes
+    dela: adiciona a coluna e preenche com o horário da migração (os
+    clientes fazem uma sincronização completa antes de usar modified_since).
+    """
+    for modelo in (Consulta, Prescricao):
+        tabela = modelo.__tablename__
+        colunas = [coluna['name'] for coluna in db.inspect(db.engine).get_columns(tabela)]
+        if 'atualizado_em' not in colunas:
+            db.session.execute(text(f"ALTER TABLE {tabela} ADD COLUMN atualizado_em DATETIME"))
+            db.session.execute(modelo.__table__.update().values(atualizado_em=datetime.utcnow()))
+    db.session.commit()
+
+def migrar_exclusao_logica():
+    """Migração da coluna excluido_em (exclusão lógica) de pacientes e profissionais em bancos anteriores a ela"""
+    for tabela in ('pacientes', 'profissionais'):
+        colunas = [coluna['name'] for coluna in db.inspect(db.engine).get_columns(tabela)]
+        if 'excluido_em' not in colunas:
+            db.session.execute(text(f"ALTER TABLE {tabela} ADD COLUMN excluido_em DATETIME"))
+    db.session.commit()
+
+# Unidades aceitas na duração em texto livre ("7 dias", "por 2 semanas", "1 mês de uso"), em dias.
+# Mudanças nas regras devem incrementar VERSAO_REGRAS_DURACAO, o que recalcula
+# as datas de fim nulas na próxima inicialização (veja migrar_data_fim_prescricoes).
+VERSAO_REGRAS_DURACAO = 2
+UNIDADES_DURACAO = {'dia': 1, 'semana': 7, 'mes': 30, 'ano': 365}
+USO_CONTINUO = re.compile(r'\b(continuo|indeterminad[oa]|sem prazo|cronico)\b')
+
+def fim_por_duracao(inicio, duracao):
+    """
+    Fim da prescrição a partir da duração em texto: a primeira quantidade
+    com unidade em qualquer posição ("por 10 dias", "10 dias de uso") ou só
+    o número de dias. None para uso contínuo declarado ("uso contínuo",
+    "tempo indeterminado") ou quando não há prazo no texto.
+    """
+    texto = normalizar_texto(duracao)
+    if USO_CONTINUO.search(texto):
+        return None
+    if texto.isdigit():
+        return inicio + timedelta(days=int(texto))
+    encontrado = re.search(r'(\d+)\s*(dia|semana|mes|ano)(?:s|es)?\b', texto)
+    if not encontrado:
+        return None
+    return inicio + timedelta(days=int(encontrado.group(1)) * UNIDADES_DURACAO[encontrado.group(2)])
+
+def definir_data_fim(prescricao):
+    """
+    Calcula data_fim na gravação: início + duração; ao encerrar antes do
+    prazo (ou sem prazo), o fim passa a ser o momento do encerramento.
+    Assim data_fim é a única referência para saber se a prescrição vigora numa data.
+    """
+    fim = fim_por_duracao(prescricao.data_prescricao, prescricao.duracao)
+    if prescricao.status == 'encerrada':
+        agora = datetime.utcnow()
+        if fim is None or fim > agora:
+            fim = agora
+    prescricao.data_fim = fim
+
+def filtrar_vigentes(query, instante):
+    """
+    Restringe a query às prescrições que terminam depois de `instante`. As sem
+    prazo (data_fim nula) vêm de um segundo SELECT unido por UNION ALL: com OR
+    o SQLite não usaria a faixa de data_fim em ix_prescricoes_paciente_data_fim.
+    """
+    return query.filter(Prescricao.data_fim > instante).union_all(query.filter(Prescricao.data_fim.is_(None)))
+
+def migrar_data_fim_prescricoes(tamanho_lote=5000):
+    """
+    Migração de prescricoes.data_fim: adiciona a coluna em bancos anteriores
+    a ela e, sempre que VERSAO_REGRAS_DURACAO muda, recalcula em lotes por id
+    as datas nulas (durações que as regras anteriores não reconheciam).
+    """
+    colunas = [coluna['name'] for coluna in db.inspect(db.engine).get_columns('prescricoes')]
+    if 'data_fim' not in colunas:
+        db.session.execute(text("ALTER TABLE prescricoes ADD COLUMN data_fim DATETIME"))
+        db.session.commit()
+    if versao_gravada('regras_duracao') >= VERSAO_REGRAS_DURACAO:
+        return
+    
+    ultimo_id = 0
+    while True:
+        prescricoes = Prescricao.query.filter(
+            Prescricao.id > ultimo_id, Prescricao.data_fim.is_(None)
+        ).order_by(Prescricao.id).limit(tamanho_lote).all()
+        if not prescricoes:
+            break
+        for prescricao in prescricoes:
+            definir_data_fim(prescricao)
+        db.session.commit()
+        ultimo_id = prescricoes[-1].id
+    gravar_versao('regras_duracao', VERSAO_REGRAS_DURACAO)
+    db.session.commit()
+
+# Vocabulário de extrair_medicamentos (já normalizado: sem acentos, minúsculas).
+# Mudanças nas regras devem incrementar VERSAO_EXTRACAO_MEDICAMENTOS, o que
+# reindexa os vínculos existentes na próxima inicialização.
+VERSAO_EXTRACAO_MEDICAMENTOS = 2
+FORMAS_FARMACEUTICAS = {'comprimido', 'comprimidos', 'comp', 'cp', 'capsula', 'capsulas', 'gotas', 'xarope',
+                        'solucao', 'suspensao', 'pomada', 'creme', 'injetavel', 'ampola', 'ampolas'}
+NEGACOES_MEDICAMENTOS = {'nenhum', 'nenhuma', 'nada', 'nao', 'nega', 'sem', 'nd', 'na'}
+VERBOS_POSOLOGIA = {'tomar', 'usar', 'aplicar', 'administrar', 'ingerir', 'inalar', 'pingar', 'instilar',
+                    'passar', 'mastigar', 'diluir', 'manter', 'suspender', 'iniciar'}
+TERMOS_POSOLOGIA = {'cada', 'por', 'ao', 'as', 'vezes', 'se', 'em', 'durante', 'conforme', 'apos', 'antes',
+                    'via', 'uso', 'ate', 'jejum'}
+CONECTIVOS_MEDICAMENTOS = {'de', 'do', 'da', 'dos', 'das', 'um', 'uma', 'a', 'o', 'e', 'com'}
+
+def extrair_medicamentos(texto):
+    """
+    Nomes normalizados dos medicamentos de um texto livre, um por item
+    (vírgula, ponto e vírgula, quebra de linha ou '+'). Itens que negam o
+    uso ("Nenhum", "Não faz uso", "Sem medicamentos") são descartados. Do
+    início do item saem o verbo e a dose da posologia ("Tomar 1 comprimido
+    de dipirona" → dipirona); depois do nome, a primeira dose ou termo de
+    posologia encerra o item. "Amoxicilina 500mg; Losartana potássica 50 mg"
+    → {'amoxicilina', 'losartana potassica'}.
+    """
+    nomes = set()
+    for item in re.split(r'[,;\n+]', texto or ''):
+        palavras = [palavra.strip('-_') for palavra in re.sub(r'[^\w\s-]', ' ', normalizar_texto(item)).split()]
+        palavras = [palavra for palavra in palavras if palavra]
+        if not palavras or palavras[0] in NEGACOES_MEDICAMENTOS:
+            continue
+        
+        nome = []
+        for palavra in palavras:
+            posologia = any(caractere.isdigit() for caractere in palavra) or palavra in VERBOS_POSOLOGIA
+            if not nome:
+                if posologia or palavra in FORMAS_FARMACEUTICAS or palavra in CONECTIVOS_MEDICAMENTOS:
+                    continue
+            elif posologia or palavra in TERMOS_POSOLOGIA:
+                break
+            if palavra not in FORMAS_FARMACEUTICAS:
+                nome.append(palavra)
+        while nome and nome[-1] in CONECTIVOS_MEDICAMENTOS:
+            nome.pop()
+        
+        nome = ' '.join(nome)[:100]
+        if len(nome) > 1:
+            nomes.add(nome)
+    return nomes
+
+def inserir_ignorando_conflitos(tabela, linhas):
+    """INSERT ... ON CONFLICT DO NOTHING: linhas já existentes (inclusive de requisições concorrentes) são ignoradas"""
+    if not linhas:
+        return
+    dialeto = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    db.session.execute(dialeto.insert(tabela).on_conflict_do_nothing(), linhas)
+
+def catalogar_medicamentos(nomes):
+    """Ids do catálogo para os nomes informados ({nome: id}), incluindo os que ainda não existiam"""
+    if not nomes:
+        return {}
+    agora = datetime.utcnow()
+    inserir_ignorando_conflitos(Medicamento.__table__, [{'nome': nome, 'data_criacao': agora} for nome in nomes])
+    return dict(db.session.query(Medicamento.nome, Medicamento.id).filter(Medicamento.nome.in_(nomes)).all())
+
+def substituir_vinculos(modelo, coluna_dono, dono_id, medicamento_ids, **extras):
+    """Deixa o dono vinculado exatamente aos medicamentos informados (remove os que saíram, insere os novos)"""
+    db.session.execute(modelo.__table__.delete().where(
+        coluna_dono == dono_id, modelo.medicamento_id.not_in(medicamento_ids)
+    ))
+    inserir_ignorando_conflitos(modelo.__table__, [
+        {coluna_dono.key: dono_id, 'medicamento_id': medicamento_id, **extras} for medicamento_id in medicamento_ids
+    ])
+
+def vincular_medicamentos_prescricao(prescricao):
+    """Sincroniza prescricoes_medicamentos com o texto de prescricao.medicamentos (prescrição já com id)"""
+    catalogo = catalogar_medicamentos(extrair_medicamentos(prescricao.medicamentos))
+    substituir_vinculos(PrescricaoMedicamento, PrescricaoMedicamento.prescricao_id, prescricao.id,
+                        list(catalogo.values()), paciente_id=prescricao.paciente_id)
+
+def vincular_medicamentos_paciente(paciente):
+    """Sincroniza pacientes_medicamentos com o texto de paciente.medicamentos_uso (paciente já com id)"""
+    catalogo = catalogar_medicamentos(extrair_medicamentos(paciente.medicamentos_uso))
+    substituir_vinculos(PacienteMedicamento, PacienteMedicamento.paciente_id, paciente.id, list(catalogo.values()))
+
+def indexar_medicamentos(reconstruir=False, tamanho_lote=1000):
+    """
+    Backfill do catálogo e dos vínculos a partir do texto livre já gravado
+    (prescricoes.medicamentos e pacientes.medicamentos_uso), em lotes por
+    id com um commit por lote. reconstruir=True apaga os vínculos antes,
+    para reaplicar as regras de extração a todo o histórico; ao final, os
+    nomes do catálogo que ficaram sem vínculo são removidos.
+    """
+    if reconstruir:
+        db.session.execute(PrescricaoMedicamento.__table__.delete())
+        db.session.execute(PacienteMedicamento.__table__.delete())
+        db.session.commit()
+    
+    fontes = (
+        (PrescricaoMedicamento, 'prescricao_id', Prescricao.id, Prescricao.medicamentos, Prescricao.paciente_id),
+        (PacienteMedicamento, 'paciente_id', Paciente.id, Paciente.medicamentos_uso, Paciente.id),
+    )
+    totais = {}
+    for vinculo, chave_dono, coluna_id, coluna_texto, coluna_paciente in fontes:
+        totais[vinculo.__tablename__] = 0
+        ultimo_id = 0
+        while True:
+            linhas = db.session.query(coluna_id, coluna_texto, coluna_paciente).filter(
+                coluna_id > ultimo_id, coluna_texto.isnot(None)
+            ).order_by(coluna_id).limit(tamanho_lote).all()
+            if not linhas:
+                break
+            nomes_por_linha = [(linha, extrair_medicamentos(linha[1])) for linha in linhas]
+            catalogo = catalogar_medicamentos(set().union(*(nomes for _, nomes in nomes_por_linha)))
+            registros = [
+                {'paciente_id': linha[2], chave_dono: linha[0], 'medicamento_id': catalogo[nome]}
+                for linha, nomes in nomes_por_linha for nome in nomes
+            ]
+            inserir_ignorando_conflitos(vinculo.__table__, registros)
+            db.session.commit()
+            totais[vinculo.__tablename__] += len(registros)
+            ultimo_id = linhas[-1][0]
+    
+    if reconstruir:
+        db.session.execute(Medicamento.__table__.delete().where(
+            ~db.exists().where(PrescricaoMedicamento.medicamento_id == Medicamento.id),
+            ~db.exists().where(PacienteMedicamento.medicamento_id == Medicamento.id)
+        ))
+    gravar_versao('extracao_medicamentos', VERSAO_EXTRACAO_MEDICAMENTOS)
+    db.session.commit()
+    return totais
+
+def expressao_periodo(coluna, periodo):
+    """Expressão SQL que trunca a data/hora da coluna para o início do dia, semana (segunda-feira) ou mês"""
+    if db.engine.dialect.name == 'sqlite':
+        if periodo == 'semana':
+            return func.date(coluna, 'weekday 0', '-6 days')
+        if periodo == 'mes':
+            return func.strftime('%Y-%m-01', coluna)
+        return func.date(coluna)
+    
+    unidades = {'dia': 'day', 'semana': 'week', 'mes': 'month'}
+    return db.cast(func.date_trunc(unidades[periodo], coluna), db.Date)
+
+def chave_resumo_consulta(consulta):
+    """Chave da linha de resumo diário à qual a consulta pertence"""
+    return {
+        'dia': consulta.data_hora.date(),
+        'unidade_id': consulta.unidade_id,
+        'profissional_id': consulta.profissional_id,
+        'status': consulta.status or 'agendada',
+        'tipo': consulta.tipo
+    }
+
+def ajustar_resumo(modelo, chave, delta):
+    """
+    Soma `delta` ao total da linha de resumo identificada por `chave` (a chave
+    primária), criando-a se necessário. É um único INSERT ... ON CONFLICT DO
+    UPDATE: duas escritas concorrentes na mesma linha ainda inexistente somam
+    as duas, em vez de uma delas falhar na chave primária. Não faz commit: deve
+    ser chamada dentro da transação da escrita que originou a alteração.
+    """
+    tabela = modelo.__table__
+    dialeto = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    insercao = dialeto.insert(tabela).values(total=delta, **chave)
+    db.session.execute(insercao.on_conflict_do_update(
+        index_elements=list(chave), set_={'total': tabela.c.total + insercao.excluded.total}
+    ))
+
+def reconstruir_resumos():
+    """Recalcula todas as tabelas de resumo diário a partir de consultas e prescrições"""
+    dia_consulta = expressao_periodo(Consulta.data_hora, 'dia')
+    db.session.execute(ResumoConsultaDiario.__table__.delete())
+    db.session.execute(ResumoConsultaDiario.__table__.insert().from_select(
+        ['dia', 'unidade_id', 'profissional_id', 'status', 'tipo', 'total'],
+        db.select(
+            dia_consulta, Consulta.unidade_id, Consulta.profissional_id,
+            func.coalesce(Consulta.status, 'agendada'), Consulta.tipo, func.count(Consulta.id)
+        ).group_by(
+            dia_consulta, Consulta.unidade_id, Consulta.profissional_id,
+            func.coalesce(Consulta.status, 'agendada'), Consulta.tipo
+        )
+    ))
+    
+    dia_prescricao = expressao_periodo(Prescricao.data_prescricao, 'dia')
+    db.session.execute(ResumoPrescricaoDiario.__table__.delete())
+    db.session.execute(ResumoPrescricaoDiario.__table__.insert().from_select(
+        ['dia', 'profissional_id', 'total'],
+        db.select(
+            dia_prescricao, Prescricao.profissional_id, func.count(Prescricao.id)
+        ).group_by(dia_prescricao, Prescricao.profissional_id)
+    ))
+    db.session.commit()
+    
+    return {
+        'resumo_consultas_diario': db.session.query(func.count()).select_from(ResumoConsultaDiario).scalar(),
+        'resumo_prescricoes_diario': db.session.query(func.count()).select_from(ResumoPrescricaoDiario).scalar()
+    }
+
+def reconstruir_contador_notificacoes():
+    """Recalcula o contador de não lidas de todos os usuários a partir das notificações"""
+    db.session.execute(NotificacoesNaoLidas.__table__.delete())
+    db.session.execute(NotificacoesNaoLidas.__table__.insert().from_select(
+        ['usuario_id', 'total'],
+        db.select(Notificacao.usuario_id, func.count(Notificacao.id)).filter(
+            Notificacao.lida == False
+        ).group_by(Notificacao.usuario_id)
+    ))
+    db.session.commit()
+
+def criar_indices_faltantes():
+    """Cria índices declarados nos modelos que ainda não existem em bancos antigos"""
+    for tabela in db.metadata.sorted_tables:
+        for indice in tabela.indexes:
+            indice.create(bind=db.engine, checkfirst=True)
+
+def ativar_vacuum_incremental():
+    """
+    Ativa auto_vacuum=INCREMENTAL no SQLite. Em bancos existentes a mudança
+    exige um VACUUM completo, então ela só é aplicada automaticamente em
+    bancos vazios; nos demais, use `flask --app VidaPlus purgar-dados --vacuum`.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    if db.session.execute(text('PRAGMA auto_vacuum')).scalar() == 2:
+        return True
+    if Usuario.query.first() is not None:
+        return False
+    db.session.commit()
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conexao:
+        conexao.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+        conexao.exec_driver_sql('VACUUM')
+    return True
+
+def preparar_banco(recriado=False):
+    """Estruturas auxiliares que não são criadas pelo db.create_all() (migrações, índices e caches)"""
+    ativar_vacuum_incremental()
+    migrar_cpf_numerico()
+    migrar_atualizado_em()
+    migrar_exclusao_logica()
+    migrar_data_fim_prescricoes()
+    criar_indices_faltantes()
+    migrar_auditoria_para_segmentos()
+    if db.session.get(Sequencia, 'auditoria') is None:
+        iniciar_sequencia_auditoria()
+    for segmento in listar_segmentos_auditoria():
+        for indice in segmento.indexes:
+            indice.create(bind=db.engine, checkfirst=True)
+    
+    # Backfill dos resumos diários em bancos anteriores a eles
+    resumos_vazios = not db.session.query(ResumoConsultaDiario.query.exists()).scalar() \
+        and not db.session.query(ResumoPrescricaoDiario.query.exists()).scalar()
+    if resumos_vazios and (db.session.query(Consulta.query.exists()).scalar()
+                           or db.session.query(Prescricao.query.exists()).scalar()):
+        reconstruir_resumos()
+    
+    # Backfill do contador de notificações não lidas
+    if not db.session.query(NotificacoesNaoLidas.query.exists()).scalar() \
+            and db.session.query(Notificacao.query.filter(Notificacao.lida == False).exists()).scalar():
+        reconstruir_contador_notificacoes()
+    
+    # Catálogo de medicamentos: backfill em bancos anteriores a ele e
+    # reindexação quando as regras de extração mudam de versão
+    if versao_gravada('extracao_medicamentos') < VERSAO_EXTRACAO_MEDICAMENTOS:
+        indexar_medicamentos(reconstruir=True)
+    
+    criar_indices_busca(reconstruir=recriado)
+    autocomplete_pacientes.reconstruir(
+        db.session.query(Paciente.id, Paciente.nome).filter(Paciente.excluido_em.is_(None)).all()
+    )
+
+def descartar_estruturas_auxiliares():
+    """
+    Remove o que o db.drop_all() não conhece (segmentos de auditoria e
+    índices FTS5) e limpa o cache do roteador de segmentos, para que a
+    recriação do banco não herde registros nem pule a criação de tabelas.
+    """
+    for segmento in listar_segmentos_auditoria():
+        segmento.drop(bind=db.session.connection())
+        metadata_auditoria.remove(segmento)
+    segmentos_auditoria_criados.clear()
+    
+    if db.engine.dialect.name == 'sqlite':
+        for indice in INDICES_BUSCA:
+            for sufixo in ('ai', 'ad', 'au'):
+                db.session.execute(text(f"DROP TRIGGER IF EXISTS {indice}_{sufixo}"))
+            db.session.execute(text(f"DROP TABLE IF EXISTS {indice}"))
+    db.session.commit()
+
+def criar_dados_iniciais():
+    """Função para criar dados iniciais do sistema"""
+    if Usuario.query.first():
+        return  # Sistema já foi inicializado
+    
+    # Criação do usuário administrador
+    admin = Usuario(
+        email='admin@vidaplus.com',
+        tipo='admin',
+        ativo=True
+    )
+    admin.set_senha('admin123')
+    db.session.add(admin)
+    
+    # Criação da unidade hospitalar padrão
+    unidade = Unidade(
+        nome='Hospital VidaPlus Central',
+        tipo='hospital',
+        endereco='Rua das Flores, 123 - Centro - São Paulo/SP',
+        telefone='(11) 1234-5678',
+        cnpj='12.345.678/0001-90',
+        ativo=True
+    )
+    db.session.add(unidade)
+    db.session.commit()
+    
+    # Criação de leitos removida - funcionalidade não utilizada no sistema atual
+    
+    print("Dados iniciais criados com sucesso!")
+    print("Usuário admin: admin@vidaplus.com")
+    print("Senha: admin123")
+    print("IMPORTANTE: Altere a senha do administrador após o primeiro login!")
+
+# =============================================================================
+# TAREFAS EM SEGUNDO PLANO
+# =============================================================================
+
+# Threads daemon iniciadas por este processo (uma por nome de tarefa)
+tarefas_background = {}
+
+def iniciar_tarefa_periodica(app, nome, intervalo, funcao):
+    """
+    Executa `funcao` a cada `intervalo` segundos numa thread daemon, dentro do
+    contexto da aplicação. Cada tarefa é iniciada uma única vez por processo;
+    erros são registrados e não interrompem a execução seguinte.
+    """
+    if nome in tarefas_background:
+        return tarefas_background[nome]
+    
+    def executar():
+        while True:
+            with app.app_context():
+                try:
+                    funcao()
+                except Exception as e:
+                    print(f"Erro na tarefa {nome}: {e}")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+            time.sleep(intervalo)
+    
+    thread = threading.Thread(target=executar, name=f'vidaplus-{nome}', daemon=True)
+    thread.start()
+    tarefas_background[nome] = thread
+    return thread
+
+def obter_lideranca(nome, dono, duracao_segundos):
+    """
+    Adquire ou renova o lease `nome` para `dono`. Retorna True se este processo
+    é o líder: o lease é assumido apenas se estiver livre, vencido ou já for seu.
+    """
+    agora = datetime.utcnow()
+    expira_em = agora + timedelta(seconds=duracao_segundos)
+    renovadas = Lideranca.query.filter(and_(
+        Lideranca.nome == nome,
+        db.or_(Lideranca.dono == dono, Lideranca.expira_em < agora)
+    )).update({'dono': dono, 'expira_em': expira_em}, synchronize_session=False)
+    if not renovadas:
+        if db.session.get(Lideranca, nome) is not None:
+            db.session.commit()
+            return False
+        try:
+            db.session.add(Lideranca(nome=nome, dono=dono, expira_em=expira_em))
+            db.session.commit()
+        except Exception:
+            # Outro processo criou o lease ao mesmo tempo
+            db.session.rollback()
+            return False
+    db.session.commit()
+    return True
+
+def minuto_utc(data_hora):
+    """Minutos desde a época (UTC) de um datetime; datetimes sem fuso são tratados como UTC"""
+    if data_hora.tzinfo is None:
+        data_hora = data_hora.replace(tzinfo=timezone.utc)
+    return int(data_hora.timestamp() // 60)
+
+class RodaTemporal:
+    """
+    Roda de tempo hierárquica com resolução de um minuto: 60 posições de um
+    minuto, 24 de uma hora e `dias` posições de um dia.
+    
+    Agendar e cancelar são O(1), e avançar um minuto só toca a posição
+    corrente de cada nível. Os itens de um nível superior descem (cascata)
+    quando o nível inferior completa uma volta, e disparam no minuto exato.
+    """
+    
+    ESCALAS = (1, 60, 1440)  # minutos por posição em cada nível
+    
+    def __init__(self, minuto_atual, dias=8):
+        self.minuto = minuto_atual
+        self.tamanhos = (60, 24, dias)
+        self.niveis = [[{} for _ in range(tamanho)] for tamanho in self.tamanhos]
+        self.posicoes = {}  # chave -> (nível, posição)
+    
+    def __len__(self):
+        return len(self.posicoes)
+    
+    def agendar(self, chave, minuto):
+        """Agenda (ou reagenda) `chave`; horários já passados disparam no próximo minuto"""
+        self.cancelar(chave)
+        return self.inserir(chave, max(minuto, self.minuto + 1))
+    
+    def inserir(self, chave, minuto):
+        atraso = minuto - self.minuto
+        for nivel, (escala, tamanho) in enumerate(zip(self.ESCALAS, self.tamanhos)):
+            if atraso < escala * tamanho:
+                posicao = (minuto // escala) % tamanho
+                self.niveis[nivel][posicao][chave] = minuto
+                self.posicoes[chave] = (nivel, posicao)
+                return True
+        return False  # além do horizonte da roda
+    
+    def cancelar(self, chave):
+        posicao = self.posicoes.pop(chave, None)
+        if posicao:
+            del self.niveis[posicao[0]][posicao[1]][chave]
+    
+    def cascatear(self, nivel, posicao):
+        itens = self.niveis[nivel][posicao]
+        self.niveis[nivel][posicao] = {}
+        for chave, minuto in itens.items():
+            del self.posicoes[chave]
+            self.inserir(chave, minuto)
+    
+    def avancar(self, ate_minuto):
+        """Avança a roda até `ate_minuto` e retorna as chaves vencidas"""
+        vencidas = []
+        while self.minuto < ate_minuto:
+            self.minuto += 1
+            if self.minuto % 1440 == 0:
+                self.cascatear(2, (self.minuto // 1440) % self.tamanhos[2])
+            if self.minuto % 60 == 0:
+                self.cascatear(1, (self.minuto // 60) % 24)
+            posicao = self.niveis[0][self.minuto % 60]
+            for chave, minuto in list(posicao.items()):
+                if minuto <= self.minuto:
+                    del posicao[chave]
+                    del self.posicoes[chave]
+                    vencidas.append(chave)
+        return vencidas
+
+# Lembretes enviados antes de cada consulta: (tipo, antecedência)
+LEMBRETES_CONSULTA = (('24h', timedelta(hours=24)), ('1h', timedelta(hours=1)))
+
+class AgendadorLembretes:
+    """
+    Lembretes de consulta (T-24h e T-1h) disparados por uma roda de tempo.
+    
+    Apenas o processo que detém o lease 'lembretes' mantém a roda e dispara;
+    ela é reconstruída a partir de uma consulta por intervalo em data_hora ao
+    assumir a liderança e a cada LEMBRETES_SINCRONIZAR_SEGUNDOS (para incluir
+    consultas gravadas por outros processos), e atualizada localmente pelas
+    rotas de consultas. No disparo, a consulta é conferida no banco e
+    lembretes_enviados garante um único envio.
+    """
+    
+    # Lembretes atrasados (reinício, sincronização) ainda são enviados dentro desta tolerância
+    TOLERANCIA = timedelta(minutes=15)
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.roda = None
+        self.sincronizado_em = None
+        self.dono = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+    
+    def agendar_lembretes(self, consulta_id, data_hora, agora):
+        for tipo, antecedencia in LEMBRETES_CONSULTA:
+            self.roda.cancelar((consulta_id, tipo))
+            disparo = data_hora - antecedencia
+            if disparo >= agora - self.TOLERANCIA and data_hora > agora:
+                self.roda.agendar((consulta_id, tipo), minuto_utc(disparo))
+    
+    def sincronizar(self):
+        """Reconstrói a roda com as consultas agendadas nas próximas 24 horas (mais a tolerância)"""
+        agora = datetime.utcnow()
+        consultas = db.session.query(Consulta.id, Consulta.data_hora).filter(and_(
+            Consulta.data_hora > agora,
+            Consulta.data_hora <= agora + timedelta(hours=24) + self.TOLERANCIA * 2,
+            Consulta.status == 'agendada'
+        )).all()
+        with self.lock:
+            self.roda = RodaTemporal(minuto_utc(agora))
+            for consulta_id, data_hora in consultas:
+                self.agendar_lembretes(consulta_id, data_hora, agora)
+            self.sincronizado_em = agora
+        return len(consultas)
+    
+    def atualizar(self, consulta):
+        """Reagenda os lembretes de uma consulta criada ou alterada neste processo"""
+        with self.lock:
+            if self.roda is None:
+                return
+            data_hora = consulta.data_hora.replace(tzinfo=None)
+            if consulta.status == 'agendada':
+                self.agendar_lembretes(consulta.id, data_hora, datetime.utcnow())
+            else:
+                self.remover_sem_lock(consulta.id)
+    
+    def remover(self, consulta_id):
+        with self.lock:
+            if self.roda is not None:
+                self.remover_sem_lock(consulta_id)
+    
+    def remover_sem_lock(self, consulta_id):
+        for tipo, _ in LEMBRETES_CONSULTA:
+            self.roda.cancelar((consulta_id, tipo))
+    
+    def executar(self):
+        """Passo periódico: renova o lease, sincroniza se necessário e dispara os lembretes vencidos"""
+        config = current_app.config
+        if not obter_lideranca('lembretes', self.dono, config['LEMBRETES_INTERVALO_SEGUNDOS'] * 3):
+            with self.lock:
+                self.roda = None  # outro processo é o líder
+            return 0
+        
+        agora = datetime.utcnow()
+        if self.roda is None or (agora - self.sincronizado_em).total_seconds() >= config['LEMBRETES_SINCRONIZAR_SEGUNDOS']:
+            self.sincronizar()
+        with self.lock:
+            vencidos = self.roda.avancar(minuto_utc(agora))
+        return self.disparar(vencidos) if vencidos else 0
+    
+    def disparar(self, chaves):
+        """Confere as consultas no banco e grava as notificações dos lembretes vencidos em lote"""
+        agora = datetime.utcnow()
+        antecedencias = dict(LEMBRETES_CONSULTA)
+        ids = list({consulta_id for consulta_id, _ in chaves})
+        
+        consultas = {}
+        enviados = set()
+        for inicio in range(0, len(ids), 500):
+            lote = ids[inicio:inicio + 500]
+            for linha in db.session.query(
+                Consulta.id, Consulta.data_hora, Consulta.status, Paciente.usuario_id, Profissional.nome
+            ).join(Paciente, Paciente.id == Consulta.paciente_id).join(
+                Profissional, Profissional.id == Consulta.profissional_id
+            ).filter(Consulta.id.in_(lote)).all():
+                consultas[linha.id] = linha
+            enviados.update(db.session.query(
+                LembreteEnviado.consulta_id, LembreteEnviado.tipo, LembreteEnviado.data_hora_consulta
+            ).filter(LembreteEnviado.consulta_id.in_(lote)).all())
+        
+        itens = []
+        for consulta_id, tipo in chaves:
+            consulta = consultas.get(consulta_id)
+            if not consulta or consulta.status != 'agendada' or consulta.data_hora <= agora:
+                continue
+            if (consulta_id, tipo, consulta.data_hora) in enviados:
+                continue
+            disparo = consulta.data_hora - antecedencias[tipo]
+            if disparo > agora + timedelta(minutes=1):
+                # Remarcada em outro processo: volta para a roda no novo horário
+                with self.lock:
+                    self.roda.agendar((consulta_id, tipo), minuto_utc(disparo))
+                continue
+            if disparo < agora - self.TOLERANCIA:
+                continue
+            
+            db.session.add(LembreteEnviado(consulta_id=consulta_id, tipo=tipo, data_hora_consulta=consulta.data_hora))
+            quando = 'amanhã' if tipo == '24h' else 'em 1 hora'
+            itens.append((
+                consulta.usuario_id,
+                'Lembrete de consulta',
+                f"Sua consulta com {consulta.nome} é {quando}: {consulta.data_hora.strftime('%d/%m/%Y às %H:%M')} (UTC)."
+            ))
+        
+        if itens:
+            criar_notificacoes_em_lote(itens, tipo='agendamento')
+        return len(itens)
+
+agendador_lembretes = AgendadorLembretes()
+
+def purgar_em_lotes(modelo, coluna_data, limite, condicao=None, antes_de_excluir=None, tamanho_lote=5000, pausa=0.05):
+    """
+    Exclui as linhas de `modelo` com `coluna_data` < `limite` (e `condicao`)
+    percorrendo a chave primária em faixas de `tamanho_lote` ids, com um
+    commit por faixa para não segurar o lock de escrita do SQLite. Como os
+    ids crescem com a data de criação, a varredura termina na primeira faixa
+    seguida de uma linha mais nova que o limite. `antes_de_excluir(faixa)` é
+    chamado dentro da transação de cada faixa (arquivamento, contadores).
+    """
+    filtro = coluna_data < limite if condicao is None else and_(coluna_data < limite, condicao)
+    inicio = db.session.query(func.min(modelo.id)).scalar()
+    removidas = 0
+    while inicio is not None:
+        fim = inicio + tamanho_lote
+        faixa = and_(modelo.id >= inicio, modelo.id < fim, filtro)
+        if antes_de_excluir:
+            antes_de_excluir(faixa)
+        removidas += db.session.execute(modelo.__table__.delete().where(faixa)).rowcount
+        db.session.commit()
+        
+        proxima = db.session.query(modelo.id, coluna_data).filter(modelo.id >= fim).order_by(modelo.id).first()
+        if proxima is None or proxima[1] >= limite:
+            break
+        inicio = proxima[0]
+        time.sleep(pausa)
+    return removidas
+
+def descontar_nao_lidas(faixa):
+    """Atualiza o contador de não lidas antes de excluir notificações ainda não lidas"""
+    for usuario_id, total in db.session.query(Notificacao.usuario_id, func.count(Notificacao.id)).filter(
+        and_(faixa, Notificacao.lida == False)
+    ).group_by(Notificacao.usuario_id).all():
+        ajustar_resumo(NotificacoesNaoLidas, {'usuario_id': usuario_id}, -total)
+
+def arquivar_segmento_auditoria(segmento, diretorio, tamanho_lote=5000):
+    """Grava o segmento inteiro em JSON Lines compactado (`<segmento>.jsonl.gz`), em blocos por id"""
+    os.makedirs(diretorio, exist_ok=True)
+    ultimo_id = 0
+    with gzip.open(os.path.join(diretorio, f'{segmento.name}.jsonl.gz'), 'wt', encoding='utf-8') as arquivo:
+        while True:
+            linhas = db.session.execute(
+                db.select(segmento).where(segmento.c.id > ultimo_id).order_by(segmento.c.id).limit(tamanho_lote)
+            ).mappings().all()
+            if not linhas:
+                break
+            for linha in linhas:
+                arquivo.write(json.dumps({
+                    **linha,
+                    'dados_anteriores': descomprimir_payload(linha['dados_anteriores']),
+                    'dados_novos': descomprimir_payload(linha['dados_novos']),
+                    'data_hora': linha['data_hora'].isoformat()
+                }, ensure_ascii=False) + '\n')
+            ultimo_id = linhas[-1]['id']
+
+def descartar_segmentos_auditoria(limite, diretorio_arquivo=None):
+    """
+    Retenção da auditoria: descarta (DROP TABLE) os segmentos cujo mês
+    inteiro é anterior a `limite`, sem DELETE linha a linha. O mês que
+    contém o limite é mantido até vencer por completo.
+    """
+    removidas = 0
+    for segmento in listar_segmentos_auditoria():
+        if segmento.name >= nome_segmento_auditoria(limite):
+            break
+        if diretorio_arquivo:
+            arquivar_segmento_auditoria(segmento, diretorio_arquivo)
+        removidas += db.session.query(func.count()).select_from(segmento).scalar()
+        segmento.drop(bind=db.session.connection())
+        db.session.commit()
+        metadata_auditoria.remove(segmento)
+        segmentos_auditoria_criados.discard(segmento.name)
+    return removidas
+
+def recuperar_espaco(vacuum_completo=False):
+    """Devolve ao sistema de arquivos as páginas livres do SQLite; retorna os bytes recuperados"""
+    if db.engine.dialect.name != 'sqlite':
+        return {'bytes_recuperados': 0, 'bytes_livres': 0}
+    
+    db.session.commit()
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conexao:
+        tamanho_pagina = conexao.exec_driver_sql('PRAGMA page_size').scalar()
+        paginas_antes = conexao.exec_driver_sql('PRAGMA page_count').scalar()
+        if vacuum_completo:
+            conexao.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+            conexao.exec_driver_sql('VACUUM')
+        elif conexao.exec_driver_sql('PRAGMA auto_vacuum').scalar() == 2:
+            # executescript (sqlite3_exec) executa o PRAGMA até o fim; execute() libera uma única página
+            conexao.connection.driver_connection.executescript('PRAGMA incremental_vacuum;')
+        paginas_depois = conexao.exec_driver_sql('PRAGMA page_count').scalar()
+        livres = conexao.exec_driver_sql('PRAGMA freelist_count').scalar()
+    
+    return {
+        'bytes_recuperados': (paginas_antes - paginas_depois) * tamanho_pagina,
+        'bytes_livres': livres * tamanho_pagina  # ainda no arquivo (auto_vacuum desativado)
+    }
+
+def aplicar_retencao(vacuum_completo=False):
+    """
+    Aplica as políticas de retenção (RETENCAO_*) a notificações, feed de
+    alterações, tombstones e auditoria, remove as respostas idempotentes
+    vencidas, recupera o espaço liberado e retorna o relatório da execução.
+    """
+    config = current_app.config
+    agora = datetime.utcnow()
+    inicio = time.monotonic()
+    removidas = {}
+    
+    removidas['notificacoes_lidas'] = purgar_em_lotes(
+        Notificacao, Notificacao.data_criacao,
+        agora - timedelta(days=config['RETENCAO_NOTIFICACOES_LIDAS_DIAS']),
+        condicao=Notificacao.lida == True
+    )
+    removidas['notificacoes'] = purgar_em_lotes(
+        Notificacao, Notificacao.data_criacao,
+        agora - timedelta(days=config['RETENCAO_NOTIFICACOES_DIAS']),
+        antes_de_excluir=descontar_nao_lidas
+    )
+    # A alteração mais recente é mantida para que os consumidores detectem que ficaram para trás
+    removidas['alteracoes'] = purgar_em_lotes(
+        Alteracao, Alteracao.data_hora,
+        agora - timedelta(days=config['RETENCAO_ALTERACOES_DIAS']),
+        condicao=Alteracao.id < db.session.query(func.max(Alteracao.id)).scalar_subquery()
+    )
+    removidas['registros_excluidos'] = purgar_em_lotes(
+        RegistroExcluido, RegistroExcluido.data_exclusao,
+        agora - timedelta(days=config['RETENCAO_EXCLUSOES_DIAS'])
+    )
+    removidas['respostas_idempotentes'] = purgar_em_lotes(
+        RespostaIdempotente, RespostaIdempotente.expira_em, agora
+    )
+    removidas['auditoria'] = descartar_segmentos_auditoria(
+        agora - timedelta(days=config['RETENCAO_AUDITORIA_DIAS']),
+        config['RETENCAO_ARQUIVO_DIR'] or None
+    )
+    
+    relatorio = {
+        'executado_em': agora.isoformat(),
+        'linhas_removidas': removidas,
+        **recuperar_espaco(vacuum_completo),
+        'duracao_segundos': round(time.monotonic() - inicio, 3)
+    }
+    print(f"🧹 Retenção: {sum(removidas.values())} linhas removidas, {relatorio['bytes_recuperados']} bytes recuperados")
+    return relatorio
+
+def encerrar_prescricoes_vencidas(tamanho_lote=1000, pausa=0.05):
+    """
+    Passa para 'encerrada' as prescrições ativas com data_fim vencida, em lotes
+    (índice status + data_fim) com um commit por lote, registrando-as no feed
+    de alterações. Retorna o total encerrado.
+    """
+    agora = datetime.utcnow()
+    total = 0
+    while True:
+        ids = [prescricao_id for prescricao_id, in db.session.query(Prescricao.id).filter(
+            Prescricao.status == 'ativa',
+            Prescricao.data_fim < agora
+        ).order_by(Prescricao.data_fim).limit(tamanho_lote).all()]
+        if not ids:
+            break
+        db.session.execute(Prescricao.__table__.update().where(
+            Prescricao.id.in_(ids), Prescricao.status == 'ativa'
+        ).values(status='encerrada'))
+        registrar_alteracoes_em_massa('prescricoes', ids, 'UPDATE')
+        db.session.commit()
+        total += len(ids)
+        if len(ids) < tamanho_lote:
+            break
+        time.sleep(pausa)
+    return total
+
+def executar_encerramento_prescricoes():
+    """Passo periódico: apenas o processo com o lease 'prescricoes' encerra as vencidas"""
+    if obter_lideranca('prescricoes', agendador_lembretes.dono, current_app.config['PRESCRICOES_INTERVALO_SEGUNDOS'] // 2):
+        return encerrar_prescricoes_vencidas()
+
+def executar_retencao():
+    """Passo periódico da retenção: apenas o processo com o lease 'retencao' executa"""
+    if obter_lideranca('retencao', agendador_lembretes.dono, current_app.config['RETENCAO_INTERVALO_SEGUNDOS'] // 2):
+        return aplicar_retencao()
+
+def iniciar_tarefas_background(app):
+    """Inicia as tarefas periódicas da aplicação (desligáveis com TAREFAS_BACKGROUND=false)"""
+    if not app.config['TAREFAS_BACKGROUND']:
+        return
+    iniciar_tarefa_periodica(app, 'painel', app.config['PAINEL_INTERVALO_SEGUNDOS'], painel_kpi.recalcular)
+    fila_relatorios.iniciar(app, app.config['RELATORIOS_WORKERS'])
+    iniciar_tarefa_periodica(app, 'lembretes', app.config['LEMBRETES_INTERVALO_SEGUNDOS'], agendador_lembretes.executar)
+    iniciar_tarefa_periodica(app, 'limpeza_relatorios', 3600, limpar_relatorios_expirados)
+    iniciar_tarefa_periodica(app, 'retencao', app.config['RETENCAO_INTERVALO_SEGUNDOS'], executar_retencao)
+    iniciar_tarefa_periodica(app, 'prescricoes', app.config['PRESCRICOES_INTERVALO_SEGUNDOS'], executar_encerramento_prescricoes)
+    if app.config['SNAPSHOT_INTERVALO_SEGUNDOS'] > 0:
+        iniciar_tarefa_periodica(
+            app, 'snapshot', app.config['SNAPSHOT_INTERVALO_SEGUNDOS'],
+            lambda: exportar_snapshot(app.config['SNAPSHOT_DIR'])
+        )
+
+# =============================================================================
+# BLUEPRINTS E ROTAS
+# =============================================================================
+
+# Blueprint para autenticação
+auth_bp = Blueprint('auth', __name__)
+
+@auth_bp.route('/login', methods=['POST'])
+def login():
+    """Endpoint para autenticação de usuários"""
+    try:
+        dados = request.get_json()
+        if not dados:
+            return jsonify({'erro': 'Dados não fornecidos'}), 400
+        
+        email = dados.get('email')
+        senha = dados.get('senha')
+        
+        if not email or not senha:
+            return jsonify({'erro': 'Email e senha são obrigatórios'}), 400
+        
+        usuario = Usuario.query.filter_by(email=email).first()
+        
+        if not usuario or not usuario.check_senha(senha):
+            return jsonify({'erro': 'Email ou senha inválidos'}), 401
+        
+        if not usuario.ativo:
+            return jsonify({'erro': 'Conta desativada. Entre em contato com o administrador.'}), 403
+        
+        usuario.ultimo_acesso = datetime.utcnow()
+        db.session.commit()
+        
+        token = create_access_token(identity=usuario.id)
+        
+        registrar_auditoria(
+            usuario_id=usuario.id,
+            acao='LOGIN',
+            tabela='usuarios',
+            registro_id=usuario.id,
+            dados_novos=json.dumps({'ultimo_acesso': usuario.ultimo_acesso.isoformat()})
+        )
+        
+        return jsonify({
+            'mensagem': 'Login realizado com sucesso',
+            'token': token,
+            'usuario': {
+                'id': usuario.id,
+                'email': usuario.email,
+                'tipo': usuario.tipo,
+                'ativo': usuario.ativo
+            }
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+@auth_bp.route('/registro', methods=['POST'])
+def registro():
+    """Endpoint para registro de novos usuários"""
+    try:
+        dados = request.get_json()
+        if not dados:
             return jsonify({'erro': 'Dados não fornecidos'}), 400
         
         email = dados.get('email')
@@ -578,34 +2543,381 @@ def alterar_senha():
 
 @auth_bp.route('/logout', methods=['POST'])
 @jwt_required()
-def logout():
-    """Endpoint para logout do usuário"""
+def logout():
+    """Endpoint para logout do usuário"""
+    try:
+        usuario_id = get_jwt_identity()
+        usuario = Usuario.query.get(usuario_id)
+        
+        if not usuario:
+            return jsonify({'erro': 'Usuário não encontrado'}), 404
+        
+        registrar_auditoria(
+            usuario_id=usuario.id,
+            acao='LOGOUT',
+            tabela='usuarios',
+            registro_id=usuario.id
+        )
+        
+        return jsonify({'mensagem': 'Logout realizado com sucesso'}), 200
+        
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+# Blueprint para pacientes
+pacientes_bp = Blueprint('pacientes', __name__)
+
+@pacientes_bp.route('/', methods=['POST'])
+@jwt_required()
+@idempotente
+def cadastrar_paciente():
+    """Endpoint para cadastrar um novo paciente"""
+    try:
+        usuario_id = get_jwt_identity()
+        dados = request.get_json()
+        
+        if not dados:
+            return jsonify({'erro': 'Dados não fornecidos'}), 400
+        
+        campos_obrigatorios = ['email', 'senha', 'cpf', 'nome', 'data_nascimento', 'sexo']
+        for campo in campos_obrigatorios:
+            if campo not in dados or not dados[campo]:
+                return jsonify({'erro': f'Campo {campo} é obrigatório'}), 400
+        
+        validacao_cpf = validar_cpf(dados['cpf'])
+        if not validacao_cpf['valido']:
+            return jsonify({'erro': validacao_cpf['mensagem']}), 400
+        
+        cpf_limpo = re.sub(r'[^0-9]', '', dados['cpf'])
+        cpf_numero = int(cpf_limpo)
+        if db.session.query(Paciente.query.filter_by(cpf_numero=cpf_numero).exists()).scalar():
+            return jsonify({'erro': 'CPF já cadastrado'}), 409
+        
+        if Usuario.query.filter_by(email=dados['email']).first():
+            return jsonify({'erro': 'Email já está em uso'}), 409
+        
+        sexos_validos = ['M', 'F', 'O']
+        if dados['sexo'] not in sexos_validos:
+            return jsonify({'erro': 'Sexo deve ser M, F ou O'}), 400
+        
+        try:
+            data_nasc = datetime.strptime(dados['data_nascimento'], '%Y-%m-%d').date()
+            if data_nasc > date.today():
+                return jsonify({'erro': 'Data de nascimento não pode ser futura'}), 400
+        except ValueError:
+            return jsonify({'erro': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
+        
+        usuario = Usuario(
+            email=dados['email'],
+            tipo='paciente',
+            ativo=True,
+            data_criacao=datetime.utcnow()
+        )
+        usuario.set_senha(dados['senha'])
+        
+        db.session.add(usuario)
+        db.session.flush()
+        
+        paciente = Paciente(
+            usuario_id=usuario.id,
+            cpf=formatar_cpf(cpf_limpo),
+            cpf_numero=cpf_numero,
+            nome=dados['nome'],
+            data_nascimento=data_nasc,
+            sexo=dados['sexo'],
+            telefone=dados.get('telefone'),
+            endereco=dados.get('endereco'),
+            plano_saude=dados.get('plano_saude'),
+            alergias=dados.get('alergias'),
+            medicamentos_uso=dados.get('medicamentos_uso'),
+            historico_familiar=dados.get('historico_familiar')
+        )
+        
+        db.session.add(paciente)
+        if paciente.medicamentos_uso:
+            db.session.flush()
+            vincular_medicamentos_paciente(paciente)
+        db.session.commit()
+        
+        autocomplete_pacientes.atualizar(paciente.id, paciente.nome)
+        
+        registrar_auditoria(
+            usuario_id=usuario_id,
+            acao='CREATE',
+            tabela='pacientes',
+            registro_id=paciente.id,
+            dados_novos=json.dumps({
+                'nome': paciente.nome,
+                'cpf': paciente.cpf,
+                'email': usuario.email
+            })
+        )
+        
+        criar_notificacao(
+            usuario_id=usuario.id,
+            titulo='Bem-vindo ao VidaPlus!',
+            mensagem=f'Olá {paciente.nome}, seu cadastro foi realizado com sucesso!',
+            tipo='sistema'
+        )
+        
+        return jsonify({
+            'mensagem': 'Paciente cadastrado com sucesso',
+            'paciente': {
+                'id': paciente.id,
+                'nome': paciente.nome,
+                'cpf': paciente.cpf,
+                'email': usuario.email,
+                'data_nascimento': paciente.data_nascimento.isoformat(),
+                'sexo': paciente.sexo
+            }
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+@pacientes_bp.route('/', methods=['GET'])
+@jwt_required()
+def listar_pacientes():
+    """Endpoint para listar pacientes com filtros"""
+    try:
+        nome = request.args.get('nome', '').strip()
+        cpf = request.args.get('cpf', '').strip()
+        plano_saude = request.args.get('plano_saude', '').strip()
+        page = int(request.args.get('page', 1))
+        per_page = min(int(request.args.get('per_page', 10)), 100)
+        
+        # Busca em lote: ?ids=1,2,3
+        if request.args.get('ids') is not None:
+            validacao_ids = validar_ids(request.args.get('ids'))
+            if not validacao_ids['valido']:
+                return jsonify({'erro': validacao_ids['mensagem']}), 400
+            
+            lote = buscar_em_lote(Paciente, validacao_ids['ids'], [joinedload(Paciente.usuario)])
+            return jsonify({
+                'pacientes': [serializar_paciente(paciente) for paciente in lote['encontrados']],
+                'nao_encontrados': lote['nao_encontrados']
+            }), 200
+        
+        query = Paciente.query.join(Usuario).filter(Paciente.excluido_em.is_(None))
+        ordenacao = [Paciente.nome]
+        
+        if (nome or plano_saude) and busca_textual['disponivel']:
+            # Busca pelo índice FTS5 (sem acentos), ordenada por relevância
+            filtros = {}
+            if nome:
+                filtros['nome'] = nome
+            if plano_saude:
+                filtros['plano_saude'] = plano_saude
+            resultados = montar_busca_textual('pacientes_fts', filtros)
+            if resultados is None:
+                query = query.filter(db.false())
+            else:
+                query = query.join(resultados, resultados.c.id == Paciente.id)
+                ordenacao = [resultados.c.rank, Paciente.nome]
+        else:
+            if nome:
+                query = query.filter(Paciente.nome.ilike(f'%{nome}%'))
+            if plano_saude:
+                query = query.filter(Paciente.plano_saude.ilike(f'%{plano_saude}%'))
+        
+        if cpf:
+            query = query.filter(Paciente.cpf_numero == cpf_para_numero(cpf))
+        
+        query = query.order_by(*ordenacao)
+        
+        paginacao = query.paginate(
+            page=page,
+            per_page=per_page,
+            error_out=False
+        )
+        
+        pacientes = [serializar_paciente(paciente) for paciente in paginacao.items]
+        
+        return jsonify({
+            'pacientes': pacientes,
+            'paginacao': {
+                'pagina_atual': page,
+                'total_paginas': paginacao.pages,
+                'total_registros': paginacao.total,
+                'registros_por_pagina': per_page,
+                'tem_proxima': paginacao.has_next,
+                'tem_anterior': paginacao.has_prev
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+@pacientes_bp.route('/autocomplete', methods=['GET'])
+@jwt_required()
+def autocompletar_pacientes():
+    """Endpoint de autocompletar nomes de pacientes (índice em memória)"""
+    try:
+        q = request.args.get('q', '').strip()
+        limite = min(int(request.args.get('limite', 10)), 50)
+        
+        if not q:
+            return jsonify({'erro': 'Parâmetro q é obrigatório'}), 400
+        
+        return jsonify({
+            'pacientes': autocomplete_pacientes.buscar(q, limite)
+        }), 200
+        
+    except ValueError:
+        return jsonify({'erro': 'Parâmetro limite inválido'}), 400
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+@pacientes_bp.route('/<int:paciente_id>', methods=['GET'])
+@jwt_required()
+def buscar_paciente(paciente_id):
+    """Endpoint para buscar um paciente específico"""
+    try:
+        paciente = buscar_ativo(Paciente, paciente_id)
+        if not paciente:
+            return jsonify({'erro': 'Paciente não encontrado'}), 404
+        
+        return jsonify({
+            'paciente': {
+                'id': paciente.id,
+                'nome': paciente.nome,
+                'cpf': paciente.cpf,
+                'email': paciente.usuario.email,
+                'data_nascimento': paciente.data_nascimento.isoformat(),
+                'sexo': paciente.sexo,
+                'telefone': paciente.telefone,
+                'endereco': paciente.endereco,
+                'plano_saude': paciente.plano_saude,
+                'alergias': paciente.alergias,
+                'medicamentos_uso': paciente.medicamentos_uso,
+                'historico_familiar': paciente.historico_familiar,
+                'ativo': paciente.usuario.ativo
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+@pacientes_bp.route('/<int:paciente_id>', methods=['PUT'])
+@jwt_required()
+def atualizar_paciente(paciente_id):
+    """Endpoint para atualizar dados de um paciente"""
+    try:
+        usuario_id = get_jwt_identity()
+        paciente = buscar_ativo(Paciente, paciente_id)
+        if not paciente:
+            return jsonify({'erro': 'Paciente não encontrado'}), 404
+        
+        dados = request.get_json()
+        if not dados:
+            return jsonify({'erro': 'Dados não fornecidos'}), 400
+        
+        # Atualiza campos permitidos
+        if 'nome' in dados:
+            paciente.nome = dados['nome']
+        if 'telefone' in dados:
+            paciente.telefone = dados['telefone']
+        if 'endereco' in dados:
+            paciente.endereco = dados['endereco']
+        if 'plano_saude' in dados:
+            paciente.plano_saude = dados['plano_saude']
+        if 'alergias' in dados:
+            paciente.alergias = dados['alergias']
+        if 'medicamentos_uso' in dados:
+            paciente.medicamentos_uso = dados['medicamentos_uso']
+        if 'historico_familiar' in dados:
+            paciente.historico_familiar = dados['historico_familiar']
+        
+        # Sem alterações efetivas não há commit nem registro de auditoria
+        anteriores, novos = diferencas_pendentes(paciente)
+        if novos:
+            if 'medicamentos_uso' in novos:
+                vincular_medicamentos_paciente(paciente)
+            db.session.commit()
+            
+            if 'nome' in novos:
+                autocomplete_pacientes.atualizar(paciente.id, paciente.nome)
+            
+            registrar_auditoria(
+                usuario_id=usuario_id,
+                acao='UPDATE',
+                tabela='pacientes',
+                registro_id=paciente.id,
+                dados_anteriores=json_auditoria(anteriores),
+                dados_novos=json_auditoria(novos)
+            )
+        
+        return jsonify({
+            'mensagem': 'Paciente atualizado com sucesso',
+            'paciente': {
+                'id': paciente.id,
+                'nome': paciente.nome,
+                'telefone': paciente.telefone,
+                'endereco': paciente.endereco,
+                'plano_saude': paciente.plano_saude
+            }
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+@pacientes_bp.route('/<int:paciente_id>', methods=['DELETE'])
+@jwt_required()
+def excluir_paciente(paciente_id):
+    """Endpoint para excluir um paciente"""
     try:
         usuario_id = get_jwt_identity()
-        usuario = Usuario.query.get(usuario_id)
+        paciente = buscar_ativo(Paciente, paciente_id)
+        if not paciente:
+            return jsonify({'erro': 'Paciente não encontrado'}), 404
         
-        if not usuario:
-            return jsonify({'erro': 'Usuário não encontrado'}), 404
+        modo = request.args.get('modo', 'fisica')
+        if modo not in ('fisica', 'logica'):
+            return jsonify({'erro': 'Modo de exclusão inválido. Use fisica ou logica'}), 400
+        
+        dados_anteriores = json.dumps({
+            'nome': paciente.nome,
+            'cpf': paciente.cpf,
+            'email': paciente.usuario.email
+        })
+        
+        if modo == 'logica':
+            # Mantém o histórico (consultas e prescrições) e bloqueia o acesso do usuário
+            paciente.excluido_em = datetime.utcnow()
+            paciente.usuario.ativo = False
+            db.session.commit()
+        else:
+            erro = excluir_cadastro(paciente)
+            if erro:
+                return jsonify({'erro': erro}), 400
+        
+        autocomplete_pacientes.remover(paciente_id)
         
         registrar_auditoria(
-            usuario_id=usuario.id,
-            acao='LOGOUT',
-            tabela='usuarios',
-            registro_id=usuario.id
+            usuario_id=usuario_id,
+            acao='DELETE',
+            tabela='pacientes',
+            registro_id=paciente_id,
+            dados_anteriores=dados_anteriores,
+            dados_novos=json.dumps({'modo': modo})
         )
         
-        return jsonify({'mensagem': 'Logout realizado com sucesso'}), 200
+        return jsonify({'mensagem': 'Paciente excluído com sucesso'}), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-# Blueprint para pacientes
-pacientes_bp = Blueprint('pacientes', __name__)
+# Blueprint para profissionais
+profissionais_bp = Blueprint('profissionais', __name__)
 
-@pacientes_bp.route('/', methods=['POST'])
+@profissionais_bp.route('/', methods=['POST'])
 @jwt_required()
-def cadastrar_paciente():
-    """Endpoint para cadastrar um novo paciente"""
+@idempotente
+def cadastrar_profissional():
+    """Endpoint para cadastrar um novo profissional"""
     try:
         usuario_id = get_jwt_identity()
         dados = request.get_json()
@@ -613,36 +2925,40 @@ def cadastrar_paciente():
         if not dados:
             return jsonify({'erro': 'Dados não fornecidos'}), 400
         
-        campos_obrigatorios = ['email', 'senha', 'cpf', 'nome', 'data_nascimento', 'sexo']
+        campos_obrigatorios = ['email', 'senha', 'crm_coren', 'nome', 'especialidade']
         for campo in campos_obrigatorios:
             if campo not in dados or not dados[campo]:
                 return jsonify({'erro': f'Campo {campo} é obrigatório'}), 400
         
-        validacao_cpf = validar_cpf(dados['cpf'])
-        if not validacao_cpf['valido']:
-            return jsonify({'erro': validacao_cpf['mensagem']}), 400
+        validacao_crm = validar_crm(dados['crm_coren'])
+        if not validacao_crm['valido']:
+            return jsonify({'erro': validacao_crm['mensagem']}), 400
         
-        cpf_limpo = re.sub(r'[^0-9]', '', dados['cpf'])
-        if Paciente.query.filter_by(cpf=formatar_cpf(cpf_limpo)).first():
-            return jsonify({'erro': 'CPF já cadastrado'}), 409
+        crm_limpo = re.sub(r'[^0-9]', '', dados['crm_coren'])
+        if Profissional.query.filter_by(crm_coren=crm_limpo).first():
+            return jsonify({'erro': 'CRM/COREN já cadastrado'}), 409
         
         if Usuario.query.filter_by(email=dados['email']).first():
             return jsonify({'erro': 'Email já está em uso'}), 409
         
-        sexos_validos = ['M', 'F', 'O']
-        if dados['sexo'] not in sexos_validos:
-            return jsonify({'erro': 'Sexo deve ser M, F ou O'}), 400
+        especialidades_validas = [
+            'Cardiologia', 'Cardiologia Intervencionista', 'Pediatria', 'Ortopedia', 
+            'Ginecologia', 'Clínico Geral', 'Neurologia', 'Dermatologia', 
+            'Anestesiologia', 'Cirurgia Geral'
+        ]
+        if dados['especialidade'] not in especialidades_validas:
+            return jsonify({'erro': 'Especialidade inválida'}), 400
         
         try:
-            data_nasc = datetime.strptime(dados['data_nascimento'], '%Y-%m-%d').date()
-            if data_nasc > date.today():
-                return jsonify({'erro': 'Data de nascimento não pode ser futura'}), 400
+            data_admissao = datetime.strptime(dados['data_admissao'], '%Y-%m-%d').date()
+            if data_admissao > date.today():
+                return jsonify({'erro': 'Data de admissão não pode ser futura'}), 400
         except ValueError:
             return jsonify({'erro': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
         
         usuario = Usuario(
             email=dados['email'],
-            tipo='paciente',
+            tipo='profissional',
             ativo=True,
             data_criacao=datetime.utcnow()
         )
@@ -651,31 +2967,27 @@ def cadastrar_paciente():
         db.session.add(usuario)
         db.session.flush()
         
-        paciente = Paciente(
+        profissional = Profissional(
             usuario_id=usuario.id,
-            cpf=formatar_cpf(cpf_limpo),
+            crm_coren=crm_limpo,
             nome=dados['nome'],
-            data_nascimento=data_nasc,
-            sexo=dados['sexo'],
+            especialidade=dados['especialidade'],
             telefone=dados.get('telefone'),
-            endereco=dados.get('endereco'),
-            plano_saude=dados.get('plano_saude'),
-            alergias=dados.get('alergias'),
-            medicamentos_uso=dados.get('medicamentos_uso'),
-            historico_familiar=dados.get('historico_familiar')
+            email_profissional=dados.get('email_profissional'),
+            data_admissao=data_admissao
         )
         
-        db.session.add(paciente)
+        db.session.add(profissional)
         db.session.commit()
         
         registrar_auditoria(
             usuario_id=usuario_id,
             acao='CREATE',
-            tabela='pacientes',
-            registro_id=paciente.id,
+            tabela='profissionais',
+            registro_id=profissional.id,
             dados_novos=json.dumps({
-                'nome': paciente.nome,
-                'cpf': paciente.cpf,
+                'nome': profissional.nome,
+                'crm_coren': profissional.crm_coren,
                 'email': usuario.email
             })
         )
@@ -683,19 +2995,19 @@ def cadastrar_paciente():
         criar_notificacao(
             usuario_id=usuario.id,
             titulo='Bem-vindo ao VidaPlus!',
-            mensagem=f'Olá {paciente.nome}, seu cadastro foi realizado com sucesso!',
+            mensagem=f'Olá {profissional.nome}, seu cadastro como profissional foi realizado com sucesso!',
             tipo='sistema'
         )
         
         return jsonify({
-            'mensagem': 'Paciente cadastrado com sucesso',
-            'paciente': {
-                'id': paciente.id,
-                'nome': paciente.nome,
-                'cpf': paciente.cpf,
+            'mensagem': 'Profissional cadastrado com sucesso',
+            'profissional': {
+                'id': profissional.id,
+                'nome': profissional.nome,
+                'crm_coren': profissional.crm_coren,
                 'email': usuario.email,
-                'data_nascimento': paciente.data_nascimento.isoformat(),
-                'sexo': paciente.sexo
+                'especialidade': profissional.especialidade,
+                'data_admissao': profissional.data_admissao.isoformat()
             }
         }), 201
         
@@ -703,30 +3015,51 @@ def cadastrar_paciente():
         db.session.rollback()
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@pacientes_bp.route('/', methods=['GET'])
+@profissionais_bp.route('/', methods=['GET'])
 @jwt_required()
-def listar_pacientes():
-    """Endpoint para listar pacientes com filtros"""
+def listar_profissionais():
+    """Endpoint para listar profissionais com filtros"""
     try:
         nome = request.args.get('nome', '').strip()
-        cpf = request.args.get('cpf', '').strip()
-        plano_saude = request.args.get('plano_saude', '').strip()
+        especialidade = request.args.get('especialidade', '').strip()
         page = int(request.args.get('page', 1))
         per_page = min(int(request.args.get('per_page', 10)), 100)
         
-        query = Paciente.query.join(Usuario)
-        
-        if nome:
-            query = query.filter(Paciente.nome.ilike(f'%{nome}%'))
-        
-        if cpf:
-            cpf_formatado = formatar_cpf(re.sub(r'[^0-9]', '', cpf))
-            query = query.filter(Paciente.cpf == cpf_formatado)
-        
-        if plano_saude:
-            query = query.filter(Paciente.plano_saude.ilike(f'%{plano_saude}%'))
+        # Busca em lote: ?ids=1,2,3
+        if request.args.get('ids') is not None:
+            validacao_ids = validar_ids(request.args.get('ids'))
+            if not validacao_ids['valido']:
+                return jsonify({'erro': validacao_ids['mensagem']}), 400
+            
+            lote = buscar_em_lote(Profissional, validacao_ids['ids'], [joinedload(Profissional.usuario)])
+            return jsonify({
+                'profissionais': [serializar_profissional(profissional) for profissional in lote['encontrados']],
+                'nao_encontrados': lote['nao_encontrados']
+            }), 200
         
-        query = query.order_by(Paciente.nome)
+        query = Profissional.query.join(Usuario).filter(Profissional.excluido_em.is_(None))
+        ordenacao = [Profissional.nome]
+        
+        if (nome or especialidade) and busca_textual['disponivel']:
+            # Busca pelo índice FTS5 (sem acentos), ordenada por relevância
+            filtros = {}
+            if nome:
+                filtros['nome'] = nome
+            if especialidade:
+                filtros['especialidade'] = especialidade
+            resultados = montar_busca_textual('profissionais_fts', filtros)
+            if resultados is None:
+                query = query.filter(db.false())
+            else:
+                query = query.join(resultados, resultados.c.id == Profissional.id)
+                ordenacao = [resultados.c.rank, Profissional.nome]
+        else:
+            if nome:
+                query = query.filter(Profissional.nome.ilike(f'%{nome}%'))
+            if especialidade:
+                query = query.filter(Profissional.especialidade.ilike(f'%{especialidade}%'))
+        
+        query = query.order_by(*ordenacao)
         
         paginacao = query.paginate(
             page=page,
@@ -734,22 +3067,10 @@ def listar_pacientes():
             error_out=False
         )
         
-        pacientes = []
-        for paciente in paginacao.items:
-            pacientes.append({
-                'id': paciente.id,
-                'nome': paciente.nome,
-                'cpf': paciente.cpf,
-                'email': paciente.usuario.email,
-                'data_nascimento': paciente.data_nascimento.isoformat(),
-                'sexo': paciente.sexo,
-                'telefone': paciente.telefone,
-                'plano_saude': paciente.plano_saude,
-                'ativo': paciente.usuario.ativo
-            })
+        profissionais = [serializar_profissional(profissional) for profissional in paginacao.items]
         
         return jsonify({
-            'pacientes': pacientes,
+            'profissionais': profissionais,
             'paginacao': {
                 'pagina_atual': page,
                 'total_paginas': paginacao.pages,
@@ -763,45 +3084,41 @@ def listar_pacientes():
     except Exception as e:
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@pacientes_bp.route('/<int:paciente_id>', methods=['GET'])
+@profissionais_bp.route('/<int:profissional_id>', methods=['GET'])
 @jwt_required()
-def buscar_paciente(paciente_id):
-    """Endpoint para buscar um paciente específico"""
+def buscar_profissional(profissional_id):
+    """Endpoint para buscar um profissional específico"""
     try:
-        paciente = Paciente.query.get(paciente_id)
-        if not paciente:
-            return jsonify({'erro': 'Paciente não encontrado'}), 404
+        profissional = buscar_ativo(Profissional, profissional_id)
+        if not profissional:
+            return jsonify({'erro': 'Profissional não encontrado'}), 404
         
         return jsonify({
-            'paciente': {
-                'id': paciente.id,
-                'nome': paciente.nome,
-                'cpf': paciente.cpf,
-                'email': paciente.usuario.email,
-                'data_nascimento': paciente.data_nascimento.isoformat(),
-                'sexo': paciente.sexo,
-                'telefone': paciente.telefone,
-                'endereco': paciente.endereco,
-                'plano_saude': paciente.plano_saude,
-                'alergias': paciente.alergias,
-                'medicamentos_uso': paciente.medicamentos_uso,
-                'historico_familiar': paciente.historico_familiar,
-                'ativo': paciente.usuario.ativo
+            'profissional': {
+                'id': profissional.id,
+                'nome': profissional.nome,
+                'crm_coren': profissional.crm_coren,
+                'email': profissional.usuario.email,
+                'especialidade': profissional.especialidade,
+                'telefone': profissional.telefone,
+                'email_profissional': profissional.email_profissional,
+                'data_admissao': profissional.data_admissao.isoformat(),
+                'ativo': profissional.usuario.ativo
             }
         }), 200
         
     except Exception as e:
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@pacientes_bp.route('/<int:paciente_id>', methods=['PUT'])
+@profissionais_bp.route('/<int:profissional_id>', methods=['PUT'])
 @jwt_required()
-def atualizar_paciente(paciente_id):
-    """Endpoint para atualizar dados de um paciente"""
+def atualizar_profissional(profissional_id):
+    """Endpoint para atualizar dados de um profissional"""
     try:
         usuario_id = get_jwt_identity()
-        paciente = Paciente.query.get(paciente_id)
-        if not paciente:
-            return jsonify({'erro': 'Paciente não encontrado'}), 404
+        profissional = buscar_ativo(Profissional, profissional_id)
+        if not profissional:
+            return jsonify({'erro': 'Profissional não encontrado'}), 404
         
         dados = request.get_json()
         if not dados:
@@ -809,38 +3126,43 @@ def atualizar_paciente(paciente_id):
         
         # Atualiza campos permitidos
         if 'nome' in dados:
-            paciente.nome = dados['nome']
+            profissional.nome = dados['nome']
+        if 'especialidade' in dados:
+            especialidades_validas = [
+                'Cardiologia', 'Cardiologia Intervencionista', 'Pediatria', 'Ortopedia', 
+                'Ginecologia', 'Clínico Geral', 'Neurologia', 'Dermatologia', 
+                'Anestesiologia', 'Cirurgia Geral'
+            ]
+            if dados['especialidade'] not in especialidades_validas:
+                return jsonify({'erro': 'Especialidade inválida'}), 400
+            profissional.especialidade = dados['especialidade']
         if 'telefone' in dados:
-            paciente.telefone = dados['telefone']
-        if 'endereco' in dados:
-            paciente.endereco = dados['endereco']
-        if 'plano_saude' in dados:
-            paciente.plano_saude = dados['plano_saude']
-        if 'alergias' in dados:
-            paciente.alergias = dados['alergias']
-        if 'medicamentos_uso' in dados:
-            paciente.medicamentos_uso = dados['medicamentos_uso']
-        if 'historico_familiar' in dados:
-            paciente.historico_familiar = dados['historico_familiar']
-        
-        db.session.commit()
+            profissional.telefone = dados['telefone']
+        if 'email_profissional' in dados:
+            profissional.email_profissional = dados['email_profissional']
         
-        registrar_auditoria(
-            usuario_id=usuario_id,
-            acao='UPDATE',
-            tabela='pacientes',
-            registro_id=paciente.id,
-            dados_novos=json.dumps(dados)
-        )
+        # Sem alterações efetivas não há commit nem registro de auditoria
+        anteriores, novos = diferencas_pendentes(profissional)
+        if novos:
+            db.session.commit()
+            
+            registrar_auditoria(
+                usuario_id=usuario_id,
+                acao='UPDATE',
+                tabela='profissionais',
+                registro_id=profissional.id,
+                dados_anteriores=json_auditoria(anteriores),
+                dados_novos=json_auditoria(novos)
+            )
         
         return jsonify({
-            'mensagem': 'Paciente atualizado com sucesso',
-            'paciente': {
-                'id': paciente.id,
-                'nome': paciente.nome,
-                'telefone': paciente.telefone,
-                'endereco': paciente.endereco,
-                'plano_saude': paciente.plano_saude
+            'mensagem': 'Profissional atualizado com sucesso',
+            'profissional': {
+                'id': profissional.id,
+                'nome': profissional.nome,
+                'crm_coren': profissional.crm_coren,
+                'especialidade': profissional.especialidade,
+                'telefone': profissional.telefone
             }
         }), 200
         
@@ -848,56 +3170,60 @@ def atualizar_paciente(paciente_id):
         db.session.rollback()
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@pacientes_bp.route('/<int:paciente_id>', methods=['DELETE'])
+@profissionais_bp.route('/<int:profissional_id>', methods=['DELETE'])
 @jwt_required()
-def excluir_paciente(paciente_id):
-    """Endpoint para excluir um paciente"""
+def excluir_profissional(profissional_id):
+    """Endpoint para excluir um profissional"""
     try:
         usuario_id = get_jwt_identity()
-        paciente = Paciente.query.get(paciente_id)
-        if not paciente:
-            return jsonify({'erro': 'Paciente não encontrado'}), 404
+        profissional = buscar_ativo(Profissional, profissional_id)
+        if not profissional:
+            return jsonify({'erro': 'Profissional não encontrado'}), 404
         
-        # Verifica se há consultas associadas
-        if paciente.consultas:
-            return jsonify({'erro': 'Não é possível excluir paciente com consultas associadas'}), 400
+        modo = request.args.get('modo', 'fisica')
+        if modo not in ('fisica', 'logica'):
+            return jsonify({'erro': 'Modo de exclusão inválido. Use fisica ou logica'}), 400
         
         dados_anteriores = json.dumps({
-            'nome': paciente.nome,
-            'cpf': paciente.cpf,
-            'email': paciente.usuario.email
+            'nome': profissional.nome,
+            'crm_coren': profissional.crm_coren,
+            'email': profissional.usuario.email
         })
         
-        # Primeiro excluir notificações do usuário
-        notificacoes = Notificacao.query.filter_by(usuario_id=paciente.usuario.id).all()
-        for notificacao in notificacoes:
-            db.session.delete(notificacao)
-        
-        db.session.delete(paciente)
-        db.session.delete(paciente.usuario)
-        db.session.commit()
+        if modo == 'logica':
+            # Mantém o histórico (consultas e prescrições) e bloqueia o acesso do usuário
+            profissional.excluido_em = datetime.utcnow()
+            profissional.ativo = False
+            profissional.usuario.ativo = False
+            db.session.commit()
+        else:
+            erro = excluir_cadastro(profissional)
+            if erro:
+                return jsonify({'erro': erro}), 400
         
         registrar_auditoria(
             usuario_id=usuario_id,
             acao='DELETE',
-            tabela='pacientes',
-            registro_id=paciente_id,
-            dados_anteriores=dados_anteriores
+            tabela='profissionais',
+            registro_id=profissional_id,
+            dados_anteriores=dados_anteriores,
+            dados_novos=json.dumps({'modo': modo})
         )
         
-        return jsonify({'mensagem': 'Paciente excluído com sucesso'}), 200
+        return jsonify({'mensagem': 'Profissional excluído com sucesso'}), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-# Blueprint para profissionais
-profissionais_bp = Blueprint('profissionais', __name__)
+# Blueprint para consultas
+consultas_bp = Blueprint('consultas', __name__)
 
-@profissionais_bp.route('/', methods=['POST'])
+@consultas_bp.route('/', methods=['POST'])
 @jwt_required()
-def cadastrar_profissional():
-    """Endpoint para cadastrar um novo profissional"""
+@idempotente
+def agendar_consulta():
+    """Endpoint para agendar uma nova consulta"""
     try:
         usuario_id = get_jwt_identity()
         dados = request.get_json()
@@ -905,89 +3231,71 @@ def cadastrar_profissional():
         if not dados:
             return jsonify({'erro': 'Dados não fornecidos'}), 400
         
-        campos_obrigatorios = ['email', 'senha', 'crm_coren', 'nome', 'especialidade']
+        campos_obrigatorios = ['paciente_id', 'profissional_id', 'unidade_id', 'data_hora', 'tipo']
         for campo in campos_obrigatorios:
             if campo not in dados or not dados[campo]:
                 return jsonify({'erro': f'Campo {campo} é obrigatório'}), 400
         
-        validacao_crm = validar_crm(dados['crm_coren'])
-        if not validacao_crm['valido']:
-            return jsonify({'erro': validacao_crm['mensagem']}), 400
-        
-        crm_limpo = re.sub(r'[^0-9]', '', dados['crm_coren'])
-        if Profissional.query.filter_by(crm_coren=crm_limpo).first():
-            return jsonify({'erro': 'CRM/COREN já cadastrado'}), 409
+        paciente = buscar_ativo(Paciente, dados['paciente_id'])
+        if not paciente:
+            return jsonify({'erro': 'Paciente não encontrado'}), 404
         
-        if Usuario.query.filter_by(email=dados['email']).first():
-            return jsonify({'erro': 'Email já está em uso'}), 409
+        profissional = buscar_ativo(Profissional, dados['profissional_id'])
+        if not profissional:
+            return jsonify({'erro': 'Profissional não encontrado'}), 404
         
-        especialidades_validas = [
-            'Cardiologia', 'Cardiologia Intervencionista', 'Pediatria', 'Ortopedia', 
-            'Ginecologia', 'Clínico Geral', 'Neurologia', 'Dermatologia', 
-            'Anestesiologia', 'Cirurgia Geral'
-        ]
-        if dados['especialidade'] not in especialidades_validas:
-            return jsonify({'erro': 'Especialidade inválida'}), 400
+        unidade = Unidade.query.get(dados['unidade_id'])
+        if not unidade:
+            return jsonify({'erro': 'Unidade não encontrada'}), 404
         
         try:
-            data_admissao = datetime.strptime(dados['data_admissao'], '%Y-%m-%d').date()
-            if data_admissao > date.today():
-                return jsonify({'erro': 'Data de admissão não pode ser futura'}), 400
+            data_hora = datetime.strptime(dados['data_hora'], '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc)
+            if data_hora < datetime.now(timezone.utc):
+                return jsonify({'erro': 'Data e hora da consulta não podem ser no passado'}), 400
         except ValueError:
-            return jsonify({'erro': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
-        
-        usuario = Usuario(
-            email=dados['email'],
-            tipo='profissional',
-            ativo=True,
-            data_criacao=datetime.utcnow()
-        )
-        usuario.set_senha(dados['senha'])
-        
-        db.session.add(usuario)
-        db.session.flush()
+            return jsonify({'erro': 'Formato de data/hora inválido. Use YYYY-MM-DDTHH:MM:SS'}), 400
         
-        profissional = Profissional(
-            usuario_id=usuario.id,
-            crm_coren=crm_limpo,
-            nome=dados['nome'],
-            especialidade=dados['especialidade'],
-            telefone=dados.get('telefone'),
-            email_profissional=dados.get('email_profissional'),
-            data_admissao=data_admissao
+        consulta = Consulta(
+            paciente_id=paciente.id,
+            profissional_id=profissional.id,
+            unidade_id=unidade.id,
+            data_hora=data_hora,
+            tipo=dados['tipo'],
+            status='agendada',
+            observacoes=dados.get('observacoes')
         )
         
-        db.session.add(profissional)
+        db.session.add(consulta)
+        ajustar_resumo(ResumoConsultaDiario, chave_resumo_consulta(consulta), 1)
         db.session.commit()
+        publicar_evento_consulta(consulta, 'criada')
+        agendador_lembretes.atualizar(consulta)
         
         registrar_auditoria(
             usuario_id=usuario_id,
             acao='CREATE',
-            tabela='profissionais',
-            registro_id=profissional.id,
+            tabela='consultas',
+            registro_id=consulta.id,
             dados_novos=json.dumps({
-                'nome': profissional.nome,
-                'crm_coren': profissional.crm_coren,
-                'email': usuario.email
+                'paciente_id': consulta.paciente_id,
+                'profissional_id': consulta.profissional_id,
+                'unidade_id': consulta.unidade_id,
+                'data_hora': consulta.data_hora.isoformat(),
+                'tipo': consulta.tipo,
+                'status': consulta.status
             })
         )
         
-        criar_notificacao(
-            usuario_id=usuario.id,
-            titulo='Bem-vindo ao VidaPlus!',
-            mensagem=f'Olá {profissional.nome}, seu cadastro como profissional foi realizado com sucesso!',
-            tipo='sistema'
-        )
-        
         return jsonify({
-            'mensagem': 'Profissional cadastrado com sucesso',
-            'profissional': {
-                'id': profissional.id,
-                'nome': profissional.nome,
-                'crm_coren': profissional.crm_coren,
-                'email': usuario.email,
-                'especialidade': profissional.especialidade,
-                'data_admissao': profissional.data_admissao.isoformat()
+            'mensagem': 'Consulta agendada com sucesso',
+            'consulta': {
+                'id': consulta.id,
+                'paciente': paciente.nome,
+                'profissional': profissional.nome,
+                'unidade': unidade.nome,
+                'data_hora': consulta.data_hora.isoformat(),
+                'tipo': consulta.tipo,
+                'status': consulta.status
             }
         }), 201
         
@@ -995,25 +3303,83 @@ def cadastrar_profissional():
         db.session.rollback()
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@profissionais_bp.route('/', methods=['GET'])
+@consultas_bp.route('/', methods=['GET'])
 @jwt_required()
-def listar_profissionais():
-    """Endpoint para listar profissionais com filtros"""
+def listar_consultas():
+    """Endpoint para listar consultas com filtros"""
     try:
-        nome = request.args.get('nome', '').strip()
-        especialidade = request.args.get('especialidade', '').strip()
+        paciente_id = request.args.get('paciente_id')
+        profissional_id = request.args.get('profissional_id')
+        unidade_id = request.args.get('unidade_id')
+        data_inicio = request.args.get('data_inicio')
+        data_fim = request.args.get('data_fim')
+        status = request.args.get('status')
         page = int(request.args.get('page', 1))
         per_page = min(int(request.args.get('per_page', 10)), 100)
         
-        query = Profissional.query.join(Usuario)
+        validacao_include = validar_include(request.args.get('include'), ['paciente', 'profissional', 'unidade'])
+        if not validacao_include['valido']:
+            return jsonify({'erro': validacao_include['mensagem']}), 400
+        
+        # Busca em lote: ?ids=1,2,3
+        if request.args.get('ids') is not None:
+            validacao_ids = validar_ids(request.args.get('ids'))
+            if not validacao_ids['valido']:
+                return jsonify({'erro': validacao_ids['mensagem']}), 400
+            
+            lote = buscar_em_lote(Consulta, validacao_ids['ids'], [
+                joinedload(Consulta.paciente), joinedload(Consulta.profissional), joinedload(Consulta.unidade)
+            ])
+            incluidos = carregar_incluidos(lote['encontrados'], validacao_include['tipos'])
+            resposta = {
+                'consultas': [serializar_consulta(consulta) for consulta in lote['encontrados']],
+                'nao_encontrados': lote['nao_encontrados']
+            }
+            if validacao_include['tipos']:
+                resposta['incluidos'] = incluidos
+            return jsonify(resposta), 200
+        
+        # Sincronização incremental: ?modified_since= devolve só as alteradas e os ids excluídos
+        modificado_desde = None
+        if request.args.get('modified_since'):
+            validacao_marca = validar_modified_since(request.args.get('modified_since'))
+            if not validacao_marca['valido']:
+                return jsonify({'erro': validacao_marca['mensagem']}), 410 if validacao_marca.get('expirada') else 400
+            modificado_desde = validacao_marca['data_hora']
+            sincronizado_em = datetime.utcnow() - MARGEM_SINCRONIZACAO
+        
+        query = Consulta.query.join(Paciente).join(Profissional).join(Unidade)
+        
+        if paciente_id:
+            query = query.filter(Consulta.paciente_id == paciente_id)
+        if profissional_id:
+            query = query.filter(Consulta.profissional_id == profissional_id)
+        if unidade_id:
+            query = query.filter(Consulta.unidade_id == unidade_id)
         
-        if nome:
-            query = query.filter(Profissional.nome.ilike(f'%{nome}%'))
+        if data_inicio:
+            try:
+                data_inicio_dt = datetime.strptime(data_inicio, '%Y-%m-%d').date()
+                query = query.filter(Consulta.data_hora >= datetime.combine(data_inicio_dt, datetime.min.time()))
+            except ValueError:
+                return jsonify({'erro': 'Formato de data de início inválido. Use YYYY-MM-DD'}), 400
+        if data_fim:
+            try:
+                data_fim_dt = datetime.strptime(data_fim, '%Y-%m-%d').date()
+                query = query.filter(Consulta.data_hora <= datetime.combine(data_fim_dt, datetime.max.time()))
+            except ValueError:
+                return jsonify({'erro': 'Formato de data de fim inválido. Use YYYY-MM-DD'}), 400
         
-        if especialidade:
-            query = query.filter(Profissional.especialidade.ilike(f'%{especialidade}%'))
+        if status:
+            statuses_validos = ['agendada', 'realizada', 'cancelada']
+            if status not in statuses_validos:
+                return jsonify({'erro': 'Status de consulta inválido'}), 400
+            query = query.filter(Consulta.status == status)
         
-        query = query.order_by(Profissional.nome)
+        if modificado_desde:
+            query = query.filter(Consulta.atualizado_em > modificado_desde).order_by(Consulta.atualizado_em, Consulta.id)
+        else:
+            query = query.order_by(Consulta.data_hora)
         
         paginacao = query.paginate(
             page=page,
@@ -1021,19 +3387,13 @@ def listar_profissionais():
             error_out=False
         )
         
-        profissionais = []
-        for profissional in paginacao.items:
-            profissionais.append({
-                'id': profissional.id,
-                'nome': profissional.nome,
-                'crm_coren': profissional.crm_coren,
-                'email': profissional.usuario.email,
-                'especialidade': profissional.especialidade,
-                'ativo': profissional.usuario.ativo
-            })
+        # Carrega os relacionados antes da serialização para reaproveitar o identity map
+        incluidos = carregar_incluidos(paginacao.items, validacao_include['tipos'])
         
-        return jsonify({
-            'profissionais': profissionais,
+        consultas = [serializar_consulta(consulta) for consulta in paginacao.items]
+        
+        resposta = {
+            'consultas': consultas,
             'paginacao': {
                 'pagina_atual': page,
                 'total_paginas': paginacao.pages,
@@ -1042,143 +3402,316 @@ def listar_profissionais():
                 'tem_proxima': paginacao.has_next,
                 'tem_anterior': paginacao.has_prev
             }
-        }), 200
+        }
+        if validacao_include['tipos']:
+            resposta['incluidos'] = incluidos
+        if modificado_desde:
+            resposta['excluidos'] = listar_excluidos('consultas', modificado_desde, paciente_id, profissional_id)
+            resposta['sincronizado_em'] = sincronizado_em.isoformat()
+        
+        return jsonify(resposta), 200
         
     except Exception as e:
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@profissionais_bp.route('/<int:profissional_id>', methods=['GET'])
+@consultas_bp.route('/<int:consulta_id>', methods=['GET'])
 @jwt_required()
-def buscar_profissional(profissional_id):
-    """Endpoint para buscar um profissional específico"""
+def buscar_consulta(consulta_id):
+    """Endpoint para buscar uma consulta específica"""
     try:
-        profissional = Profissional.query.get(profissional_id)
-        if not profissional:
-            return jsonify({'erro': 'Profissional não encontrado'}), 404
+        validacao_include = validar_include(request.args.get('include'), ['paciente', 'profissional', 'unidade'])
+        if not validacao_include['valido']:
+            return jsonify({'erro': validacao_include['mensagem']}), 400
+        
+        consulta = Consulta.query.get(consulta_id)
+        if not consulta:
+            return jsonify({'erro': 'Consulta não encontrada'}), 404
+        
+        incluidos = carregar_incluidos([consulta], validacao_include['tipos'])
+        
+        resposta = {
+            'consulta': {
+                'id': consulta.id,
+                'paciente_id': consulta.paciente_id,
+                'profissional_id': consulta.profissional_id,
+                'unidade_id': consulta.unidade_id,
+                'paciente': consulta.paciente.nome,
+                'profissional': consulta.profissional.nome,
+                'unidade': consulta.unidade.nome,
+                'data_hora': consulta.data_hora.isoformat(),
+                'tipo': consulta.tipo,
+                'status': consulta.status,
+                'observacoes': consulta.observacoes,
+                'link_telemedicina': consulta.link_telemedicina
+            }
+        }
+        if validacao_include['tipos']:
+            resposta['incluidos'] = incluidos
+        
+        return jsonify(resposta), 200
+        
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+@consultas_bp.route('/<int:consulta_id>', methods=['PUT'])
+@jwt_required()
+def atualizar_consulta(consulta_id):
+    """Endpoint para atualizar dados de uma consulta"""
+    try:
+        usuario_id = get_jwt_identity()
+        consulta = Consulta.query.get(consulta_id)
+        if not consulta:
+            return jsonify({'erro': 'Consulta não encontrada'}), 404
+        
+        dados = request.get_json()
+        if not dados:
+            return jsonify({'erro': 'Dados não fornecidos'}), 400
+        
+        chave_anterior = chave_resumo_consulta(consulta)
+        
+        # Atualiza campos permitidos
+        if 'data_hora' in dados:
+            try:
+                data_hora = datetime.strptime(dados['data_hora'], '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc)
+                if data_hora < datetime.now(timezone.utc):
+                    return jsonify({'erro': 'Data e hora da consulta não podem ser no passado'}), 400
+                # Gravada sem fuso (UTC), como é lida do banco, para comparar com o valor atual
+                consulta.data_hora = data_hora.replace(tzinfo=None)
+            except ValueError:
+                return jsonify({'erro': 'Formato de data/hora inválido. Use YYYY-MM-DDTHH:MM:SS'}), 400
+        
+        if 'tipo' in dados:
+            tipos_validos = ['presencial', 'telemedicina']
+            if dados['tipo'] not in tipos_validos:
+                return jsonify({'erro': 'Tipo de consulta inválido'}), 400
+            consulta.tipo = dados['tipo']
+        
+        if 'status' in dados:
+            statuses_validos = ['agendada', 'realizada', 'cancelada']
+            if dados['status'] not in statuses_validos:
+                return jsonify({'erro': 'Status de consulta inválido'}), 400
+            consulta.status = dados['status']
+        
+        if 'observacoes' in dados:
+            consulta.observacoes = dados['observacoes']
+        
+        # Sem alterações efetivas não há commit, evento nem registro de auditoria
+        anteriores, novos = diferencas_pendentes(consulta)
+        if novos:
+            chave_nova = chave_resumo_consulta(consulta)
+            if chave_nova != chave_anterior:
+                ajustar_resumo(ResumoConsultaDiario, chave_anterior, -1)
+                ajustar_resumo(ResumoConsultaDiario, chave_nova, 1)
+            
+            db.session.commit()
+            publicar_evento_consulta(consulta, 'atualizada')
+            agendador_lembretes.atualizar(consulta)
+            
+            registrar_auditoria(
+                usuario_id=usuario_id,
+                acao='UPDATE',
+                tabela='consultas',
+                registro_id=consulta.id,
+                dados_anteriores=json_auditoria(anteriores),
+                dados_novos=json_auditoria(novos)
+            )
         
         return jsonify({
-            'profissional': {
-                'id': profissional.id,
-                'nome': profissional.nome,
-                'crm_coren': profissional.crm_coren,
-                'email': profissional.usuario.email,
-                'especialidade': profissional.especialidade,
-                'telefone': profissional.telefone,
-                'email_profissional': profissional.email_profissional,
-                'data_admissao': profissional.data_admissao.isoformat(),
-                'ativo': profissional.usuario.ativo
+            'mensagem': 'Consulta atualizada com sucesso',
+            'consulta': {
+                'id': consulta.id,
+                'data_hora': consulta.data_hora.isoformat(),
+                'tipo': consulta.tipo,
+                'status': consulta.status,
+                'observacoes': consulta.observacoes
             }
         }), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@profissionais_bp.route('/<int:profissional_id>', methods=['PUT'])
+@consultas_bp.route('/<int:consulta_id>', methods=['DELETE'])
 @jwt_required()
-def atualizar_profissional(profissional_id):
-    """Endpoint para atualizar dados de um profissional"""
+def excluir_consulta(consulta_id):
+    """Endpoint para excluir uma consulta"""
     try:
         usuario_id = get_jwt_identity()
-        profissional = Profissional.query.get(profissional_id)
-        if not profissional:
-            return jsonify({'erro': 'Profissional não encontrado'}), 404
-        
-        dados = request.get_json()
-        if not dados:
-            return jsonify({'erro': 'Dados não fornecidos'}), 400
+        consulta = Consulta.query.get(consulta_id)
+        if not consulta:
+            return jsonify({'erro': 'Consulta não encontrada'}), 404
         
-        # Atualiza campos permitidos
-        if 'nome' in dados:
-            profissional.nome = dados['nome']
-        if 'especialidade' in dados:
-            especialidades_validas = [
-                'Cardiologia', 'Cardiologia Intervencionista', 'Pediatria', 'Ortopedia', 
-                'Ginecologia', 'Clínico Geral', 'Neurologia', 'Dermatologia', 
-                'Anestesiologia', 'Cirurgia Geral'
-            ]
-            if dados['especialidade'] not in especialidades_validas:
-                return jsonify({'erro': 'Especialidade inválida'}), 400
-            profissional.especialidade = dados['especialidade']
-        if 'telefone' in dados:
-            profissional.telefone = dados['telefone']
-        if 'email_profissional' in dados:
-            profissional.email_profissional = dados['email_profissional']
+        dados_anteriores = json.dumps({
+            'paciente_id': consulta.paciente_id,
+            'profissional_id': consulta.profissional_id,
+            'data_hora': consulta.data_hora.isoformat(),
+            'tipo': consulta.tipo,
+            'status': consulta.status
+        })
         
+        ajustar_resumo(ResumoConsultaDiario, chave_resumo_consulta(consulta), -1)
+        evento = dados_evento_consulta(consulta, 'excluida')
+        db.session.delete(consulta)
         db.session.commit()
+        hub_eventos.publicar(*evento)
+        agendador_lembretes.remover(consulta_id)
         
         registrar_auditoria(
             usuario_id=usuario_id,
-            acao='UPDATE',
-            tabela='profissionais',
-            registro_id=profissional.id,
-            dados_novos=json.dumps(dados)
+            acao='DELETE',
+            tabela='consultas',
+            registro_id=consulta_id,
+            dados_anteriores=dados_anteriores
         )
         
-        return jsonify({
-            'mensagem': 'Profissional atualizado com sucesso',
-            'profissional': {
-                'id': profissional.id,
-                'nome': profissional.nome,
-                'crm_coren': profissional.crm_coren,
-                'especialidade': profissional.especialidade,
-                'telefone': profissional.telefone
-            }
-        }), 200
+        return jsonify({'mensagem': 'Consulta excluída com sucesso'}), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@profissionais_bp.route('/<int:profissional_id>', methods=['DELETE'])
+def deslocar_dias(coluna, dias):
+    """Expressão SQL de `coluna` (DateTime) somada de `dias` dias, para UPDATEs em massa"""
+    if db.engine.dialect.name == 'sqlite':
+        # O SQLite guarda 'YYYY-MM-DD HH:MM:SS.ffffff': desloca a parte até os segundos e preserva a fração
+        return func.strftime('%Y-%m-%d %H:%M:%S', coluna, f'{dias:+d} days').concat(func.substr(coluna, 20))
+    return coluna + timedelta(days=dias)
+
+@consultas_bp.route('/status-em-lote', methods=['POST'])
 @jwt_required()
-def excluir_profissional(profissional_id):
-    """Endpoint para excluir um profissional"""
+def alterar_status_em_lote():
+    """
+    Cancela ou reagenda (desloca em dias) todas as consultas futuras com
+    status 'agendada' de um profissional e/ou unidade num intervalo de datas.
+    Um único UPDATE altera as consultas; resumos diários, feed de alterações
+    e notificações aos pacientes são gravados no mesmo commit, seguidos de um
+    único registro de auditoria. Com `simular`, apenas conta as consultas.
+    """
     try:
         usuario_id = get_jwt_identity()
-        profissional = Profissional.query.get(profissional_id)
-        if not profissional:
-            return jsonify({'erro': 'Profissional não encontrado'}), 404
-        
-        # Verifica se há consultas associadas
-        if profissional.consultas:
-            return jsonify({'erro': 'Não é possível excluir profissional com consultas associadas'}), 400
-        
-        dados_anteriores = json.dumps({
-            'nome': profissional.nome,
-            'crm_coren': profissional.crm_coren,
-            'email': profissional.usuario.email
-        })
+        usuario = db.session.get(Usuario, usuario_id)
+        if not usuario or usuario.tipo != 'admin':
+            return jsonify({'erro': 'Acesso restrito a administradores'}), 403
         
-        # Primeiro excluir notificações do usuário
-        notificacoes = Notificacao.query.filter_by(usuario_id=profissional.usuario.id).all()
-        for notificacao in notificacoes:
-            db.session.delete(notificacao)
+        dados = request.get_json()
+        if not dados:
+            return jsonify({'erro': 'Dados não fornecidos'}), 400
         
-        db.session.delete(profissional)
-        db.session.delete(profissional.usuario)
-        db.session.commit()
+        acao = dados.get('acao')
+        if acao not in ('cancelar', 'reagendar'):
+            return jsonify({'erro': 'Ação inválida. Use cancelar ou reagendar'}), 400
+        if not dados.get('profissional_id') and not dados.get('unidade_id'):
+            return jsonify({'erro': 'Informe profissional_id e/ou unidade_id'}), 400
+        if not dados.get('data_inicio') or not dados.get('data_fim'):
+            return jsonify({'erro': 'Campos obrigatórios: data_inicio e data_fim (YYYY-MM-DD)'}), 400
+        intervalo = validar_intervalo_datas(dados['data_inicio'], dados['data_fim'])
+        if not intervalo['valido']:
+            return jsonify({'erro': intervalo['mensagem']}), 400
+        
+        dias = 0
+        if acao == 'reagendar':
+            dias = dados.get('deslocamento_dias')
+            if not isinstance(dias, int) or isinstance(dias, bool) or not 1 <= dias <= 365:
+                return jsonify({'erro': 'deslocamento_dias deve ser um inteiro entre 1 e 365'}), 400
+        motivo = (dados.get('motivo') or '').strip()[:200]
+        
+        filtros = [
+            Consulta.status == 'agendada',
+            Consulta.data_hora >= max(intervalo['inicio'], datetime.utcnow()),
+            Consulta.data_hora < intervalo['fim']
+        ]
+        if dados.get('profissional_id'):
+            filtros.append(Consulta.profissional_id == dados['profissional_id'])
+        if dados.get('unidade_id'):
+            filtros.append(Consulta.unidade_id == dados['unidade_id'])
+        
+        if dados.get('simular'):
+            total = db.session.query(func.count(Consulta.id)).filter(*filtros).scalar()
+            return jsonify({'simulacao': True, 'acao': acao, 'total': total}), 200
+        
+        valores = {'status': 'cancelada'} if acao == 'cancelar' else {'data_hora': deslocar_dias(Consulta.data_hora, dias)}
+        linhas = db.session.execute(
+            Consulta.__table__.update().where(*filtros).values(**valores).returning(
+                Consulta.id, Consulta.paciente_id, Consulta.profissional_id, Consulta.unidade_id,
+                Consulta.data_hora, Consulta.tipo, Consulta.status
+            )
+        ).all()
+        if not linhas:
+            db.session.rollback()
+            return jsonify({'mensagem': 'Nenhuma consulta encontrada para os filtros', 'total': 0}), 200
+        ids = [linha.id for linha in linhas]
+        
+        # Resumos diários: a linha devolvida tem os valores novos; os anteriores diferem só no campo alterado
+        deltas = {}
+        for linha in linhas:
+            chave_nova = chave_resumo_consulta(linha)
+            chave_anterior = dict(chave_nova, status='agendada', dia=(linha.data_hora - timedelta(days=dias)).date())
+            for chave, delta in ((chave_anterior, -1), (chave_nova, 1)):
+                identificador = tuple(sorted(chave.items()))
+                deltas[identificador] = deltas.get(identificador, 0) + delta
+        for identificador, delta in deltas.items():
+            if delta:
+                ajustar_resumo(ResumoConsultaDiario, dict(identificador), delta)
+        registrar_alteracoes_em_massa('consultas', ids, 'UPDATE')
+        
+        consultas = Consulta.query.options(
+            joinedload(Consulta.paciente), joinedload(Consulta.profissional), joinedload(Consulta.unidade)
+        ).populate_existing().filter(Consulta.id.in_(ids)).all()
+        
+        complemento = f' Motivo: {motivo}.' if motivo else ''
+        itens = []
+        for consulta in consultas:
+            quando = consulta.data_hora.strftime('%d/%m/%Y às %H:%M')
+            if acao == 'cancelar':
+                titulo = 'Consulta cancelada'
+                mensagem = f'Sua consulta com {consulta.profissional.nome} em {quando} (UTC) foi cancelada.{complemento}'
+            else:
+                anterior = (consulta.data_hora - timedelta(days=dias)).strftime('%d/%m/%Y às %H:%M')
+                titulo = 'Consulta reagendada'
+                mensagem = f'Sua consulta com {consulta.profissional.nome} de {anterior} foi reagendada para {quando} (UTC).{complemento}'
+            itens.append((consulta.paciente.usuario_id, titulo, mensagem))
+        # Eventos montados antes do commit, que expira os objetos (evita recarregar um a um)
+        eventos = [dados_evento_consulta(consulta, 'atualizada') for consulta in consultas]
+        criar_notificacoes_em_lote(itens, tipo='agendamento')  # faz o commit de toda a operação
+        
+        for evento in eventos:
+            hub_eventos.publicar(*evento)
+        for linha in linhas:
+            agendador_lembretes.atualizar(linha)
         
         registrar_auditoria(
             usuario_id=usuario_id,
-            acao='DELETE',
-            tabela='profissionais',
-            registro_id=profissional_id,
-            dados_anteriores=dados_anteriores
+            acao='UPDATE_LOTE',
+            tabela='consultas',
+            dados_anteriores=json.dumps({'status': 'agendada'}),
+            dados_novos=json.dumps({
+                'acao': acao,
+                'filtros': {campo: dados.get(campo) for campo in ('profissional_id', 'unidade_id', 'data_inicio', 'data_fim')},
+                'deslocamento_dias': dias or None,
+                'motivo': motivo or None,
+                'total': len(ids),
+                'consultas': ids
+            })
         )
         
-        return jsonify({'mensagem': 'Profissional excluído com sucesso'}), 200
+        return jsonify({
+            'mensagem': f'{len(ids)} consulta(s) ' + ('cancelada(s)' if acao == 'cancelar' else 'reagendada(s)'),
+            'total': len(ids),
+            'consultas': ids
+        }), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-# Blueprint para consultas
-consultas_bp = Blueprint('consultas', __name__)
+# Blueprint para receitas (prescrições)
+receitas_bp = Blueprint('receitas', __name__)
 
-@consultas_bp.route('/', methods=['POST'])
+@receitas_bp.route('/', methods=['POST'])
 @jwt_required()
-def agendar_consulta():
-    """Endpoint para agendar uma nova consulta"""
+@idempotente
+def criar_prescricao():
+    """Endpoint para criar uma nova prescrição"""
     try:
         usuario_id = get_jwt_identity()
         dados = request.get_json()
@@ -1186,68 +3719,66 @@ def agendar_consulta():
         if not dados:
             return jsonify({'erro': 'Dados não fornecidos'}), 400
         
-        campos_obrigatorios = ['paciente_id', 'profissional_id', 'unidade_id', 'data_hora', 'tipo']
+        campos_obrigatorios = ['paciente_id', 'profissional_id', 'medicamentos', 'dosagem']
         for campo in campos_obrigatorios:
             if campo not in dados or not dados[campo]:
                 return jsonify({'erro': f'Campo {campo} é obrigatório'}), 400
         
-        paciente = Paciente.query.get(dados['paciente_id'])
+        paciente = buscar_ativo(Paciente, dados['paciente_id'])
         if not paciente:
             return jsonify({'erro': 'Paciente não encontrado'}), 404
         
-        profissional = Profissional.query.get(dados['profissional_id'])
+        profissional = buscar_ativo(Profissional, dados['profissional_id'])
         if not profissional:
             return jsonify({'erro': 'Profissional não encontrado'}), 404
         
-        unidade = Unidade.query.get(dados['unidade_id'])
-        if not unidade:
-            return jsonify({'erro': 'Unidade não encontrada'}), 404
-        
-        try:
-            data_hora = datetime.strptime(dados['data_hora'], '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc)
-            if data_hora < datetime.now(timezone.utc):
-                return jsonify({'erro': 'Data e hora da consulta não podem ser no passado'}), 400
-        except ValueError:
-            return jsonify({'erro': 'Formato de data/hora inválido. Use YYYY-MM-DDTHH:MM:SS'}), 400
-        
-        consulta = Consulta(
+        prescricao = Prescricao(
             paciente_id=paciente.id,
             profissional_id=profissional.id,
-            unidade_id=unidade.id,
-            data_hora=data_hora,
-            tipo=dados['tipo'],
-            status='agendada',
-            observacoes=dados.get('observacoes')
+            medicamentos=dados['medicamentos'],
+            dosagem=dados['dosagem'],
+            duracao=dados.get('duracao'),
+            observacoes=dados.get('observacoes'),
+            status='ativa',
+            data_prescricao=datetime.utcnow()
         )
+        definir_data_fim(prescricao)
         
-        db.session.add(consulta)
+        db.session.add(prescricao)
+        db.session.flush()
+        vincular_medicamentos_prescricao(prescricao)
+        ajustar_resumo(ResumoPrescricaoDiario, {
+            'dia': prescricao.data_prescricao.date(),
+            'profissional_id': prescricao.profissional_id
+        }, 1)
         db.session.commit()
         
         registrar_auditoria(
             usuario_id=usuario_id,
             acao='CREATE',
-            tabela='consultas',
-            registro_id=consulta.id,
+            tabela='prescricoes',
+            registro_id=prescricao.id,
             dados_novos=json.dumps({
-                'paciente_id': consulta.paciente_id,
-                'profissional_id': consulta.profissional_id,
-                'unidade_id': consulta.unidade_id,
-                'data_hora': consulta.data_hora.isoformat(),
-                'tipo': consulta.tipo,
-                'status': consulta.status
+                'paciente_id': prescricao.paciente_id,
+                'profissional_id': prescricao.profissional_id,
+                'medicamentos': prescricao.medicamentos,
+                'dosagem': prescricao.dosagem,
+                'duracao': prescricao.duracao,
+                'status': prescricao.status
             })
         )
         
         return jsonify({
-            'mensagem': 'Consulta agendada com sucesso',
-            'consulta': {
-                'id': consulta.id,
+            'mensagem': 'Prescrição criada com sucesso',
+            'prescricao': {
+                'id': prescricao.id,
                 'paciente': paciente.nome,
                 'profissional': profissional.nome,
-                'unidade': unidade.nome,
-                'data_hora': consulta.data_hora.isoformat(),
-                'tipo': consulta.tipo,
-                'status': consulta.status
+                'medicamentos': prescricao.medicamentos,
+                'dosagem': prescricao.dosagem,
+                'duracao': prescricao.duracao,
+                'data_fim': prescricao.data_fim.isoformat() if prescricao.data_fim else None,
+                'status': prescricao.status
             }
         }), 201
         
@@ -1255,49 +3786,74 @@ def agendar_consulta():
         db.session.rollback()
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@consultas_bp.route('/', methods=['GET'])
+@receitas_bp.route('/', methods=['GET'])
 @jwt_required()
-def listar_consultas():
-    """Endpoint para listar consultas com filtros"""
+def listar_prescricoes():
+    """Endpoint para listar prescrições com filtros"""
     try:
         paciente_id = request.args.get('paciente_id')
         profissional_id = request.args.get('profissional_id')
-        unidade_id = request.args.get('unidade_id')
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
         status = request.args.get('status')
         page = int(request.args.get('page', 1))
         per_page = min(int(request.args.get('per_page', 10)), 100)
         
-        query = Consulta.query.join(Paciente).join(Profissional).join(Unidade)
+        validacao_include = validar_include(request.args.get('include'), ['paciente', 'profissional'])
+        if not validacao_include['valido']:
+            return jsonify({'erro': validacao_include['mensagem']}), 400
+        
+        # Busca em lote: ?ids=1,2,3
+        if request.args.get('ids') is not None:
+            validacao_ids = validar_ids(request.args.get('ids'))
+            if not validacao_ids['valido']:
+                return jsonify({'erro': validacao_ids['mensagem']}), 400
+            
+            lote = buscar_em_lote(Prescricao, validacao_ids['ids'], [
+                joinedload(Prescricao.paciente), joinedload(Prescricao.profissional)
+            ])
+            incluidos = carregar_incluidos(lote['encontrados'], validacao_include['tipos'])
+            resposta = {
+                'prescricoes': [serializar_prescricao(prescricao) for prescricao in lote['encontrados']],
+                'nao_encontrados': lote['nao_encontrados']
+            }
+            if validacao_include['tipos']:
+                resposta['incluidos'] = incluidos
+            return jsonify(resposta), 200
+        
+        # Sincronização incremental: ?modified_since= devolve só as alteradas e os ids excluídos
+        modificado_desde = None
+        if request.args.get('modified_since'):
+            validacao_marca = validar_modified_since(request.args.get('modified_since'))
+            if not validacao_marca['valido']:
+                return jsonify({'erro': validacao_marca['mensagem']}), 410 if validacao_marca.get('expirada') else 400
+            modificado_desde = validacao_marca['data_hora']
+            sincronizado_em = datetime.utcnow() - MARGEM_SINCRONIZACAO
+        
+        query = Prescricao.query.join(Paciente).join(Profissional)
         
         if paciente_id:
-            query = query.filter(Consulta.paciente_id == paciente_id)
+            query = query.filter(Prescricao.paciente_id == paciente_id)
         if profissional_id:
-            query = query.filter(Consulta.profissional_id == profissional_id)
-        if unidade_id:
-            query = query.filter(Consulta.unidade_id == unidade_id)
-        
-        if data_inicio:
-            try:
-                data_inicio_dt = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-                query = query.filter(Consulta.data_hora >= datetime.combine(data_inicio_dt, datetime.min.time()))
-            except ValueError:
-                return jsonify({'erro': 'Formato de data de início inválido. Use YYYY-MM-DD'}), 400
-        if data_fim:
-            try:
-                data_fim_dt = datetime.strptime(data_fim, '%Y-%m-%d').date()
-                query = query.filter(Consulta.data_hora <= datetime.combine(data_fim_dt, datetime.max.time()))
-            except ValueError:
-                return jsonify({'erro': 'Formato de data de fim inválido. Use YYYY-MM-DD'}), 400
+            query = query.filter(Prescricao.profissional_id == profissional_id)
         
         if status:
-            statuses_validos = ['agendada', 'realizada', 'cancelada']
+            statuses_validos = ['ativa', 'encerrada']
             if status not in statuses_validos:
-                return jsonify({'erro': 'Status de consulta inválido'}), 400
-            query = query.filter(Consulta.status == status)
+                return jsonify({'erro': 'Status de prescrição inválido'}), 400
+            query = query.filter(Prescricao.status == status)
+        
+        # Vigentes numa data: começaram até o fim do dia e terminam depois do início dele
+        if request.args.get('ativas_em'):
+            try:
+                dia = datetime.strptime(request.args['ativas_em'], '%Y-%m-%d')
+            except ValueError:
+                return jsonify({'erro': 'Formato de ativas_em inválido. Use YYYY-MM-DD'}), 400
+            query = query.filter(Prescricao.data_prescricao < dia + timedelta(days=1))
+            query = filtrar_vigentes(query, dia)
         
-        query = query.order_by(Consulta.data_hora)
+        if modificado_desde:
+            query = query.filter(Prescricao.atualizado_em > modificado_desde).order_by(Prescricao.atualizado_em, Prescricao.id)
+        else:
+            query = query.order_by(Prescricao.data_prescricao)
         
         paginacao = query.paginate(
             page=page,
@@ -1305,22 +3861,13 @@ def listar_consultas():
             error_out=False
         )
         
-        consultas = []
-        for consulta in paginacao.items:
-            consultas.append({
-                'id': consulta.id,
-                'paciente': consulta.paciente.nome,
-                'profissional': consulta.profissional.nome,
-                'unidade': consulta.unidade.nome,
-                'data_hora': consulta.data_hora.isoformat(),
-                'tipo': consulta.tipo,
-                'status': consulta.status,
-                'observacoes': consulta.observacoes,
-                'link_telemedicina': consulta.link_telemedicina
-            })
+        # Carrega os relacionados antes da serialização para reaproveitar o identity map
+        incluidos = carregar_incluidos(paginacao.items, validacao_include['tipos'])
         
-        return jsonify({
-            'consultas': consultas,
+        prescricoes = [serializar_prescricao(prescricao) for prescricao in paginacao.items]
+        
+        resposta = {
+            'prescricoes': prescricoes,
             'paginacao': {
                 'pagina_atual': page,
                 'total_paginas': paginacao.pages,
@@ -1329,94 +3876,116 @@ def listar_consultas():
                 'tem_proxima': paginacao.has_next,
                 'tem_anterior': paginacao.has_prev
             }
-        }), 200
+        }
+        if validacao_include['tipos']:
+            resposta['incluidos'] = incluidos
+        if modificado_desde:
+            resposta['excluidos'] = listar_excluidos('prescricoes', modificado_desde, paciente_id, profissional_id)
+            resposta['sincronizado_em'] = sincronizado_em.isoformat()
+        
+        return jsonify(resposta), 200
         
     except Exception as e:
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@consultas_bp.route('/<int:consulta_id>', methods=['GET'])
+@receitas_bp.route('/<int:prescricao_id>', methods=['GET'])
 @jwt_required()
-def buscar_consulta(consulta_id):
-    """Endpoint para buscar uma consulta específica"""
+def buscar_prescricao(prescricao_id):
+    """Endpoint para buscar uma prescrição específica"""
     try:
-        consulta = Consulta.query.get(consulta_id)
-        if not consulta:
-            return jsonify({'erro': 'Consulta não encontrada'}), 404
+        validacao_include = validar_include(request.args.get('include'), ['paciente', 'profissional'])
+        if not validacao_include['valido']:
+            return jsonify({'erro': validacao_include['mensagem']}), 400
         
-        return jsonify({
-            'consulta': {
-                'id': consulta.id,
-                'paciente': consulta.paciente.nome,
-                'profissional': consulta.profissional.nome,
-                'unidade': consulta.unidade.nome,
-                'data_hora': consulta.data_hora.isoformat(),
-                'tipo': consulta.tipo,
-                'status': consulta.status,
-                'observacoes': consulta.observacoes,
-                'link_telemedicina': consulta.link_telemedicina
+        prescricao = Prescricao.query.get(prescricao_id)
+        if not prescricao:
+            return jsonify({'erro': 'Prescrição não encontrada'}), 404
+        
+        incluidos = carregar_incluidos([prescricao], validacao_include['tipos'])
+        
+        resposta = {
+            'prescricao': {
+                'id': prescricao.id,
+                'paciente_id': prescricao.paciente_id,
+                'profissional_id': prescricao.profissional_id,
+                'paciente': prescricao.paciente.nome,
+                'profissional': prescricao.profissional.nome,
+                'medicamentos': prescricao.medicamentos,
+                'dosagem': prescricao.dosagem,
+                'duracao': prescricao.duracao,
+                'observacoes': prescricao.observacoes,
+                'status': prescricao.status,
+                'data_prescricao': prescricao.data_prescricao.isoformat(),
+                'data_fim': prescricao.data_fim.isoformat() if prescricao.data_fim else None
             }
-        }), 200
+        }
+        if validacao_include['tipos']:
+            resposta['incluidos'] = incluidos
+        
+        return jsonify(resposta), 200
         
     except Exception as e:
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@consultas_bp.route('/<int:consulta_id>', methods=['PUT'])
-@jwt_required()
-def atualizar_consulta(consulta_id):
-    """Endpoint para atualizar dados de uma consulta"""
+@receitas_bp.route('/<int:prescricao_id>', methods=['PUT'])
+@jwt_required()
+def atualizar_prescricao(prescricao_id):
+    """Endpoint para atualizar dados de uma prescrição"""
     try:
         usuario_id = get_jwt_identity()
-        consulta = Consulta.query.get(consulta_id)
-        if not consulta:
-            return jsonify({'erro': 'Consulta não encontrada'}), 404
+        prescricao = Prescricao.query.get(prescricao_id)
+        if not prescricao:
+            return jsonify({'erro': 'Prescrição não encontrada'}), 404
         
         dados = request.get_json()
         if not dados:
             return jsonify({'erro': 'Dados não fornecidos'}), 400
         
         # Atualiza campos permitidos
-        if 'data_hora' in dados:
-            try:
-                data_hora = datetime.strptime(dados['data_hora'], '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc)
-                if data_hora < datetime.now(timezone.utc):
-                    return jsonify({'erro': 'Data e hora da consulta não podem ser no passado'}), 400
-                consulta.data_hora = data_hora
-            except ValueError:
-                return jsonify({'erro': 'Formato de data/hora inválido. Use YYYY-MM-DDTHH:MM:SS'}), 400
-        
-        if 'tipo' in dados:
-            tipos_validos = ['presencial', 'telemedicina']
-            if dados['tipo'] not in tipos_validos:
-                return jsonify({'erro': 'Tipo de consulta inválido'}), 400
-            consulta.tipo = dados['tipo']
-        
+        if 'medicamentos' in dados:
+            prescricao.medicamentos = dados['medicamentos']
+        if 'dosagem' in dados:
+            prescricao.dosagem = dados['dosagem']
+        if 'duracao' in dados:
+            prescricao.duracao = dados['duracao']
+        if 'observacoes' in dados:
+            prescricao.observacoes = dados['observacoes']
         if 'status' in dados:
-            statuses_validos = ['agendada', 'realizada', 'cancelada']
+            statuses_validos = ['ativa', 'encerrada']
             if dados['status'] not in statuses_validos:
-                return jsonify({'erro': 'Status de consulta inválido'}), 400
-            consulta.status = dados['status']
-        
-        if 'observacoes' in dados:
-            consulta.observacoes = dados['observacoes']
+                return jsonify({'erro': 'Status de prescrição inválido'}), 400
+            prescricao.status = dados['status']
         
-        db.session.commit()
+        estado = db.inspect(prescricao)
+        if estado.attrs.duracao.history.has_changes() or estado.attrs.status.history.has_changes():
+            definir_data_fim(prescricao)
         
-        registrar_auditoria(
-            usuario_id=usuario_id,
-            acao='UPDATE',
-            tabela='consultas',
-            registro_id=consulta.id,
-            dados_novos=json.dumps(dados)
-        )
+        # Sem alterações efetivas não há commit nem registro de auditoria
+        anteriores, novos = diferencas_pendentes(prescricao)
+        if novos:
+            if 'medicamentos' in novos:
+                vincular_medicamentos_prescricao(prescricao)
+            db.session.commit()
+            
+            registrar_auditoria(
+                usuario_id=usuario_id,
+                acao='UPDATE',
+                tabela='prescricoes',
+                registro_id=prescricao.id,
+                dados_anteriores=json_auditoria(anteriores),
+                dados_novos=json_auditoria(novos)
+            )
         
         return jsonify({
-            'mensagem': 'Consulta atualizada com sucesso',
-            'consulta': {
-                'id': consulta.id,
-                'data_hora': consulta.data_hora.isoformat(),
-                'tipo': consulta.tipo,
-                'status': consulta.status,
-                'observacoes': consulta.observacoes
+            'mensagem': 'Prescrição atualizada com sucesso',
+            'prescricao': {
+                'id': prescricao.id,
+                'medicamentos': prescricao.medicamentos,
+                'dosagem': prescricao.dosagem,
+                'duracao': prescricao.duracao,
+                'observacoes': prescricao.observacoes,
+                'status': prescricao.status,
+                'data_fim': prescricao.data_fim.isoformat() if prescricao.data_fim else None
             }
         }), 200
         
@@ -1424,289 +3993,1472 @@ def atualizar_consulta(consulta_id):
         db.session.rollback()
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@consultas_bp.route('/<int:consulta_id>', methods=['DELETE'])
+@receitas_bp.route('/<int:prescricao_id>', methods=['DELETE'])
 @jwt_required()
-def excluir_consulta(consulta_id):
-    """Endpoint para excluir uma consulta"""
+def excluir_prescricao(prescricao_id):
+    """Endpoint para excluir uma prescrição"""
     try:
         usuario_id = get_jwt_identity()
-        consulta = Consulta.query.get(consulta_id)
-        if not consulta:
-            return jsonify({'erro': 'Consulta não encontrada'}), 404
+        prescricao = Prescricao.query.get(prescricao_id)
+        if not prescricao:
+            return jsonify({'erro': 'Prescrição não encontrada'}), 404
         
         dados_anteriores = json.dumps({
-            'paciente_id': consulta.paciente_id,
-            'profissional_id': consulta.profissional_id,
-            'data_hora': consulta.data_hora.isoformat(),
-            'tipo': consulta.tipo,
-            'status': consulta.status
+            'paciente_id': prescricao.paciente_id,
+            'profissional_id': prescricao.profissional_id,
+            'medicamentos': prescricao.medicamentos,
+            'dosagem': prescricao.dosagem,
+            'status': prescricao.status
         })
         
-        db.session.delete(consulta)
+        ajustar_resumo(ResumoPrescricaoDiario, {
+            'dia': prescricao.data_prescricao.date(),
+            'profissional_id': prescricao.profissional_id
+        }, -1)
+        db.session.execute(PrescricaoMedicamento.__table__.delete().where(
+            PrescricaoMedicamento.prescricao_id == prescricao.id
+        ))
+        db.session.delete(prescricao)
         db.session.commit()
         
         registrar_auditoria(
             usuario_id=usuario_id,
             acao='DELETE',
-            tabela='consultas',
-            registro_id=consulta_id,
+            tabela='prescricoes',
+            registro_id=prescricao_id,
             dados_anteriores=dados_anteriores
         )
         
-        return jsonify({'mensagem': 'Consulta excluída com sucesso'}), 200
+        return jsonify({'mensagem': 'Prescrição excluída com sucesso'}), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-# Blueprint para receitas (prescrições)
-receitas_bp = Blueprint('receitas', __name__)
+# Blueprint do catálogo de medicamentos (busca reversa medicamento → pacientes)
+medicamentos_bp = Blueprint('medicamentos', __name__)
 
-@receitas_bp.route('/', methods=['POST'])
+def usuario_da_equipe():
+    """Usuário autenticado, se for administrador ou profissional (o catálogo expõe dados clínicos)"""
+    usuario = db.session.get(Usuario, get_jwt_identity())
+    if not usuario or usuario.tipo not in ('admin', 'profissional'):
+        return None
+    return usuario
+
+@medicamentos_bp.route('/', methods=['GET'], strict_slashes=False)
 @jwt_required()
-def criar_prescricao():
-    """Endpoint para criar uma nova prescrição"""
+def listar_medicamentos():
+    """Catálogo em ordem alfabética, filtrado por prefixo do nome (?q=) com busca por faixa no índice único de nome"""
     try:
-        usuario_id = get_jwt_identity()
-        dados = request.get_json()
+        if not usuario_da_equipe():
+            return jsonify({'erro': 'Acesso restrito a administradores e profissionais'}), 403
         
-        if not dados:
-            return jsonify({'erro': 'Dados não fornecidos'}), 400
+        limite = min(max(request.args.get('limite', 50, type=int), 1), 200)
+        prefixo = normalizar_texto(request.args.get('q'))
         
-        campos_obrigatorios = ['paciente_id', 'profissional_id', 'medicamentos', 'dosagem']
-        for campo in campos_obrigatorios:
-            if campo not in dados or not dados[campo]:
-                return jsonify({'erro': f'Campo {campo} é obrigatório'}), 400
+        consulta = Medicamento.query
+        if prefixo:
+            consulta = consulta.filter(Medicamento.nome >= prefixo, Medicamento.nome < prefixo + '\uffff')
+        medicamentos = consulta.order_by(Medicamento.nome).limit(limite).all()
         
-        paciente = Paciente.query.get(dados['paciente_id'])
-        if not paciente:
-            return jsonify({'erro': 'Paciente não encontrado'}), 404
+        return jsonify({
+            'medicamentos': [{'id': medicamento.id, 'nome': medicamento.nome} for medicamento in medicamentos]
+        }), 200
         
-        profissional = Profissional.query.get(dados['profissional_id'])
-        if not profissional:
-            return jsonify({'erro': 'Profissional não encontrado'}), 404
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+@medicamentos_bp.route('/<int:medicamento_id>/pacientes', methods=['GET'])
+@jwt_required()
+def pacientes_do_medicamento(medicamento_id):
+    """
+    Busca reversa: pacientes com o medicamento em alguma prescrição ou no uso
+    declarado no cadastro (?origem=prescricao|uso restringe a uma delas;
+    ?ativas=true considera só prescrições vigentes). Cada origem é lida pelo
+    índice (medicamento_id, paciente_id) dos vínculos, sem varrer o texto
+    livre. Paginação por cursor (id do paciente).
+    """
+    try:
+        if not usuario_da_equipe():
+            return jsonify({'erro': 'Acesso restrito a administradores e profissionais'}), 403
+        
+        medicamento = db.session.get(Medicamento, medicamento_id)
+        if not medicamento:
+            return jsonify({'erro': 'Medicamento não encontrado'}), 404
+        
+        origem = request.args.get('origem')
+        if origem not in (None, 'prescricao', 'uso'):
+            return jsonify({'erro': 'Origem inválida. Use: prescricao ou uso'}), 400
+        
+        cursor = request.args.get('cursor')
+        if cursor and not cursor.isdigit():
+            return jsonify({'erro': 'Cursor inválido'}), 400
+        limite = min(max(request.args.get('limite', 50, type=int), 1), 200)
+        
+        # Consultas de cada origem: (consulta, coluna paciente_id do vínculo)
+        fontes = {}
+        if origem in (None, 'prescricao'):
+            consulta = db.session.query(PrescricaoMedicamento.paciente_id).filter(
+                PrescricaoMedicamento.medicamento_id == medicamento.id
+            )
+            if request.args.get('ativas', '').lower() == 'true':
+                consulta = filtrar_vigentes(consulta.join(Prescricao, Prescricao.id == PrescricaoMedicamento.prescricao_id).filter(
+                    Prescricao.status == 'ativa'
+                ), datetime.utcnow())
+            fontes['prescricao'] = (consulta, PrescricaoMedicamento.paciente_id)
+        if origem in (None, 'uso'):
+            consulta = db.session.query(PacienteMedicamento.paciente_id).filter(
+                PacienteMedicamento.medicamento_id == medicamento.id
+            )
+            fontes['uso'] = (consulta, PacienteMedicamento.paciente_id)
+        
+        # UNION (sem repetição) dos ids após o cursor; só então o join com pacientes pela chave primária.
+        # A coluna é tomada pela posição: com ?ativas=true o nome vem do SELECT externo do UNION ALL
+        selecoes = [consulta.filter(coluna > int(cursor or 0)).statement for consulta, coluna in fontes.values()]
+        candidatos = (db.union(*selecoes) if len(selecoes) > 1 else selecoes[0]).subquery()
+        pacientes = db.session.query(Paciente.id, Paciente.nome, Paciente.cpf).join(
+            candidatos, candidatos.c[0] == Paciente.id
+        ).filter(Paciente.excluido_em.is_(None)).order_by(Paciente.id).limit(limite + 1).all()
+        tem_proxima = len(pacientes) > limite
+        pacientes = pacientes[:limite]
+        
+        ids = [paciente.id for paciente in pacientes]
+        origens = {
+            nome: {linha[0] for linha in consulta.filter(coluna.in_(ids)).distinct()}
+            for nome, (consulta, coluna) in fontes.items()
+        } if ids else {}
         
-        prescricao = Prescricao(
-            paciente_id=paciente.id,
-            profissional_id=profissional.id,
-            medicamentos=dados['medicamentos'],
-            dosagem=dados['dosagem'],
-            duracao=dados.get('duracao'),
-            observacoes=dados.get('observacoes'),
-            status='ativa'
+        return jsonify({
+            'medicamento': {'id': medicamento.id, 'nome': medicamento.nome},
+            'pacientes': [{
+                'id': paciente.id,
+                'nome': paciente.nome,
+                'cpf': paciente.cpf,
+                'origens': [nome for nome, encontrados in origens.items() if paciente.id in encontrados]
+            } for paciente in pacientes],
+            'proximo_cursor': str(ids[-1]) if tem_proxima else None
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+# Blueprint para relatórios
+relatorios_bp = Blueprint('relatorios', __name__)
+
+# Todos os relatórios são agregados no banco (GROUP BY sobre expressões de
+# período); nenhuma linha é carregada como objeto ORM. Os relatórios leem as
+# tabelas de resumo diário, com poucas linhas por dia, em vez das tabelas de fatos.
+PERIODOS_RELATORIO = ['dia', 'semana', 'mes']
+
+def agrupamento_consultas(agrupar_por):
+    """Colunas (id, nome) e join usados para agrupar o resumo de consultas por profissional, unidade ou especialidade"""
+    if agrupar_por == 'profissional':
+        return [ResumoConsultaDiario.profissional_id, Profissional.nome], \
+            (Profissional, Profissional.id == ResumoConsultaDiario.profissional_id)
+    if agrupar_por == 'unidade':
+        return [ResumoConsultaDiario.unidade_id, Unidade.nome], \
+            (Unidade, Unidade.id == ResumoConsultaDiario.unidade_id)
+    return [Profissional.especialidade, Profissional.especialidade], \
+        (Profissional, Profissional.id == ResumoConsultaDiario.profissional_id)
+
+def validar_parametros_relatorio(agrupamentos_validos):
+    """Valida agrupar_por, periodo e o intervalo de datas comuns aos relatórios"""
+    agrupar_por = request.args.get('agrupar_por', agrupamentos_validos[0])
+    periodo = request.args.get('periodo', 'dia')
+    
+    if agrupar_por not in agrupamentos_validos:
+        return {'valido': False, 'mensagem': f'agrupar_por inválido. Use: {", ".join(agrupamentos_validos)}'}
+    if periodo not in PERIODOS_RELATORIO:
+        return {'valido': False, 'mensagem': f'periodo inválido. Use: {", ".join(PERIODOS_RELATORIO)}'}
+    
+    intervalo = validar_intervalo_datas(request.args.get('data_inicio'), request.args.get('data_fim'))
+    if not intervalo['valido']:
+        return intervalo
+    
+    return {
+        'valido': True,
+        'agrupar_por': agrupar_por,
+        'periodo': periodo,
+        'inicio': intervalo['inicio'],
+        'fim': intervalo['fim']
+    }
+
+@relatorios_bp.route('/consultas', methods=['GET'])
+@jwt_required()
+def relatorio_consultas():
+    """Relatório de consultas por profissional/unidade/especialidade e período"""
+    try:
+        parametros = validar_parametros_relatorio(['profissional', 'unidade', 'especialidade'])
+        if not parametros['valido']:
+            return jsonify({'erro': parametros['mensagem']}), 400
+        
+        status = request.args.get('status')
+        if status and status not in ['agendada', 'realizada', 'cancelada']:
+            return jsonify({'erro': 'Status de consulta inválido'}), 400
+        
+        periodo = expressao_periodo(ResumoConsultaDiario.dia, parametros['periodo']).label('periodo')
+        (grupo_id, grupo_nome), (modelo, condicao) = agrupamento_consultas(parametros['agrupar_por'])
+        
+        query = db.session.query(
+            periodo, grupo_id, grupo_nome, func.sum(ResumoConsultaDiario.total).label('total')
+        ).select_from(ResumoConsultaDiario).join(modelo, condicao).filter(and_(
+            ResumoConsultaDiario.dia >= parametros['inicio'].date(),
+            ResumoConsultaDiario.dia < parametros['fim'].date()
+        ))
+        if status:
+            query = query.filter(ResumoConsultaDiario.status == status)
+        
+        linhas = query.group_by(periodo, grupo_id, grupo_nome).having(
+            func.sum(ResumoConsultaDiario.total) > 0
+        ).order_by(periodo, grupo_nome).all()
+        
+        return jsonify({
+            'relatorio': 'consultas',
+            'agrupar_por': parametros['agrupar_por'],
+            'periodo': parametros['periodo'],
+            'data_inicio': parametros['inicio'].date().isoformat(),
+            'data_fim': (parametros['fim'] - timedelta(days=1)).date().isoformat(),
+            'linhas': [{
+                'periodo': str(linha.periodo),
+                'grupo_id': linha[1],
+                'grupo': linha[2],
+                'total': linha.total
+            } for linha in linhas]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+@relatorios_bp.route('/cancelamentos', methods=['GET'])
+@jwt_required()
+def relatorio_cancelamentos():
+    """Relatório de taxa de cancelamento por profissional/unidade/especialidade e período"""
+    try:
+        parametros = validar_parametros_relatorio(['profissional', 'unidade', 'especialidade'])
+        if not parametros['valido']:
+            return jsonify({'erro': parametros['mensagem']}), 400
+        
+        periodo = expressao_periodo(ResumoConsultaDiario.dia, parametros['periodo']).label('periodo')
+        (grupo_id, grupo_nome), (modelo, condicao) = agrupamento_consultas(parametros['agrupar_por'])
+        total = ResumoConsultaDiario.total
+        
+        query = db.session.query(
+            periodo, grupo_id, grupo_nome,
+            func.sum(total).label('total'),
+            func.sum(case((ResumoConsultaDiario.status == 'cancelada', total), else_=0)).label('canceladas'),
+            func.sum(case((ResumoConsultaDiario.status == 'realizada', total), else_=0)).label('realizadas')
+        ).select_from(ResumoConsultaDiario).join(modelo, condicao).filter(and_(
+            ResumoConsultaDiario.dia >= parametros['inicio'].date(),
+            ResumoConsultaDiario.dia < parametros['fim'].date()
+        ))
+        
+        linhas = query.group_by(periodo, grupo_id, grupo_nome).having(
+            func.sum(ResumoConsultaDiario.total) > 0
+        ).order_by(periodo, grupo_nome).all()
+        
+        return jsonify({
+            'relatorio': 'cancelamentos',
+            'agrupar_por': parametros['agrupar_por'],
+            'periodo': parametros['periodo'],
+            'data_inicio': parametros['inicio'].date().isoformat(),
+            'data_fim': (parametros['fim'] - timedelta(days=1)).date().isoformat(),
+            'linhas': [{
+                'periodo': str(linha.periodo),
+                'grupo_id': linha[1],
+                'grupo': linha[2],
+                'total': linha.total,
+                'canceladas': linha.canceladas,
+                'realizadas': linha.realizadas,
+                'taxa_cancelamento': round(linha.canceladas / linha.total, 4) if linha.total else 0.0
+            } for linha in linhas]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+@relatorios_bp.route('/prescricoes', methods=['GET'])
+@jwt_required()
+def relatorio_prescricoes():
+    """Relatório de prescrições por profissional e período"""
+    try:
+        parametros = validar_parametros_relatorio(['profissional'])
+        if not parametros['valido']:
+            return jsonify({'erro': parametros['mensagem']}), 400
+        
+        periodo = expressao_periodo(ResumoPrescricaoDiario.dia, parametros['periodo']).label('periodo')
+        
+        linhas = db.session.query(
+            periodo,
+            ResumoPrescricaoDiario.profissional_id,
+            Profissional.nome,
+            func.sum(ResumoPrescricaoDiario.total).label('total')
+        ).join(Profissional, Profissional.id == ResumoPrescricaoDiario.profissional_id).filter(and_(
+            ResumoPrescricaoDiario.dia >= parametros['inicio'].date(),
+            ResumoPrescricaoDiario.dia < parametros['fim'].date()
+        )).group_by(
+            periodo, ResumoPrescricaoDiario.profissional_id, Profissional.nome
+        ).having(
+            func.sum(ResumoPrescricaoDiario.total) > 0
+        ).order_by(periodo, Profissional.nome).all()
+        
+        return jsonify({
+            'relatorio': 'prescricoes',
+            'agrupar_por': 'profissional',
+            'periodo': parametros['periodo'],
+            'data_inicio': parametros['inicio'].date().isoformat(),
+            'data_fim': (parametros['fim'] - timedelta(days=1)).date().isoformat(),
+            'linhas': [{
+                'periodo': str(linha.periodo),
+                'grupo_id': linha.profissional_id,
+                'grupo': linha.nome,
+                'total': linha.total
+            } for linha in linhas]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+# Análises de utilização da agenda (mapas de calor hora × dia da semana).
+# As colunas são lidas em blocos como arrays NumPy (sem objetos ORM) e
+# agrupadas com operações vetorizadas (bincount/unique).
+DIAS_SEMANA = ['segunda', 'terça', 'quarta', 'quinta', 'sexta', 'sábado', 'domingo']
+
+def carregar_colunas_consultas(inicio, fim, unidade_id=None, tamanho_bloco=100000):
+    """Retorna um array (n, 3) com epoch (s), profissional_id e unidade_id das consultas não canceladas"""
+    query = db.select(
+        db.cast(extract('epoch', Consulta.data_hora), db.BigInteger),
+        Consulta.profissional_id,
+        Consulta.unidade_id
+    ).where(and_(
+        Consulta.data_hora >= inicio,
+        Consulta.data_hora < fim,
+        Consulta.status != 'cancelada'
+    ))
+    if unidade_id:
+        query = query.where(Consulta.unidade_id == unidade_id)
+    
+    # np.fromiter sobre os valores achatados evita converter cada Row como sequência
+    resultado = db.session.execute(query.execution_options(yield_per=tamanho_bloco))
+    blocos = [
+        np.fromiter(itertools.chain.from_iterable(particao), dtype=np.int64, count=len(particao) * 3).reshape(-1, 3)
+        for particao in resultado.partitions()
+    ]
+    return np.concatenate(blocos) if blocos else np.empty((0, 3), dtype=np.int64)
+
+def percentis(valores):
+    """Percentis 50/90/99 e máximo de um array de contagens"""
+    if not len(valores):
+        return {'p50': 0, 'p90': 0, 'p99': 0, 'max': 0}
+    p50, p90, p99 = np.percentile(valores, [50, 90, 99])
+    return {'p50': float(p50), 'p90': float(p90), 'p99': float(p99), 'max': int(valores.max())}
+
+def calcular_heatmaps(colunas, grupos, inicio, fim):
+    """
+    Calcula, para cada grupo, o mapa de calor dia da semana × hora, a média
+    semanal e os percentis de consultas por hora ocupada e por profissional/dia.
+    `grupos` é o índice do grupo (0..n-1) de cada linha de `colunas`.
+    """
+    epoch, profissionais = colunas[:, 0], colunas[:, 1]
+    total_grupos = int(grupos.max()) + 1 if len(grupos) else 0
+    
+    dias = epoch // 86400
+    horas_absolutas = epoch // 3600
+    dia_semana = (dias + 3) % 7  # 01/01/1970 foi uma quinta-feira; segunda = 0
+    hora = (epoch % 86400) // 3600
+    
+    # Mapa de calor de todos os grupos com um único bincount
+    celulas = grupos * 168 + dia_semana * 24 + hora
+    heatmaps = np.bincount(celulas, minlength=total_grupos * 168).reshape(total_grupos, 7, 24)
+    semanas = max((fim - inicio).days / 7, 1)
+    
+    # Consultas por hora ocupada (grupo, hora absoluta)
+    base_hora = horas_absolutas.min() if len(epoch) else 0
+    faixa_horas = (horas_absolutas.max() - base_hora + 1) if len(epoch) else 1
+    chaves_hora, por_hora = np.unique(grupos * faixa_horas + (horas_absolutas - base_hora), return_counts=True)
+    grupo_hora = chaves_hora // faixa_horas
+    
+    # Consultas por profissional por dia (grupo, profissional, dia)
+    base_dia = dias.min() if len(epoch) else 0
+    faixa_dias = (dias.max() - base_dia + 1) if len(epoch) else 1
+    faixa_profissionais = int(profissionais.max()) + 1 if len(epoch) else 1
+    chaves_dia, por_profissional_dia = np.unique(
+        (grupos * faixa_profissionais + profissionais) * faixa_dias + (dias - base_dia),
+        return_counts=True
+    )
+    grupo_dia = chaves_dia // (faixa_profissionais * faixa_dias)
+    
+    resultados = []
+    for indice in range(total_grupos):
+        heatmap = heatmaps[indice]
+        resultados.append({
+            'total': int(heatmap.sum()),
+            'heatmap': heatmap.tolist(),
+            'media_semanal': np.round(heatmap / semanas, 2).tolist(),
+            'percentis_por_hora': percentis(por_hora[grupo_hora == indice]),
+            'percentis_profissional_dia': percentis(por_profissional_dia[grupo_dia == indice])
+        })
+    return resultados
+
+@relatorios_bp.route('/heatmap', methods=['GET'])
+@jwt_required()
+def relatorio_heatmap():
+    """Mapas de calor de utilização da agenda por unidade ou especialidade"""
+    try:
+        if np is None:
+            return jsonify({'erro': 'Análise indisponível: NumPy não está instalado'}), 503
+        
+        agrupar_por = request.args.get('agrupar_por', 'unidade')
+        if agrupar_por not in ['unidade', 'especialidade']:
+            return jsonify({'erro': 'agrupar_por inválido. Use: unidade, especialidade'}), 400
+        
+        intervalo = validar_intervalo_datas(request.args.get('data_inicio'), request.args.get('data_fim'), dias_padrao=90)
+        if not intervalo['valido']:
+            return jsonify({'erro': intervalo['mensagem']}), 400
+        
+        unidade_id = request.args.get('unidade_id', type=int)
+        colunas = carregar_colunas_consultas(intervalo['inicio'], intervalo['fim'], unidade_id)
+        
+        if agrupar_por == 'unidade':
+            # Índices compactos 0..n-1 a partir dos ids de unidade
+            ids_grupo, grupos = np.unique(colunas[:, 2], return_inverse=True)
+            nomes = dict(db.session.query(Unidade.id, Unidade.nome).filter(Unidade.id.in_(ids_grupo.tolist())).all())
+            rotulos = [(int(grupo_id), nomes.get(int(grupo_id))) for grupo_id in ids_grupo]
+        else:
+            # Tabela de consulta profissional_id -> índice da especialidade
+            especialidades = db.session.query(Profissional.id, Profissional.especialidade).all()
+            nomes_especialidade = sorted({especialidade or 'Sem especialidade' for _, especialidade in especialidades})
+            posicao = {nome: indice for indice, nome in enumerate(nomes_especialidade)}
+            tamanho = max([profissional_id for profissional_id, _ in especialidades] + [int(colunas[:, 1].max()) if len(colunas) else 0]) + 1
+            mapa = np.zeros(tamanho, dtype=np.int64)
+            for profissional_id, especialidade in especialidades:
+                mapa[profissional_id] = posicao[especialidade or 'Sem especialidade']
+            indices_usados, grupos = np.unique(mapa[colunas[:, 1]], return_inverse=True)
+            rotulos = [(nomes_especialidade[indice], nomes_especialidade[indice]) for indice in indices_usados]
+        
+        resultados = calcular_heatmaps(colunas, grupos.reshape(-1), intervalo['inicio'], intervalo['fim'])
+        
+        return jsonify({
+            'relatorio': 'heatmap',
+            'agrupar_por': agrupar_por,
+            'data_inicio': intervalo['inicio'].date().isoformat(),
+            'data_fim': (intervalo['fim'] - timedelta(days=1)).date().isoformat(),
+            'dias_semana': DIAS_SEMANA,
+            'horas': list(range(24)),
+            'grupos': [dict(grupo_id=grupo_id, grupo=nome, **resultado)
+                       for (grupo_id, nome), resultado in zip(rotulos, resultados)]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+def calcular_kpis():
+    """Calcula os indicadores do painel a partir dos resumos diários"""
+    hoje = datetime.utcnow().date()
+    inicio_janela = hoje - timedelta(days=30)
+    
+    # Agenda de hoje por status
+    agenda = dict(db.session.query(
+        ResumoConsultaDiario.status, func.sum(ResumoConsultaDiario.total)
+    ).filter(ResumoConsultaDiario.dia == hoje).group_by(ResumoConsultaDiario.status).all())
+    
+    # Ocupação por unidade hoje (consultas não canceladas e profissionais com agenda)
+    ocupacao = db.session.query(
+        Unidade.id, Unidade.nome,
+        func.sum(ResumoConsultaDiario.total),
+        func.count(func.distinct(ResumoConsultaDiario.profissional_id))
+    ).join(Unidade, Unidade.id == ResumoConsultaDiario.unidade_id).filter(and_(
+        ResumoConsultaDiario.dia == hoje,
+        ResumoConsultaDiario.status != 'cancelada'
+    )).group_by(Unidade.id, Unidade.nome).order_by(Unidade.nome).all()
+    
+    # Cancelamentos e não comparecimentos (consultas passadas ainda 'agendada') nos últimos 30 dias
+    total, canceladas, nao_comparecimentos = db.session.query(
+        func.coalesce(func.sum(ResumoConsultaDiario.total), 0),
+        func.coalesce(func.sum(case((ResumoConsultaDiario.status == 'cancelada', ResumoConsultaDiario.total), else_=0)), 0),
+        func.coalesce(func.sum(case((ResumoConsultaDiario.status == 'agendada', ResumoConsultaDiario.total), else_=0)), 0)
+    ).filter(and_(
+        ResumoConsultaDiario.dia >= inicio_janela,
+        ResumoConsultaDiario.dia < hoje
+    )).one()
+    
+    prescricoes_ativas = db.session.query(func.count(Prescricao.id)).filter(Prescricao.status == 'ativa').scalar()
+    
+    return {
+        'agenda_hoje': {
+            'total': sum(agenda.values()),
+            'agendadas': agenda.get('agendada', 0),
+            'realizadas': agenda.get('realizada', 0),
+            'canceladas': agenda.get('cancelada', 0)
+        },
+        'ocupacao_unidades': [{
+            'unidade_id': unidade_id,
+            'unidade': nome,
+            'consultas': consultas,
+            'profissionais': profissionais
+        } for unidade_id, nome, consultas, profissionais in ocupacao],
+        'ultimos_30_dias': {
+            'consultas': total,
+            'taxa_cancelamento': round(canceladas / total, 4) if total else 0.0,
+            'taxa_nao_comparecimento': round(nao_comparecimentos / total, 4) if total else 0.0
+        },
+        'prescricoes_ativas': prescricoes_ativas
+    }
+
+class PainelKPI:
+    """
+    Snapshot materializado dos indicadores do painel.
+    
+    Recalculado periodicamente por uma tarefa em segundo plano e servido
+    imediatamente com seu `computed_at`. Se o snapshot estiver vencido, a
+    resposta usa o valor antigo e dispara uma única revalidação em segundo
+    plano (stale-while-revalidate): o lock garante que uma rajada de acessos
+    nunca provoque recálculos simultâneos.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.kpis = None
+        self.computed_at = None
+    
+    def recalcular(self):
+        """Recalcula o snapshot, a menos que outra thread já esteja recalculando"""
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            kpis = calcular_kpis()
+            self.kpis, self.computed_at = kpis, datetime.now(timezone.utc)
+            return True
+        finally:
+            self.lock.release()
+    
+    def revalidar(self, app):
+        with app.app_context():
+            try:
+                self.recalcular()
+            except Exception as e:
+                print(f"Erro ao revalidar painel: {e}")
+            finally:
+                db.session.remove()
+    
+    def obter(self, app, idade_maxima):
+        """Retorna (kpis, computed_at, desatualizado)"""
+        if self.kpis is None:
+            # Primeiro acesso: quem chega durante o cálculo aguarda o resultado
+            with self.lock:
+                if self.kpis is None:
+                    self.kpis, self.computed_at = calcular_kpis(), datetime.now(timezone.utc)
+        
+        idade = (datetime.now(timezone.utc) - self.computed_at).total_seconds()
+        desatualizado = idade > idade_maxima
+        if desatualizado and not self.lock.locked():
+            threading.Thread(target=self.revalidar, args=(app,), daemon=True).start()
+        return self.kpis, self.computed_at, desatualizado
+
+painel_kpi = PainelKPI()
+
+@relatorios_bp.route('/dashboard', methods=['GET'])
+@jwt_required()
+def dashboard():
+    """Painel de indicadores (snapshot recalculado em segundo plano)"""
+    try:
+        kpis, computed_at, desatualizado = painel_kpi.obter(
+            current_app._get_current_object(),
+            current_app.config['PAINEL_INTERVALO_SEGUNDOS']
         )
         
-        db.session.add(prescricao)
+        return jsonify({
+            'kpis': kpis,
+            'computed_at': computed_at.isoformat(),
+            'desatualizado': desatualizado
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+# Relatórios assíncronos: POST /jobs grava a tarefa na fila (tabela
+# tarefas_relatorio) e responde imediatamente; um conjunto limitado de workers
+# por processo executa as tarefas e grava o resultado em RELATORIOS_DIR.
+def executar_relatorio_json(tarefa, parametros):
+    """Executa um relatório síncrono existente com os parâmetros da tarefa (sem JWT)"""
+    funcao = RELATORIOS_JSON[tarefa.tipo]
+    with current_app.test_request_context(f'/api/relatorios/{tarefa.tipo}', query_string=parametros):
+        resposta, status = funcao.__wrapped__()
+    if status != 200:
+        raise ValueError(resposta.get_json().get('erro', 'Erro ao gerar relatório'))
+    return resposta.get_data(), 'application/json', 'json'
+
+def exportar_consultas_csv(tarefa, parametros, tamanho_bloco=5000):
+    """Exporta as consultas do intervalo em CSV, em blocos por (data_hora, id), atualizando o progresso"""
+    intervalo = validar_intervalo_datas(parametros.get('data_inicio'), parametros.get('data_fim'))
+    if not intervalo['valido']:
+        raise ValueError(intervalo['mensagem'])
+    
+    filtro = and_(Consulta.data_hora >= intervalo['inicio'], Consulta.data_hora < intervalo['fim'])
+    if parametros.get('unidade_id'):
+        filtro = and_(filtro, Consulta.unidade_id == int(parametros['unidade_id']))
+    total = db.session.query(func.count(Consulta.id)).filter(filtro).scalar()
+    
+    caminho = caminho_resultado(tarefa.id, 'csv') + '.parcial'
+    exportadas = 0
+    ultimo = None
+    with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(['id', 'data_hora', 'paciente_id', 'profissional_id', 'unidade_id', 'tipo', 'status'])
+        while True:
+            query = db.session.query(
+                Consulta.id, Consulta.data_hora, Consulta.paciente_id, Consulta.profissional_id,
+                Consulta.unidade_id, Consulta.tipo, Consulta.status
+            ).filter(filtro)
+            if ultimo:
+                query = query.filter(db.tuple_(Consulta.data_hora, Consulta.id) > ultimo)
+            linhas = query.order_by(Consulta.data_hora, Consulta.id).limit(tamanho_bloco).all()
+            if not linhas:
+                break
+            escritor.writerows([linha[0], linha[1].isoformat(), *linha[2:]] for linha in linhas)
+            exportadas += len(linhas)
+            ultimo = (linhas[-1].data_hora, linhas[-1].id)
+            fila_relatorios.atualizar_progresso(tarefa.id, int(exportadas * 100 / total) if total else 100)
+    return caminho, 'text/csv', 'csv'
+
+def caminho_resultado(tarefa_id, extensao):
+    diretorio = current_app.config['RELATORIOS_DIR']
+    os.makedirs(diretorio, exist_ok=True)
+    return os.path.join(diretorio, f'relatorio-{tarefa_id}.{extensao}')
+
+class FilaRelatorios:
+    """
+    Workers da fila de relatórios.
+    
+    A fila vive no banco: cada worker reserva a tarefa pendente mais antiga
+    com um UPDATE condicional (status = 'pendente'), de modo que vários
+    processos podem consumir a mesma fila sem executar uma tarefa duas vezes.
+    Tarefas 'executando' sem atualização há mais de RELATORIOS_TIMEOUT_SEGUNDOS
+    (worker que morreu) voltam para a fila.
+    """
+    
+    def __init__(self):
+        self.evento = threading.Event()
+        self.workers = []
+    
+    def iniciar(self, app, quantidade):
+        while len(self.workers) < quantidade:
+            thread = threading.Thread(
+                target=self.executar, args=(app,),
+                name=f'vidaplus-relatorios-{len(self.workers)}', daemon=True
+            )
+            thread.start()
+            self.workers.append(thread)
+    
+    def executar(self, app):
+        while True:
+            with app.app_context():
+                try:
+                    processou = self.processar_proxima()
+                except Exception as e:
+                    print(f"Erro na fila de relatórios: {e}")
+                    db.session.rollback()
+                    processou = False
+                finally:
+                    db.session.remove()
+            if not processou:
+                self.evento.wait(5)
+                self.evento.clear()
+    
+    def notificar(self):
+        """Acorda os workers deste processo após um novo enfileiramento"""
+        self.evento.set()
+    
+    def reservar(self):
+        """Reserva a próxima tarefa pendente; retorna None se a fila estiver vazia"""
+        agora = datetime.utcnow()
+        limite = agora - timedelta(seconds=current_app.config['RELATORIOS_TIMEOUT_SEGUNDOS'])
+        TarefaRelatorio.query.filter(and_(
+            TarefaRelatorio.status == 'executando',
+            TarefaRelatorio.atualizado_em < limite
+        )).update({'status': 'pendente'}, synchronize_session=False)
+        
+        while True:
+            candidata = db.session.query(TarefaRelatorio.id).filter(
+                TarefaRelatorio.status == 'pendente'
+            ).order_by(TarefaRelatorio.id).first()
+            if candidata is None:
+                db.session.commit()
+                return None
+            reservadas = TarefaRelatorio.query.filter(and_(
+                TarefaRelatorio.id == candidata.id,
+                TarefaRelatorio.status == 'pendente'
+            )).update({
+                'status': 'executando',
+                'progresso': 0,
+                'data_inicio': agora,
+                'atualizado_em': agora
+            }, synchronize_session=False)
+            db.session.commit()
+            if reservadas:
+                return db.session.get(TarefaRelatorio, candidata.id)
+    
+    def atualizar_progresso(self, tarefa_id, progresso):
+        TarefaRelatorio.query.filter_by(id=tarefa_id).update(
+            {'progresso': min(progresso, 99), 'atualizado_em': datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.session.commit()
+    
+    def processar_proxima(self):
+        """Executa uma tarefa da fila; retorna False se não havia tarefa pendente"""
+        tarefa = self.reservar()
+        if tarefa is None:
+            return False
+        
+        try:
+            parametros = json.loads(tarefa.parametros or '{}')
+            if tarefa.tipo == 'consultas_csv':
+                caminho_parcial, tipo_conteudo, extensao = exportar_consultas_csv(tarefa, parametros)
+            else:
+                conteudo, tipo_conteudo, extensao = executar_relatorio_json(tarefa, parametros)
+                caminho_parcial = caminho_resultado(tarefa.id, extensao) + '.parcial'
+                with open(caminho_parcial, 'wb') as arquivo:
+                    arquivo.write(conteudo)
+            
+            caminho = caminho_resultado(tarefa.id, extensao)
+            os.replace(caminho_parcial, caminho)
+            agora = datetime.utcnow()
+            tarefa.status = 'concluida'
+            tarefa.progresso = 100
+            tarefa.arquivo = caminho
+            tarefa.tipo_conteudo = tipo_conteudo
+            tarefa.tamanho = os.path.getsize(caminho)
+            tarefa.data_conclusao = agora
+            tarefa.atualizado_em = agora
+            tarefa.expira_em = agora + timedelta(hours=current_app.config['RELATORIOS_VALIDADE_HORAS'])
+        except Exception as e:
+            db.session.rollback()
+            for extensao in ('json', 'csv'):
+                parcial = caminho_resultado(tarefa.id, extensao) + '.parcial'
+                if os.path.exists(parcial):
+                    os.remove(parcial)
+            tarefa.status = 'erro'
+            tarefa.erro = str(e)
+            tarefa.data_conclusao = tarefa.atualizado_em = datetime.utcnow()
         db.session.commit()
+        return True
+
+fila_relatorios = FilaRelatorios()
+
+def limpar_relatorios_expirados():
+    """Remove os arquivos de resultados vencidos e marca as tarefas como expiradas"""
+    expiradas = TarefaRelatorio.query.filter(and_(
+        TarefaRelatorio.status == 'concluida',
+        TarefaRelatorio.expira_em < datetime.utcnow()
+    )).all()
+    for tarefa in expiradas:
+        if tarefa.arquivo and os.path.exists(tarefa.arquivo):
+            os.remove(tarefa.arquivo)
+        tarefa.status = 'expirada'
+        tarefa.arquivo = None
+    db.session.commit()
+    return len(expiradas)
+
+def serializar_tarefa(tarefa):
+    dados = {
+        'id': tarefa.id,
+        'tipo': tarefa.tipo,
+        'parametros': json.loads(tarefa.parametros or '{}'),
+        'status': tarefa.status,
+        'progresso': tarefa.progresso,
+        'data_criacao': tarefa.data_criacao.isoformat(),
+        'data_inicio': tarefa.data_inicio.isoformat() if tarefa.data_inicio else None,
+        'data_conclusao': tarefa.data_conclusao.isoformat() if tarefa.data_conclusao else None,
+        'expira_em': tarefa.expira_em.isoformat() if tarefa.expira_em else None
+    }
+    if tarefa.status == 'concluida':
+        dados['resultado'] = f'/api/relatorios/jobs/{tarefa.id}/resultado'
+        dados['tamanho'] = tarefa.tamanho
+    if tarefa.status == 'erro':
+        dados['erro'] = tarefa.erro
+    return dados
+
+def buscar_tarefa_do_usuario(tarefa_id):
+    """Retorna a tarefa se pertencer ao usuário autenticado (ou se ele for admin)"""
+    usuario_id = get_jwt_identity()
+    tarefa = db.session.get(TarefaRelatorio, tarefa_id)
+    if not tarefa:
+        return None
+    if tarefa.usuario_id != usuario_id and db.session.get(Usuario, usuario_id).tipo != 'admin':
+        return None
+    return tarefa
+
+@relatorios_bp.route('/jobs', methods=['POST'])
+@jwt_required()
+@idempotente
+def enfileirar_relatorio():
+    """Enfileira um relatório ou exportação para execução em segundo plano"""
+    try:
+        usuario_id = get_jwt_identity()
+        data = request.get_json() or {}
+        
+        tipo = data.get('tipo')
+        if tipo not in TIPOS_TAREFA_RELATORIO:
+            return jsonify({'erro': f'tipo inválido. Use: {", ".join(TIPOS_TAREFA_RELATORIO)}'}), 400
+        
+        parametros = data.get('parametros') or {}
+        if not isinstance(parametros, dict):
+            return jsonify({'erro': 'parametros deve ser um objeto'}), 400
+        
+        pendentes = TarefaRelatorio.query.filter(and_(
+            TarefaRelatorio.usuario_id == usuario_id,
+            TarefaRelatorio.status.in_(['pendente', 'executando'])
+        )).count()
+        if pendentes >= current_app.config['RELATORIOS_MAX_PENDENTES']:
+            return jsonify({'erro': 'Limite de relatórios em andamento atingido. Aguarde a conclusão dos anteriores'}), 429
         
-        registrar_auditoria(
+        tarefa = TarefaRelatorio(
             usuario_id=usuario_id,
-            acao='CREATE',
-            tabela='prescricoes',
-            registro_id=prescricao.id,
-            dados_novos=json.dumps({
-                'paciente_id': prescricao.paciente_id,
-                'profissional_id': prescricao.profissional_id,
-                'medicamentos': prescricao.medicamentos,
-                'dosagem': prescricao.dosagem,
-                'duracao': prescricao.duracao,
-                'status': prescricao.status
-            })
+            tipo=tipo,
+            parametros=json.dumps(parametros)
         )
+        db.session.add(tarefa)
+        db.session.commit()
+        fila_relatorios.notificar()
         
-        return jsonify({
-            'mensagem': 'Prescrição criada com sucesso',
-            'prescricao': {
-                'id': prescricao.id,
-                'paciente': paciente.nome,
-                'profissional': profissional.nome,
-                'medicamentos': prescricao.medicamentos,
-                'dosagem': prescricao.dosagem,
-                'duracao': prescricao.duracao,
-                'status': prescricao.status
-            }
-        }), 201
+        resposta = jsonify({
+            'mensagem': 'Relatório enfileirado',
+            'tarefa': serializar_tarefa(tarefa)
+        })
+        resposta.headers['Location'] = f'/api/relatorios/jobs/{tarefa.id}'
+        return resposta, 202
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@receitas_bp.route('/', methods=['GET'])
+@relatorios_bp.route('/jobs/<int:tarefa_id>', methods=['GET'])
 @jwt_required()
-def listar_prescricoes():
-    """Endpoint para listar prescrições com filtros"""
+def status_relatorio(tarefa_id):
+    """Status e progresso de um relatório enfileirado"""
     try:
-        paciente_id = request.args.get('paciente_id')
-        profissional_id = request.args.get('profissional_id')
-        status = request.args.get('status')
-        page = int(request.args.get('page', 1))
-        per_page = min(int(request.args.get('per_page', 10)), 100)
+        tarefa = buscar_tarefa_do_usuario(tarefa_id)
+        if not tarefa:
+            return jsonify({'erro': 'Tarefa não encontrada'}), 404
         
-        query = Prescricao.query.join(Paciente).join(Profissional)
+        return jsonify({'tarefa': serializar_tarefa(tarefa)}), 200
         
-        if paciente_id:
-            query = query.filter(Prescricao.paciente_id == paciente_id)
-        if profissional_id:
-            query = query.filter(Prescricao.profissional_id == profissional_id)
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+@relatorios_bp.route('/jobs/<int:tarefa_id>/resultado', methods=['GET'])
+@jwt_required()
+def baixar_relatorio(tarefa_id):
+    """Download do resultado (com suporte a Range e ETag)"""
+    try:
+        tarefa = buscar_tarefa_do_usuario(tarefa_id)
+        if not tarefa:
+            return jsonify({'erro': 'Tarefa não encontrada'}), 404
+        if tarefa.status == 'expirada':
+            return jsonify({'erro': 'Resultado expirado. Enfileire o relatório novamente'}), 410
+        if tarefa.status != 'concluida' or not tarefa.arquivo or not os.path.exists(tarefa.arquivo):
+            return jsonify({'erro': 'Resultado ainda não disponível'}), 409
+        
+        return send_file(
+            tarefa.arquivo,
+            mimetype=tarefa.tipo_conteudo,
+            as_attachment=True,
+            download_name=os.path.basename(tarefa.arquivo),
+            conditional=True
+        )
         
-        if status:
-            statuses_validos = ['ativa', 'encerrada']
-            if status not in statuses_validos:
-                return jsonify({'erro': 'Status de prescrição inválido'}), 400
-            query = query.filter(Prescricao.status == status)
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+RELATORIOS_JSON = {
+    'consultas': relatorio_consultas,
+    'cancelamentos': relatorio_cancelamentos,
+    'prescricoes': relatorio_prescricoes,
+    'heatmap': relatorio_heatmap
+}
+TIPOS_TAREFA_RELATORIO = list(RELATORIOS_JSON) + ['consultas_csv']
+
+# Blueprint para notificações
+notificacoes_bp = Blueprint('notificacoes', __name__)
+
+# A lista usa paginação por cursor (keyset) sobre (data_criacao, id), do mais
+# recente para o mais antigo, e o total de não lidas vem do contador
+# denormalizado em notificacoes_nao_lidas, sem COUNT(*) por requisição.
+def codificar_cursor(notificacao):
+    valor = f'{notificacao.data_criacao.isoformat()}|{notificacao.id}'
+    return base64.urlsafe_b64encode(valor.encode()).decode()
+
+def decodificar_cursor(cursor):
+    """Retorna (data_criacao, id) ou None se o cursor for inválido"""
+    try:
+        data_criacao, notificacao_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(data_criacao), int(notificacao_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def contar_nao_lidas(usuario_id):
+    contador = db.session.get(NotificacoesNaoLidas, usuario_id)
+    return contador.total if contador else 0
+
+def serializar_notificacao(notificacao):
+    return {
+        'id': notificacao.id,
+        'titulo': notificacao.titulo,
+        'mensagem': notificacao.mensagem,
+        'tipo': notificacao.tipo,
+        'lida': notificacao.lida,
+        'data_criacao': notificacao.data_criacao.isoformat()
+    }
+
+class Assinatura:
+    """Conexão SSE de um usuário: fila limitada de mensagens já formatadas"""
+    
+    def __init__(self, usuario_id, tamanho_fila):
+        self.usuario_id = usuario_id
+        self.fila = queue.Queue(maxsize=tamanho_fila)
+        self.atrasada = False
+
+class HubEventos:
+    """
+    Pub/sub em memória (por processo) para o canal SSE.
+    
+    Cada evento é formatado uma única vez e entregue às filas das conexões
+    dos usuários destinatários sem bloquear quem publica. Uma conexão cuja
+    fila enche (cliente lento) é marcada como atrasada e encerrada; o
+    navegador reconecta com Last-Event-ID e recupera as notificações pela
+    tabela, então nada se perde.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.assinaturas = {}  # usuario_id -> set de Assinatura
+        self.conexoes = 0
+    
+    def assinar(self, usuario_id, limite_conexoes, tamanho_fila=100):
+        """Registra uma conexão; retorna None se o limite do processo foi atingido"""
+        with self.lock:
+            if self.conexoes >= limite_conexoes:
+                return None
+            assinatura = Assinatura(usuario_id, tamanho_fila)
+            self.assinaturas.setdefault(usuario_id, set()).add(assinatura)
+            self.conexoes += 1
+            return assinatura
+    
+    def cancelar(self, assinatura):
+        with self.lock:
+            assinaturas = self.assinaturas.get(assinatura.usuario_id)
+            if assinaturas and assinatura in assinaturas:
+                assinaturas.discard(assinatura)
+                self.conexoes -= 1
+                if not assinaturas:
+                    del self.assinaturas[assinatura.usuario_id]
+    
+    def publicar(self, usuario_ids, evento, dados, evento_id=None):
+        with self.lock:
+            destinos = [assinatura for usuario_id in set(usuario_ids)
+                        for assinatura in self.assinaturas.get(usuario_id, ())]
+        if not destinos:
+            return 0
+        
+        mensagem = formatar_evento_sse(evento, dados, evento_id)
+        for assinatura in destinos:
+            try:
+                assinatura.fila.put_nowait(mensagem)
+            except queue.Full:
+                assinatura.atrasada = True
+        return len(destinos)
+
+def formatar_evento_sse(evento, dados, evento_id=None):
+    linhas = [f'id: {evento_id}'] if evento_id is not None else []
+    linhas += [f'event: {evento}', f'data: {json.dumps(dados, ensure_ascii=False)}']
+    return '\n'.join(linhas) + '\n\n'
+
+hub_eventos = HubEventos()
+
+def dados_evento_consulta(consulta, acao):
+    """Argumentos de hub_eventos.publicar para uma alteração de consulta (paciente e profissional)"""
+    return (
+        [consulta.paciente.usuario_id, consulta.profissional.usuario_id],
+        'consulta',
+        {'acao': acao, 'consulta': serializar_consulta(consulta)}
+    )
+
+def publicar_evento_consulta(consulta, acao):
+    hub_eventos.publicar(*dados_evento_consulta(consulta, acao))
+
+@notificacoes_bp.route('/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_notificacoes():
+    """
+    Canal SSE com notificações e alterações de consultas do usuário.
+    EventSource não envia cabeçalhos, então o token também é aceito em ?jwt=.
+    A assinatura é liberada quando a resposta é fechada (inclusive se o corpo
+    nunca for lido) ou se a preparação falhar, para não consumir SSE_MAX_CONEXOES.
+    """
+    assinatura = None
+    try:
+        usuario_id = get_jwt_identity()
+        assinatura = hub_eventos.assinar(usuario_id, current_app.config['SSE_MAX_CONEXOES'])
+        if assinatura is None:
+            resposta = jsonify({'erro': 'Limite de conexões em tempo real atingido. Tente novamente mais tarde'})
+            resposta.headers['Retry-After'] = '30'
+            return resposta, 503
+        
+        # Retomada: notificações posteriores ao último id recebido pelo cliente.
+        # A assinatura é feita antes da consulta para não perder eventos entre
+        # as duas; o cliente pode receber alguma notificação em dobro (mesmo id).
+        ultimo_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        pendentes = []
+        if ultimo_id and ultimo_id.isdigit():
+            pendentes = [
+                formatar_evento_sse('notificacao', serializar_notificacao(notificacao), notificacao.id)
+                for notificacao in Notificacao.query.filter(and_(
+                    Notificacao.usuario_id == usuario_id,
+                    Notificacao.id > int(ultimo_id)
+                )).order_by(Notificacao.id).limit(100).all()
+            ]
+        db.session.remove()  # a conexão fica aberta sem segurar uma conexão do banco
         
-        query = query.order_by(Prescricao.data_prescricao)
+        heartbeat = current_app.config['SSE_HEARTBEAT_SEGUNDOS']
         
-        paginacao = query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+        def gerar():
+            try:
+                yield 'retry: 3000\n\n'
+                yield from pendentes
+                while not assinatura.atrasada:
+                    try:
+                        yield assinatura.fila.get(timeout=heartbeat)
+                    except queue.Empty:
+                        yield ': heartbeat\n\n'
+            finally:
+                hub_eventos.cancelar(assinatura)
+        
+        resposta = Response(gerar(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        resposta.call_on_close(lambda: hub_eventos.cancelar(assinatura))  # cancelar é idempotente
+        return resposta
         
-        prescricoes = []
-        for prescricao in paginacao.items:
-            prescricoes.append({
-                'id': prescricao.id,
-                'paciente': prescricao.paciente.nome,
-                'profissional': prescricao.profissional.nome,
-                'medicamentos': prescricao.medicamentos,
-                'dosagem': prescricao.dosagem,
-                'duracao': prescricao.duracao,
-                'status': prescricao.status,
-                'data_prescricao': prescricao.data_prescricao.isoformat()
-            })
+    except Exception as e:
+        if assinatura is not None:
+            hub_eventos.cancelar(assinatura)
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+@notificacoes_bp.route('/', methods=['GET'])
+@jwt_required()
+def listar_notificacoes():
+    """Lista as notificações do usuário autenticado (?cursor=, ?limite=, ?nao_lidas=true)"""
+    try:
+        usuario_id = get_jwt_identity()
+        limite = min(request.args.get('limite', 20, type=int), 100)
+        
+        query = Notificacao.query.filter(Notificacao.usuario_id == usuario_id)
+        if request.args.get('nao_lidas', '').lower() == 'true':
+            query = query.filter(Notificacao.lida == False)
+        
+        cursor = request.args.get('cursor')
+        if cursor:
+            posicao = decodificar_cursor(cursor)
+            if not posicao:
+                return jsonify({'erro': 'Cursor inválido'}), 400
+            query = query.filter(db.tuple_(Notificacao.data_criacao, Notificacao.id) < posicao)
+        
+        # Um registro a mais indica se existe próxima página
+        notificacoes = query.order_by(
+            Notificacao.data_criacao.desc(), Notificacao.id.desc()
+        ).limit(limite + 1).all()
+        tem_proxima = len(notificacoes) > limite
+        notificacoes = notificacoes[:limite]
         
         return jsonify({
-            'prescricoes': prescricoes,
-            'paginacao': {
-                'pagina_atual': page,
-                'total_paginas': paginacao.pages,
-                'total_registros': paginacao.total,
-                'registros_por_pagina': per_page,
-                'tem_proxima': paginacao.has_next,
-                'tem_anterior': paginacao.has_prev
-            }
+            'notificacoes': [serializar_notificacao(notificacao) for notificacao in notificacoes],
+            'proximo_cursor': codificar_cursor(notificacoes[-1]) if tem_proxima else None,
+            'nao_lidas': contar_nao_lidas(usuario_id)
         }), 200
         
     except Exception as e:
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@receitas_bp.route('/<int:prescricao_id>', methods=['GET'])
+@notificacoes_bp.route('/nao-lidas', methods=['GET'])
 @jwt_required()
-def buscar_prescricao(prescricao_id):
-    """Endpoint para buscar uma prescrição específica"""
+def total_nao_lidas():
+    """Total de notificações não lidas (leitura direta do contador)"""
     try:
-        prescricao = Prescricao.query.get(prescricao_id)
-        if not prescricao:
-            return jsonify({'erro': 'Prescrição não encontrada'}), 404
-        
-        return jsonify({
-            'prescricao': {
-                'id': prescricao.id,
-                'paciente': prescricao.paciente.nome,
-                'profissional': prescricao.profissional.nome,
-                'medicamentos': prescricao.medicamentos,
-                'dosagem': prescricao.dosagem,
-                'duracao': prescricao.duracao,
-                'observacoes': prescricao.observacoes,
-                'status': prescricao.status,
-                'data_prescricao': prescricao.data_prescricao.isoformat()
-            }
-        }), 200
+        return jsonify({'nao_lidas': contar_nao_lidas(get_jwt_identity())}), 200
         
     except Exception as e:
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@receitas_bp.route('/<int:prescricao_id>', methods=['PUT'])
+@notificacoes_bp.route('/lidas', methods=['PATCH'])
 @jwt_required()
-def atualizar_prescricao(prescricao_id):
-    """Endpoint para atualizar dados de uma prescrição"""
+def marcar_notificacoes_lidas():
+    """
+    Marca notificações como lidas com um único UPDATE. Corpo:
+    {"ids": [1, 2]}, {"ate": "2024-01-31T23:59:59"} (todas até a data) ou {} (todas).
+    """
     try:
         usuario_id = get_jwt_identity()
-        prescricao = Prescricao.query.get(prescricao_id)
-        if not prescricao:
-            return jsonify({'erro': 'Prescrição não encontrada'}), 404
-        
-        dados = request.get_json()
-        if not dados:
-            return jsonify({'erro': 'Dados não fornecidos'}), 400
-        
-        # Atualiza campos permitidos
-        if 'medicamentos' in dados:
-            prescricao.medicamentos = dados['medicamentos']
-        if 'dosagem' in dados:
-            prescricao.dosagem = dados['dosagem']
-        if 'duracao' in dados:
-            prescricao.duracao = dados['duracao']
-        if 'observacoes' in dados:
-            prescricao.observacoes = dados['observacoes']
-        if 'status' in dados:
-            statuses_validos = ['ativa', 'encerrada']
-            if dados['status'] not in statuses_validos:
-                return jsonify({'erro': 'Status de prescrição inválido'}), 400
-            prescricao.status = dados['status']
-        
-        db.session.commit()
+        data = request.get_json(silent=True) or {}
+        
+        condicoes = [Notificacao.usuario_id == usuario_id, Notificacao.lida == False]
+        if 'ids' in data:
+            ids = data['ids']
+            if not isinstance(ids, list) or not ids or not all(isinstance(item, int) for item in ids):
+                return jsonify({'erro': 'ids deve ser uma lista de IDs'}), 400
+            if len(ids) > 500:
+                return jsonify({'erro': 'Máximo de 500 IDs por requisição'}), 400
+            condicoes.append(Notificacao.id.in_(ids))
+        if 'ate' in data:
+            try:
+                ate = datetime.fromisoformat(str(data['ate']))
+            except ValueError:
+                return jsonify({'erro': 'Formato de data inválido em ate. Use ISO 8601'}), 400
+            condicoes.append(Notificacao.data_criacao <= ate.replace(tzinfo=None))
         
-        registrar_auditoria(
-            usuario_id=usuario_id,
-            acao='UPDATE',
-            tabela='prescricoes',
-            registro_id=prescricao.id,
-            dados_novos=json.dumps(dados)
+        marcadas = Notificacao.query.filter(and_(*condicoes)).update(
+            {'lida': True}, synchronize_session=False
         )
+        if marcadas:
+            ajustar_resumo(NotificacoesNaoLidas, {'usuario_id': usuario_id}, -marcadas)
+        db.session.commit()
         
         return jsonify({
-            'mensagem': 'Prescrição atualizada com sucesso',
-            'prescricao': {
-                'id': prescricao.id,
-                'medicamentos': prescricao.medicamentos,
-                'dosagem': prescricao.dosagem,
-                'duracao': prescricao.duracao,
-                'observacoes': prescricao.observacoes,
-                'status': prescricao.status
-            }
+            'mensagem': f'{marcadas} notificação(ões) marcada(s) como lida(s)',
+            'marcadas': marcadas,
+            'nao_lidas': contar_nao_lidas(usuario_id)
         }), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
-@receitas_bp.route('/<int:prescricao_id>', methods=['DELETE'])
+# Blueprint para consulta da auditoria (somente administradores)
+auditoria_bp = Blueprint('auditoria', __name__)
+
+def carregar_payload(valor):
+    """Descomprime o payload e devolve o JSON decodificado (ou o texto, se não for JSON)"""
+    texto = descomprimir_payload(valor)
+    if texto is None:
+        return None
+    try:
+        return json.loads(texto)
+    except ValueError:
+        return texto
+
+def serializar_auditoria(linha):
+    return {
+        'id': linha['id'],
+        'usuario_id': linha['usuario_id'],
+        'acao': linha['acao'],
+        'tabela': linha['tabela'],
+        'registro_id': linha['registro_id'],
+        'dados_anteriores': carregar_payload(linha['dados_anteriores']),
+        'dados_novos': carregar_payload(linha['dados_novos']),
+        'ip': linha['ip'],
+        'data_hora': linha['data_hora'].isoformat()
+    }
+
+@auditoria_bp.route('/', methods=['GET'])
 @jwt_required()
-def excluir_prescricao(prescricao_id):
-    """Endpoint para excluir uma prescrição"""
+def listar_auditoria():
+    """
+    Registros de auditoria do mais recente para o mais antigo, com filtros
+    usuario_id, tabela, registro_id (exige tabela), acao e data_inicio/data_fim.
+    Paginação por cursor (id): cada filtro usa um índice dos segmentos mensais,
+    e o intervalo de datas limita os segmentos lidos.
+    """
     try:
-        usuario_id = get_jwt_identity()
-        prescricao = Prescricao.query.get(prescricao_id)
-        if not prescricao:
-            return jsonify({'erro': 'Prescrição não encontrada'}), 404
+        usuario = db.session.get(Usuario, get_jwt_identity())
+        if not usuario or usuario.tipo != 'admin':
+            return jsonify({'erro': 'Acesso restrito a administradores'}), 403
+        
+        limite = min(request.args.get('limite', 50, type=int), 200)
+        usuario_id = request.args.get('usuario_id', type=int)
+        tabela = request.args.get('tabela')
+        registro_id = request.args.get('registro_id', type=int)
+        acao = request.args.get('acao')
+        if registro_id is not None and not tabela:
+            return jsonify({'erro': 'Informe tabela junto com registro_id'}), 400
+        
+        cursor = request.args.get('cursor')
+        if cursor and not cursor.isdigit():
+            return jsonify({'erro': 'Cursor inválido'}), 400
+        
+        inicio = fim = None
+        if request.args.get('data_inicio') or request.args.get('data_fim'):
+            intervalo = validar_intervalo_datas(request.args.get('data_inicio'), request.args.get('data_fim'))
+            if not intervalo['valido']:
+                return jsonify({'erro': intervalo['mensagem']}), 400
+            inicio, fim = intervalo['inicio'], intervalo['fim']
+        
+        def condicao(segmento):
+            filtros = []
+            if usuario_id is not None:
+                filtros.append(segmento.c.usuario_id == usuario_id)
+            if tabela:
+                filtros.append(segmento.c.tabela == tabela)
+            if registro_id is not None:
+                filtros.append(segmento.c.registro_id == registro_id)
+            if acao:
+                filtros.append(segmento.c.acao == acao.upper())
+            return and_(db.true(), *filtros)
+        
+        # Um registro a mais indica se existe próxima página
+        linhas = buscar_auditoria(inicio, fim, condicao, limite + 1, int(cursor) if cursor else None)
+        tem_proxima = len(linhas) > limite
+        linhas = linhas[:limite]
         
-        dados_anteriores = json.dumps({
-            'paciente_id': prescricao.paciente_id,
-            'profissional_id': prescricao.profissional_id,
-            'medicamentos': prescricao.medicamentos,
-            'dosagem': prescricao.dosagem,
-            'status': prescricao.status
-        })
+        return jsonify({
+            'registros': [serializar_auditoria(linha) for linha in linhas],
+            'proximo_cursor': str(linhas[-1]['id']) if tem_proxima else None
+        }), 200
         
-        db.session.delete(prescricao)
-        db.session.commit()
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
+
+# Blueprint do feed de alterações (sincronização incremental de sistemas externos)
+alteracoes_bp = Blueprint('alteracoes', __name__)
+
+def seq_em_ordem_de_commit():
+    """No SQLite as escritas são serializadas: o seq de cada evento é atribuído na ordem dos commits"""
+    return db.engine.dialect.name == 'sqlite'
+
+@alteracoes_bp.route('/', methods=['GET'], strict_slashes=False)
+@jwt_required()
+def listar_alteracoes():
+    """
+    Alterações com seq > `since`, em ordem crescente (busca pela chave
+    primária). O consumidor guarda `proximo_since` e repete enquanto
+    `tem_mais` for verdadeiro; o custo é proporcional às alterações, não
+    ao tamanho das tabelas. Responde 410 se as alterações após `since` já
+    foram removidas pela retenção (é preciso uma sincronização completa).
+    """
+    try:
+        usuario = db.session.get(Usuario, get_jwt_identity())
+        if not usuario or usuario.tipo != 'admin':
+            return jsonify({'erro': 'Acesso restrito a administradores'}), 403
         
-        registrar_auditoria(
-            usuario_id=usuario_id,
-            acao='DELETE',
-            tabela='prescricoes',
-            registro_id=prescricao_id,
-            dados_anteriores=dados_anteriores
-        )
+        desde = request.args.get('since', 0, type=int)
+        limite = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        if desde < 0:
+            return jsonify({'erro': 'since deve ser maior ou igual a zero'}), 400
         
-        return jsonify({'mensagem': 'Prescrição excluída com sucesso'}), 200
+        primeira = db.session.query(func.min(Alteracao.id)).scalar()
+        if primeira is not None and desde < primeira - 1:
+            return jsonify({
+                'erro': 'Alterações após since já foram removidas pela retenção; refaça a sincronização completa',
+                'menor_since': primeira - 1
+            }), 410
+        
+        alteracoes = Alteracao.query.filter(Alteracao.id > desde).order_by(Alteracao.id).limit(limite + 1).all()
+        tem_mais = len(alteracoes) > limite
+        alteracoes = alteracoes[:limite]
+        
+        # Fora do SQLite os ids vêm da sequência no INSERT, não no commit: um
+        # seq menor ainda não confirmado pode aparecer depois de um maior. O
+        # feed para no primeiro evento com menos de MARGEM_SINCRONIZACAO, para
+        # que o consumidor não avance `since` por cima de um seq pendente.
+        if not seq_em_ordem_de_commit():
+            corte = datetime.utcnow() - MARGEM_SINCRONIZACAO
+            prontas = list(itertools.takewhile(lambda alteracao: alteracao.data_hora <= corte, alteracoes))
+            if len(prontas) < len(alteracoes):
+                alteracoes, tem_mais = prontas, False
+        
+        return jsonify({
+            'alteracoes': [{
+                'seq': alteracao.id,
+                'tabela': alteracao.tabela,
+                'registro_id': alteracao.registro_id,
+                'operacao': alteracao.operacao,
+                'data_hora': alteracao.data_hora.isoformat()
+            } for alteracao in alteracoes],
+            'proximo_since': alteracoes[-1].id if alteracoes else desde,
+            'tem_mais': tem_mais
+        }), 200
         
     except Exception as e:
-        db.session.rollback()
         return jsonify({'erro': f'Erro interno do servidor: {str(e)}'}), 500
 
+# =============================================================================
+# EXPORTAÇÃO DE SNAPSHOTS PARA BI
+# =============================================================================
+
+def chave_pseudonimo():
+    """
+    Chave HMAC dos pseudônimos (SNAPSHOT_PSEUDONIMO_CHAVE). Os ids de paciente
+    são inteiros pequenos: com uma chave conhecida (como os valores padrão
+    públicos de SECRET_KEY/JWT_SECRET_KEY) bastaria recalcular o HMAC de cada
+    id para reidentificar os pacientes, então a exportação é recusada.
+    """
+    config = current_app.config
+    chave = config.get('SNAPSHOT_PSEUDONIMO_CHAVE')
+    if not chave or chave in (config['SECRET_KEY'], config['JWT_SECRET_KEY']):
+        raise RuntimeError('Exportação recusada: defina SNAPSHOT_PSEUDONIMO_CHAVE com uma chave exclusiva e secreta')
+    return chave.encode()
+
+def pseudonimo_paciente(paciente_id):
+    """Identificador estável e não reversível do paciente (HMAC com SNAPSHOT_PSEUDONIMO_CHAVE)"""
+    return hmac.new(chave_pseudonimo(), f'paciente:{paciente_id}'.encode(), hashlib.sha256).hexdigest()[:16]
+
+# Colunas exportadas por tabela: (nome, expressão, tipo). Dados pessoais do
+# paciente não são exportados; o id é substituído por um pseudônimo.
+COLUNAS_SNAPSHOT = {
+    'consultas': (Consulta, [
+        ('id', Consulta.id, 'inteiro'),
+        ('paciente', Consulta.paciente_id, 'pseudonimo'),
+        ('profissional_id', Consulta.profissional_id, 'inteiro'),
+        ('unidade_id', Consulta.unidade_id, 'inteiro'),
+        ('data_hora', Consulta.data_hora, 'data_hora'),
+        ('tipo', Consulta.tipo, 'texto'),
+        ('status', Consulta.status, 'texto')
+    ]),
+    'prescricoes': (Prescricao, [
+        ('id', Prescricao.id, 'inteiro'),
+        ('paciente', Prescricao.paciente_id, 'pseudonimo'),
+        ('profissional_id', Prescricao.profissional_id, 'inteiro'),
+        ('data_prescricao', Prescricao.data_prescricao, 'data_hora'),
+        ('medicamentos', Prescricao.medicamentos, 'texto'),
+        ('dosagem', Prescricao.dosagem, 'texto'),
+        ('duracao', Prescricao.duracao, 'texto'),
+        ('status', Prescricao.status, 'texto')
+    ]),
+    'pacientes': (Paciente, [
+        ('paciente', Paciente.id, 'pseudonimo'),
+        ('sexo', Paciente.sexo, 'texto'),
+        ('ano_nascimento', extract('year', Paciente.data_nascimento), 'inteiro'),
+        ('plano_saude', Paciente.plano_saude, 'texto')
+    ]),
+    'profissionais': (Profissional, [
+        ('id', Profissional.id, 'inteiro'),
+        ('nome', Profissional.nome, 'texto'),
+        ('especialidade', Profissional.especialidade, 'texto'),
+        ('data_admissao', Profissional.data_admissao, 'data_hora'),
+        ('ativo', Profissional.ativo, 'inteiro')
+    ])
+}
+
+def converter_bloco(colunas, linhas):
+    """Converte um bloco de linhas em {coluna: array} (PyArrow se disponível, senão NumPy)"""
+    valores = {nome: [] for nome, _, _ in colunas}
+    for linha in linhas:
+        for (nome, _, tipo), valor in zip(colunas, linha):
+            if tipo == 'pseudonimo':
+                valor = pseudonimo_paciente(valor)
+            elif tipo == 'data_hora' and valor is not None and not isinstance(valor, datetime):
+                valor = datetime.combine(valor, datetime.min.time())
+            valores[nome].append(valor)
+    
+    arrays = {}
+    for nome, _, tipo in colunas:
+        dados = valores[nome]
+        if pyarrow is not None:
+            tipo_arrow = {'inteiro': pyarrow.int64(), 'data_hora': pyarrow.timestamp('us')}.get(tipo, pyarrow.string())
+            arrays[nome] = pyarrow.array(dados, type=tipo_arrow)
+        elif tipo == 'inteiro':
+            arrays[nome] = np.array([-1 if valor is None else int(valor) for valor in dados], dtype=np.int64)
+        elif tipo == 'data_hora':
+            arrays[nome] = np.array([valor.replace(tzinfo=None) if valor else None for valor in dados], dtype='datetime64[us]')
+        else:
+            arrays[nome] = np.array(['' if valor is None else str(valor) for valor in dados], dtype=str)
+    return arrays
+
+def exportar_snapshot(diretorio, completo=False, tamanho_bloco=50000):
+    """
+    Grava um snapshot colunar de consultas, prescrições, pacientes
+    (pseudonimizados) e profissionais em `diretorio`/<data>-<tipo>/.
+    
+    A marca d'água é o último id de auditoria (global entre os segmentos): um snapshot
+    incremental exporta apenas os registros criados ou alterados desde o
+    snapshot anterior e lista os excluídos no manifest.json. As linhas são
+    lidas e gravadas em blocos (um row group Parquet ou um .npz por bloco).
+    """
+    if pyarrow is None and np is None:
+        raise RuntimeError('Exportação indisponível: instale pyarrow ou numpy')
+    chave_pseudonimo()  # recusa antes de gravar qualquer arquivo
+    
+    os.makedirs(diretorio, exist_ok=True)
+    caminho_estado = os.path.join(diretorio, 'estado.json')
+    estado = {}
+    if os.path.exists(caminho_estado):
+        with open(caminho_estado) as arquivo:
+            estado = json.load(arquivo)
+    
+    marca_anterior = estado.get('marca_dagua')
+    incremental = marca_anterior is not None and not completo
+    marca_atual = ultimo_id_auditoria()
+    segmentos = segmentos_auditoria_apos_id(marca_anterior) if incremental else []
+    
+    gerado_em = datetime.now(timezone.utc)
+    destino = os.path.join(diretorio, f"{gerado_em.strftime('%Y%m%dT%H%M%S%fZ')}-{'incremental' if incremental else 'completo'}")
+    os.makedirs(destino, exist_ok=True)
+    formato = 'parquet' if pyarrow is not None else 'npz'
+    
+    manifesto = {
+        'gerado_em': gerado_em.isoformat(),
+        'tipo': 'incremental' if incremental else 'completo',
+        'formato': formato,
+        'marca_dagua_anterior': marca_anterior,
+        'marca_dagua': marca_atual,
+        'tabelas': {}
+    }
+    
+    for tabela, (modelo, colunas) in COLUNAS_SNAPSHOT.items():
+        query = db.select(*[expressao for _, expressao, _ in colunas]).order_by(modelo.id)
+        excluidos = []
+        if incremental:
+            faixas = [and_(
+                segmento.c.id > marca_anterior,
+                segmento.c.id <= marca_atual,
+                segmento.c.tabela == tabela
+            ) for segmento in segmentos]
+            if faixas:
+                alterados = db.union_all(*[
+                    db.select(segmento.c.registro_id).where(faixa) for segmento, faixa in zip(segmentos, faixas)
+                ])
+                query = query.where(modelo.id.in_(alterados))
+                excluidos = sorted({registro_id for segmento, faixa in zip(segmentos, faixas)
+                                    for (registro_id,) in db.session.execute(db.select(segmento.c.registro_id).where(
+                                        and_(faixa, segmento.c.acao == 'DELETE'))).all()})
+            else:
+                query = query.where(db.false())
+            if tabela == 'pacientes':
+                excluidos = [pseudonimo_paciente(registro_id) for registro_id in excluidos]
+        
+        linhas_exportadas = 0
+        arquivos = []
+        escritor = None
+        resultado = db.session.execute(query.execution_options(yield_per=tamanho_bloco))
+        for numero, particao in enumerate(resultado.partitions()):
+            arrays = converter_bloco(colunas, particao)
+            linhas_exportadas += len(particao)
+            if formato == 'parquet':
+                bloco = pyarrow.table(arrays)
+                if escritor is None:
+                    arquivos.append(f'{tabela}.parquet')
+                    escritor = pyarrow.parquet.ParquetWriter(os.path.join(destino, arquivos[0]), bloco.schema, compression='zstd')
+                escritor.write_table(bloco)
+            else:
+                arquivos.append(f'{tabela}-{numero:05d}.npz')
+                np.savez_compressed(os.path.join(destino, arquivos[-1]), **arrays)
+        if escritor is not None:
+            escritor.close()
+        
+        manifesto['tabelas'][tabela] = {
+            'linhas': linhas_exportadas,
+            'arquivos': arquivos,
+            'colunas': [nome for nome, _, _ in colunas],
+            'excluidos': excluidos
+        }
+    
+    with open(os.path.join(destino, 'manifest.json'), 'w') as arquivo:
+        json.dump(manifesto, arquivo, indent=2)
+    with open(caminho_estado, 'w') as arquivo:
+        json.dump({'marca_dagua': marca_atual, 'ultimo_snapshot': destino}, arquivo)
+    
+    print(f"📦 Snapshot {manifesto['tipo']} gravado em {destino}")
+    return manifesto
+
 # =============================================================================
 # CONFIGURAÇÃO DA APLICAÇÃO FLASK
 # =============================================================================
@@ -1729,6 +5481,45 @@ def create_app():
     app.config['JWT_HEADER_NAME'] = 'Authorization'
     app.config['JWT_HEADER_TYPE'] = 'Bearer'
     
+    # Tarefas em segundo plano (painel de indicadores e demais rotinas periódicas)
+    app.config['TAREFAS_BACKGROUND'] = os.getenv('TAREFAS_BACKGROUND', 'true').lower() == 'true'
+    app.config['PAINEL_INTERVALO_SEGUNDOS'] = int(os.getenv('PAINEL_INTERVALO_SEGUNDOS', 60))
+    app.config['SNAPSHOT_DIR'] = os.getenv('SNAPSHOT_DIR', os.path.join(app.instance_path, 'snapshots'))
+    app.config['SNAPSHOT_INTERVALO_SEGUNDOS'] = int(os.getenv('SNAPSHOT_INTERVALO_SEGUNDOS', 0))  # 0 = desligado
+    app.config['SNAPSHOT_PSEUDONIMO_CHAVE'] = os.getenv('SNAPSHOT_PSEUDONIMO_CHAVE', '')  # obrigatória para exportar
+    
+    # Relatórios assíncronos (fila no banco, resultados em disco)
+    app.config['RELATORIOS_DIR'] = os.getenv('RELATORIOS_DIR', os.path.join(app.instance_path, 'relatorios'))
+    app.config['RELATORIOS_WORKERS'] = int(os.getenv('RELATORIOS_WORKERS', 2))
+    app.config['RELATORIOS_VALIDADE_HORAS'] = int(os.getenv('RELATORIOS_VALIDADE_HORAS', 24))
+    app.config['RELATORIOS_TIMEOUT_SEGUNDOS'] = int(os.getenv('RELATORIOS_TIMEOUT_SEGUNDOS', 600))
+    app.config['RELATORIOS_MAX_PENDENTES'] = int(os.getenv('RELATORIOS_MAX_PENDENTES', 5))
+    
+    # Canal SSE de notificações (conexões simultâneas por processo e intervalo do heartbeat)
+    app.config['SSE_MAX_CONEXOES'] = int(os.getenv('SSE_MAX_CONEXOES', 1000))
+    app.config['SSE_HEARTBEAT_SEGUNDOS'] = int(os.getenv('SSE_HEARTBEAT_SEGUNDOS', 15))
+    
+    # Lembretes de consulta (passo do agendador e ressincronização com o banco)
+    app.config['LEMBRETES_INTERVALO_SEGUNDOS'] = int(os.getenv('LEMBRETES_INTERVALO_SEGUNDOS', 30))
+    app.config['LEMBRETES_SINCRONIZAR_SEGUNDOS'] = int(os.getenv('LEMBRETES_SINCRONIZAR_SEGUNDOS', 300))
+    
+    # Políticas de retenção (em dias) e arquivamento opcional da auditoria antes da exclusão
+    app.config['RETENCAO_NOTIFICACOES_LIDAS_DIAS'] = int(os.getenv('RETENCAO_NOTIFICACOES_LIDAS_DIAS', 90))
+    app.config['RETENCAO_NOTIFICACOES_DIAS'] = int(os.getenv('RETENCAO_NOTIFICACOES_DIAS', 365))
+    app.config['RETENCAO_AUDITORIA_DIAS'] = int(os.getenv('RETENCAO_AUDITORIA_DIAS', 1825))
+    app.config['RETENCAO_ALTERACOES_DIAS'] = int(os.getenv('RETENCAO_ALTERACOES_DIAS', 30))
+    app.config['RETENCAO_EXCLUSOES_DIAS'] = int(os.getenv('RETENCAO_EXCLUSOES_DIAS', 90))
+    app.config['RETENCAO_ARQUIVO_DIR'] = os.getenv('RETENCAO_ARQUIVO_DIR', '')
+    app.config['RETENCAO_INTERVALO_SEGUNDOS'] = int(os.getenv('RETENCAO_INTERVALO_SEGUNDOS', 86400))
+    
+    # Encerramento automático de prescrições vencidas (data_fim)
+    app.config['PRESCRICOES_INTERVALO_SEGUNDOS'] = int(os.getenv('PRESCRICOES_INTERVALO_SEGUNDOS', 3600))
+    
+    # Idempotency-Key nos endpoints de criação
+    app.config['IDEMPOTENCIA_VALIDADE_HORAS'] = int(os.getenv('IDEMPOTENCIA_VALIDADE_HORAS', 24))
+    app.config['IDEMPOTENCIA_ESPERA_SEGUNDOS'] = int(os.getenv('IDEMPOTENCIA_ESPERA_SEGUNDOS', 10))
+    app.config['IDEMPOTENCIA_ABANDONO_SEGUNDOS'] = int(os.getenv('IDEMPOTENCIA_ABANDONO_SEGUNDOS', 60))
+    
     # Inicialização das extensões com a aplicação
     db.init_app(app)
     jwt.init_app(app)
@@ -1741,11 +5532,54 @@ def create_app():
     app.register_blueprint(profissionais_bp, url_prefix='/api/profissionais')
     app.register_blueprint(consultas_bp, url_prefix='/api/consultas')
     app.register_blueprint(receitas_bp, url_prefix='/api/receitas')
+    app.register_blueprint(medicamentos_bp, url_prefix='/api/medicamentos')
+    app.register_blueprint(relatorios_bp, url_prefix='/api/relatorios')
+    app.register_blueprint(notificacoes_bp, url_prefix='/api/notificacoes')
+    app.register_blueprint(auditoria_bp, url_prefix='/api/auditoria')
+    app.register_blueprint(alteracoes_bp, url_prefix='/api/changes')
     
     # Adicionar os demais blueprints aqui quando implementados
     # app.register_blueprint(administracao_bp, url_prefix='/api/administracao')
     # app.register_blueprint(telemedicina_bp, url_prefix='/api/telemedicina')
-    # app.register_blueprint(relatorios_bp, url_prefix='/api/relatorios')
+    
+    # Comando de linha para backfill/correção dos resumos diários:
+    # flask --app VidaPlus reconstruir-resumos
+    @app.cli.command('reconstruir-resumos')
+    def reconstruir_resumos_comando():
+        """Recalcula as tabelas de resumo diário a partir de consultas e prescrições"""
+        totais = reconstruir_resumos()
+        for tabela, linhas in totais.items():
+            print(f"✅ {tabela}: {linhas} linhas")
+    
+    # Reindexação do catálogo de medicamentos: flask --app VidaPlus indexar-medicamentos
+    @app.cli.command('indexar-medicamentos')
+    def indexar_medicamentos_comando():
+        """Refaz os vínculos de medicamentos a partir do texto livre de prescrições e pacientes"""
+        totais = indexar_medicamentos(reconstruir=True)
+        for tabela, linhas in totais.items():
+            print(f"✅ {tabela}: {linhas} vínculos")
+    
+    # Snapshot colunar para BI: flask --app VidaPlus exportar-snapshot [--completo]
+    @app.cli.command('exportar-snapshot')
+    @click.option('--completo', is_flag=True, help='Ignora a marca d\'água e exporta todos os registros')
+    def exportar_snapshot_comando(completo):
+        """Grava um snapshot colunar (Parquet ou .npz) para a equipe de BI"""
+        try:
+            manifesto = exportar_snapshot(app.config['SNAPSHOT_DIR'], completo=completo)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        for tabela, info in manifesto['tabelas'].items():
+            print(f"✅ {tabela}: {info['linhas']} linhas, {len(info['excluidos'])} excluídos")
+    
+    # Retenção manual: flask --app VidaPlus purgar-dados [--vacuum]
+    @app.cli.command('purgar-dados')
+    @click.option('--vacuum', is_flag=True, help='Executa VACUUM completo e ativa o auto_vacuum incremental')
+    def purgar_dados_comando(vacuum):
+        """Aplica as políticas de retenção (notificações, feed de alterações, tombstones e auditoria)"""
+        relatorio = aplicar_retencao(vacuum_completo=vacuum)
+        for tabela, linhas in relatorio['linhas_removidas'].items():
+            print(f"✅ {tabela}: {linhas} linhas removidas")
+        print(f"✅ {relatorio['bytes_recuperados']} bytes recuperados ({relatorio['bytes_livres']} bytes ainda livres no arquivo)")
     
     # Rota principal da aplicação
     @app.route('/')
@@ -1762,7 +5596,11 @@ def create_app():
                 'profissionais': '/api/profissionais',
                 'administracao': '/api/administracao',
                 'telemedicina': '/api/telemedicina',
-                'relatorios': '/api/relatorios'
+                'relatorios': '/api/relatorios',
+                'notificacoes': '/api/notificacoes',
+                'auditoria': '/api/auditoria',
+                'alteracoes': '/api/changes',
+                'medicamentos': '/api/medicamentos'
             },
             'documentacao': {
                 'login': 'POST /api/auth/login',
@@ -1800,9 +5638,11 @@ def create_app():
         """Endpoint para recriar o banco de dados do zero (desenvolvimento)"""
         try:
             print("🗑️ Limpando banco de dados...")
+            descartar_estruturas_auxiliares()
             db.drop_all()
             print("📊 Recriando tabelas...")
             db.create_all()
+            preparar_banco(recriado=True)
             print("🌱 Criando dados iniciais...")
             criar_dados_iniciais()
             print("✅ Banco de dados recriado com sucesso!")
@@ -1881,6 +5721,7 @@ with app.app_context():
     """
     try:
         db.create_all()  # Cria todas as tabelas definidas nos modelos
+        preparar_banco()  # Índices de busca e demais estruturas auxiliares
         criar_dados_iniciais()  # Popula o banco com dados iniciais
         print("✅ Banco de dados inicializado com sucesso!")
     except Exception as e:
@@ -1900,4 +5741,11 @@ if __name__ == '__main__':
     print("📊 API disponível em: http://localhost:5000")
     print("🔍 Health check: http://localhost:5000/api/health")
     print("📝 Documentação: http://localhost:5000/")
+    
+    # As rotinas periódicas (painel de indicadores etc.) só sobem no servidor,
+    # nunca na importação (testes, comandos flask, scripts). Com o reloader do
+    # modo debug o script roda também no processo monitor: só o filho, que
+    # atende as requisições, inicia as threads
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        iniciar_tarefas_background(app)
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""
+Fixtures dos testes automatizados (pytest + cliente de testes do Flask).
+
+O VidaPlus cria a aplicação e inicializa o banco na importação, então o
+ambiente é configurado antes do import: banco SQLite temporário, diretórios
+de saída temporários e tarefas em segundo plano desligadas. Cada teste
+começa com o banco recriado por POST /api/recreate-db.
+"""
+
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+DIRETORIO_TESTES = tempfile.mkdtemp(prefix='vidaplus-testes-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DIRETORIO_TESTES, 'vidaplus.db')
+os.environ['TAREFAS_BACKGROUND'] = 'false'
+os.environ['SNAPSHOT_DIR'] = os.path.join(DIRETORIO_TESTES, 'snapshots')
+os.environ['RELATORIOS_DIR'] = os.path.join(DIRETORIO_TESTES, 'relatorios')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import VidaPlus  # noqa: E402
+
+ADMIN = {'email': 'admin@vidaplus.com', 'senha': 'admin123'}
+
+def cpf_valido(base):
+    """CPF formatado com dígitos verificadores válidos a partir de um número de até 9 dígitos"""
+    digitos = [int(d) for d in f'{base:09d}']
+    for tamanho in (9, 10):
+        soma = sum(d * peso for d, peso in zip(digitos, range(tamanho + 1, 1, -1)))
+        resto = soma * 10 % 11
+        digitos.append(0 if resto == 10 else resto)
+    texto = ''.join(map(str, digitos))
+    return f'{texto[:3]}.{texto[3:6]}.{texto[6:9]}-{texto[9:]}'
+
+class Api:
+    """Atalhos para criar registros pelos próprios endpoints, com o token do administrador"""
+    
+    def __init__(self, cliente, cabecalhos):
+        self.cliente = cliente
+        self.cabecalhos = cabecalhos
+        self.sequencia = 0
+    
+    def proximo(self):
+        self.sequencia += 1
+        return self.sequencia
+    
+    def criar(self, caminho, dados, chave):
+        resposta = self.cliente.post(caminho, json=dados, headers=self.cabecalhos)
+        assert resposta.status_code == 201, resposta.get_json()
+        return resposta.get_json()[chave]
+    
+    def paciente(self, nome='Ana Souza', **dados):
+        numero = self.proximo()
+        return self.criar('/api/pacientes/', {
+            'email': f'paciente{numero}@teste.com',
+            'senha': 'Paciente123!',
+            'cpf': cpf_valido(100000000 + numero),
+            'nome': nome,
+            'data_nascimento': '1990-05-15',
+            'sexo': 'F',
+            **dados
+        }, 'paciente')
+    
+    def profissional(self, nome='Dr. Carlos Mendes', **dados):
+        numero = self.proximo()
+        return self.criar('/api/profissionais/', {
+            'email': f'profissional{numero}@teste.com',
+            'senha': 'Profissional123!',
+            'crm_coren': f'CRM-{100000 + numero}',
+            'nome': nome,
+            'especialidade': 'Cardiologia',
+            'data_admissao': '2020-01-15',
+            **dados
+        }, 'profissional')
+    
+    def consulta(self, paciente_id, profissional_id, data_hora='2030-01-10T10:00:00', **dados):
+        return self.criar('/api/consultas/', {
+            'paciente_id': paciente_id,
+            'profissional_id': profissional_id,
+            'unidade_id': 1,
+            'data_hora': data_hora,
+            'tipo': 'presencial',
+            **dados
+        }, 'consulta')
+    
+    def prescricao(self, paciente_id, profissional_id, medicamentos='Dipirona 500mg', **dados):
+        return self.criar('/api/receitas/', {
+            'paciente_id': paciente_id,
+            'profissional_id': profissional_id,
+            'medicamentos': medicamentos,
+            'dosagem': '1 comprimido a cada 8 horas',
+            'duracao': '7 dias',
+            **dados
+        }, 'prescricao')
+
+@pytest.fixture
+def app():
+    aplicacao = VidaPlus.app
+    # A identidade dos tokens é o id (inteiro) do usuário; o PyJWT recente só aceita "sub" em texto
+    aplicacao.config.update(TESTING=True, JWT_VERIFY_SUB=False)
+    return aplicacao
+
+@pytest.fixture
+def cliente(app):
+    cliente = app.test_client()
+    resposta = cliente.post('/api/recreate-db')
+    assert resposta.status_code == 200
+    return cliente
+
+@pytest.fixture
+def login(cliente):
+    """Faz login e devolve os cabeçalhos de autenticação: login(email, senha)"""
+    def entrar(email, senha):
+        resposta = cliente.post('/api/auth/login', json={'email': email, 'senha': senha})
+        assert resposta.status_code == 200, resposta.get_json()
+        return {'Authorization': f"Bearer {resposta.get_json()['token']}"}
+    return entrar
+
+@pytest.fixture
+def admin(login):
+    """Cabeçalhos de autenticação do administrador criado em criar_dados_iniciais"""
+    return login(ADMIN['email'], ADMIN['senha'])
+
+@pytest.fixture
+def api(cliente, admin):
+    return Api(cliente, admin)
+
+@pytest.fixture
+def gerar_cpf():
+    """CPF válido a partir de um número de até 9 dígitos: gerar_cpf(1234567) → '001.234.567-..'"""
+    return cpf_valido
+
+@pytest.fixture
+def contar_selects(app):
+    """Conta os SELECTs executados no banco enquanto o bloco roda: with contar_selects() as comandos"""
+    @contextmanager
+    def contar():
+        with app.app_context():
+            motor = VidaPlus.db.engine
+        comandos = []
+        def registrar(conexao, cursor, sql, parametros, contexto, executemany):
+            if sql.lstrip().upper().startswith('SELECT'):
+                comandos.append(sql)
+        event.listen(motor, 'before_cursor_execute', registrar)
+        try:
+            yield comandos
+        finally:
+            event.remove(motor, 'before_cursor_execute', registrar)
+    return contar
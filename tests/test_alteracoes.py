@@ -0,0 +1,49 @@
+"""Feed de alterações (/api/changes): leitura incremental por seq, retenção e margem fora do SQLite"""
+
+import VidaPlus
+
+def test_feed_incremental_por_seq(cliente, admin, api):
+    paciente = api.paciente()
+    cliente.put(f"/api/pacientes/{paciente['id']}", json={'telefone': '(11) 98888-7777'}, headers=admin)
+    
+    pagina = cliente.get('/api/changes?since=0&limit=1', headers=admin).get_json()
+    assert pagina['tem_mais'] is True
+    eventos = pagina['alteracoes']
+    while pagina['tem_mais']:
+        pagina = cliente.get(f"/api/changes?since={pagina['proximo_since']}&limit=1", headers=admin).get_json()
+        eventos += pagina['alteracoes']
+    
+    assert [(evento['tabela'], evento['registro_id'], evento['operacao']) for evento in eventos] == [
+        ('pacientes', paciente['id'], 'INSERT'), ('pacientes', paciente['id'], 'UPDATE')
+    ]
+    assert [evento['seq'] for evento in eventos] == sorted(evento['seq'] for evento in eventos)
+    vazio = cliente.get(f"/api/changes?since={pagina['proximo_since']}", headers=admin).get_json()
+    assert (vazio['alteracoes'], vazio['proximo_since']) == ([], pagina['proximo_since'])
+
+def test_margem_quando_seq_nao_segue_a_ordem_dos_commits(app, cliente, admin, api, monkeypatch):
+    monkeypatch.setattr(VidaPlus, 'seq_em_ordem_de_commit', lambda: False)
+    antigo = api.paciente()
+    with app.app_context():
+        VidaPlus.Alteracao.query.update({'data_hora': VidaPlus.datetime.utcnow() - VidaPlus.timedelta(minutes=1)})
+        VidaPlus.db.session.commit()
+    api.paciente(nome='Bruno Lima')
+    
+    pagina = cliente.get('/api/changes?since=0', headers=admin).get_json()
+    assert [evento['registro_id'] for evento in pagina['alteracoes']] == [antigo['id']]
+    assert pagina['tem_mais'] is False
+    assert cliente.get(f"/api/changes?since={pagina['proximo_since']}", headers=admin).get_json()['alteracoes'] == []
+
+def test_erros_retencao_e_acesso(app, cliente, admin, api, login):
+    paciente = api.paciente()
+    api.paciente(nome='Bruno Lima')
+    assert cliente.get('/api/changes?since=-1', headers=admin).status_code == 400
+    assert cliente.get('/api/changes', headers=login(paciente['email'], 'Paciente123!')).status_code == 403
+    
+    with app.app_context():
+        primeira = VidaPlus.db.session.query(VidaPlus.func.min(VidaPlus.Alteracao.id)).scalar()
+        VidaPlus.Alteracao.query.filter_by(id=primeira).delete()
+        VidaPlus.db.session.commit()
+    resposta = cliente.get('/api/changes?since=0', headers=admin)
+    assert resposta.status_code == 410
+    assert resposta.get_json()['menor_since'] == primeira
+    assert cliente.get(f'/api/changes?since={primeira}', headers=admin).status_code == 200
@@ -0,0 +1,76 @@
+"""Auditoria das atualizações: apenas os campos alterados, com valores anteriores e novos"""
+
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import VidaPlus
+
+@contextmanager
+def contar_commits():
+    commits = []
+    registrar = lambda sessao: commits.append(sessao)
+    event.listen(Session, 'after_commit', registrar)
+    try:
+        yield commits
+    finally:
+        event.remove(Session, 'after_commit', registrar)
+
+def atualizacoes(cliente, admin, tabela, registro_id):
+    registros = cliente.get(f'/api/auditoria/?tabela={tabela}&registro_id={registro_id}&acao=UPDATE', headers=admin).get_json()['registros']
+    return [(registro['dados_anteriores'], registro['dados_novos']) for registro in registros]
+
+def test_auditoria_grava_somente_a_diferenca(cliente, admin, api):
+    paciente = api.paciente(nome='Ana Souza', telefone='(11) 97777-0000')
+    profissional = api.profissional()
+    consulta = api.consulta(paciente['id'], profissional['id'])
+    prescricao = api.prescricao(paciente['id'], profissional['id'])
+    
+    resposta = cliente.put(f"/api/pacientes/{paciente['id']}", json={'nome': 'Ana Souza', 'telefone': '(11) 98888-7777'}, headers=admin)
+    assert resposta.status_code == 200
+    assert atualizacoes(cliente, admin, 'pacientes', paciente['id']) == [
+        ({'telefone': '(11) 97777-0000'}, {'telefone': '(11) 98888-7777'})
+    ]
+    
+    cliente.put(f"/api/consultas/{consulta['id']}", json={'tipo': 'presencial', 'status': 'realizada'}, headers=admin)
+    assert atualizacoes(cliente, admin, 'consultas', consulta['id']) == [({'status': 'agendada'}, {'status': 'realizada'})]
+    
+    cliente.put(f"/api/receitas/{prescricao['id']}", json={'observacoes': 'Após as refeições'}, headers=admin)
+    assert atualizacoes(cliente, admin, 'prescricoes', prescricao['id']) == [({'observacoes': None}, {'observacoes': 'Após as refeições'})]
+
+def test_atualizacao_sem_mudancas_nao_grava_nada(cliente, admin, api):
+    paciente = api.paciente(nome='Ana Souza')
+    profissional = api.profissional(telefone='(11) 3333-4444')
+    consulta = api.consulta(paciente['id'], profissional['id'])
+    prescricao = api.prescricao(paciente['id'], profissional['id'])
+    seq = cliente.get('/api/changes?since=0&limit=1000', headers=admin).get_json()['proximo_since']
+    
+    with contar_commits() as commits:
+        for url, dados in (
+            (f"/api/pacientes/{paciente['id']}", {'nome': 'Ana Souza'}),
+            (f"/api/profissionais/{profissional['id']}", {'telefone': '(11) 3333-4444'}),
+            (f"/api/consultas/{consulta['id']}", {'status': 'agendada', 'tipo': 'presencial'}),
+            (f"/api/receitas/{prescricao['id']}", {'dosagem': '1 comprimido a cada 8 horas', 'duracao': '7 dias'}),
+        ):
+            assert cliente.put(url, json=dados, headers=admin).status_code == 200
+    assert commits == []
+    
+    for tabela, registro_id in (('pacientes', paciente['id']), ('profissionais', profissional['id']),
+                                ('consultas', consulta['id']), ('prescricoes', prescricao['id'])):
+        assert atualizacoes(cliente, admin, tabela, registro_id) == []
+    assert cliente.get(f'/api/changes?since={seq}', headers=admin).get_json()['alteracoes'] == []
+
+def test_atualizacao_invalida_nao_grava_auditoria(app, cliente, admin, api):
+    paciente = api.paciente()
+    profissional = api.profissional()
+    consulta = api.consulta(paciente['id'], profissional['id'])
+    
+    assert cliente.put(f"/api/consultas/{consulta['id']}", json={'observacoes': 'x', 'status': 'perdida'}, headers=admin).status_code == 400
+    assert cliente.put(f"/api/pacientes/{paciente['id']}", json={}, headers=admin).status_code == 400
+    assert cliente.put('/api/pacientes/9999', json={'nome': 'Outro'}, headers=admin).status_code == 404
+    assert atualizacoes(cliente, admin, 'consultas', consulta['id']) == []
+    assert atualizacoes(cliente, admin, 'pacientes', paciente['id']) == []
+    
+    with app.app_context():
+        assert VidaPlus.db.session.get(VidaPlus.Consulta, consulta['id']).observacoes is None
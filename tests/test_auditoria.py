@@ -0,0 +1,124 @@
+"""Auditoria: segmentos mensais, consulta com filtros e paginação, payloads comprimidos na coluna de texto"""
+
+import gzip
+import json
+import os
+from datetime import datetime
+
+import VidaPlus
+
+def test_payload_comprimido_em_texto_e_lido_pela_api(app, cliente, admin, api):
+    paciente = api.paciente(nome='Ana Souza')
+    
+    with app.app_context():
+        segmento = VidaPlus.tabela_segmento_auditoria(VidaPlus.nome_segmento_auditoria(VidaPlus.datetime.utcnow()))
+        gravado = VidaPlus.db.session.execute(
+            VidaPlus.db.select(segmento.c.dados_novos).where(segmento.c.tabela == 'pacientes', segmento.c.registro_id == paciente['id'])
+        ).scalar()
+    assert isinstance(gravado, str)
+    assert gravado.startswith(VidaPlus.PREFIXO_PAYLOAD_COMPRIMIDO)
+    
+    resposta = cliente.get(f"/api/auditoria/?tabela=pacientes&registro_id={paciente['id']}", headers=admin)
+    assert resposta.status_code == 200
+    registros = resposta.get_json()['registros']
+    assert [registro['acao'] for registro in registros] == ['CREATE']
+    assert registros[0]['dados_novos']['nome'] == 'Ana Souza'
+
+def test_payloads_gravados_antes_da_compressao_continuam_legiveis(app, cliente, admin):
+    comprimido = VidaPlus.comprimir_payload(json.dumps({'status': 'cancelada'}))
+    blob = VidaPlus.base64.b64decode(comprimido[len(VidaPlus.PREFIXO_PAYLOAD_COMPRIMIDO):])
+    with app.app_context():
+        agora = VidaPlus.datetime.utcnow()
+        segmento = VidaPlus.garantir_segmento_auditoria(VidaPlus.nome_segmento_auditoria(agora))
+        # Inserção sem o TypeDecorator, como os valores gravados por versões anteriores
+        VidaPlus.db.session.execute(VidaPlus.db.text(
+            f'INSERT INTO {segmento.name} (id, usuario_id, acao, tabela, registro_id, dados_anteriores, dados_novos, data_hora) '
+            'VALUES (:id, 1, :acao, :tabela, 1, :anteriores, :novos, :data_hora)'
+        ), [
+            {'id': VidaPlus.proximo_id_auditoria(), 'acao': 'UPDATE', 'tabela': 'legado', 'anteriores': '{"status": "agendada"}',
+             'novos': blob, 'data_hora': agora},
+            {'id': VidaPlus.proximo_id_auditoria(), 'acao': 'UPDATE', 'tabela': 'legado', 'anteriores': None,
+             'novos': 'texto livre', 'data_hora': agora},
+        ])
+        VidaPlus.db.session.commit()
+    
+    registros = cliente.get('/api/auditoria/?tabela=legado', headers=admin).get_json()['registros']
+    assert [(registro['dados_anteriores'], registro['dados_novos']) for registro in registros] == [
+        (None, 'texto livre'), ({'status': 'agendada'}, {'status': 'cancelada'})
+    ]
+
+def test_filtros_paginacao_e_erros(cliente, admin, api, login):
+    paciente = api.paciente()
+    api.paciente(nome='Bruno Lima')
+    
+    pagina = cliente.get('/api/auditoria/?tabela=pacientes&acao=create&limite=1', headers=admin).get_json()
+    assert len(pagina['registros']) == 1
+    seguinte = cliente.get(f"/api/auditoria/?tabela=pacientes&acao=create&limite=1&cursor={pagina['proximo_cursor']}",
+                           headers=admin).get_json()
+    assert seguinte['registros'][0]['id'] < pagina['registros'][0]['id']
+    assert seguinte['proximo_cursor'] is None
+    
+    assert cliente.get('/api/auditoria/?data_inicio=2000-01-01&data_fim=2000-01-31', headers=admin).get_json()['registros'] == []
+    assert cliente.get('/api/auditoria/?registro_id=1', headers=admin).status_code == 400
+    assert cliente.get('/api/auditoria/?cursor=abc', headers=admin).status_code == 400
+    assert cliente.get('/api/auditoria/?data_inicio=ontem', headers=admin).status_code == 400
+    assert cliente.get('/api/auditoria/', headers=login(paciente['email'], 'Paciente123!')).status_code == 403
+
+def nomes_dos_segmentos():
+    return [segmento.name for segmento in VidaPlus.listar_segmentos_auditoria()]
+
+def test_legado_migrado_para_o_segmento_do_mes_sem_reutilizar_ids(app, cliente, admin, api):
+    with app.app_context():
+        VidaPlus.db.session.add(VidaPlus.Auditoria(
+            id=500, usuario_id=1, acao='UPDATE', tabela='legado', registro_id=7,
+            dados_novos='{"nome": "Ana"}', data_hora=datetime(2024, 3, 10, 12)
+        ))
+        VidaPlus.db.session.commit()
+        VidaPlus.migrar_auditoria_para_segmentos()
+        
+        assert VidaPlus.Auditoria.query.count() == 0
+        assert [segmento.name for segmento in VidaPlus.segmentos_auditoria_no_intervalo(
+            datetime(2024, 3, 1), datetime(2024, 4, 1)
+        )] == ['auditoria_202403']
+    
+    registro, = cliente.get('/api/auditoria/?data_inicio=2024-03-01&data_fim=2024-03-31', headers=admin).get_json()['registros']
+    assert (registro['id'], registro['tabela'], registro['dados_novos']) == (500, 'legado', {'nome': 'Ana'})
+    
+    paciente = api.paciente()
+    criado, = cliente.get(f"/api/auditoria/?tabela=pacientes&registro_id={paciente['id']}", headers=admin).get_json()['registros']
+    assert criado['id'] > 500
+
+def test_retencao_descarta_e_arquiva_segmentos_inteiros(app, cliente, tmp_path):
+    with app.app_context():
+        antigo = VidaPlus.garantir_segmento_auditoria('auditoria_202001')
+        atual = VidaPlus.garantir_segmento_auditoria(VidaPlus.nome_segmento_auditoria(datetime.utcnow()))
+        VidaPlus.db.session.execute(antigo.insert().values(
+            id=VidaPlus.proximo_id_auditoria(), usuario_id=1, acao='DELETE', tabela='consultas', registro_id=3,
+            dados_anteriores='{"status": "agendada"}', data_hora=datetime(2020, 1, 15)
+        ))
+        VidaPlus.db.session.commit()
+        ultimo_id = VidaPlus.ultimo_id_auditoria()
+        
+        removidas = VidaPlus.descartar_segmentos_auditoria(datetime(2020, 2, 1), str(tmp_path))
+        segmentos = nomes_dos_segmentos()
+        # O contador não recua com o descarte
+        assert VidaPlus.proximo_id_auditoria() == ultimo_id + 1
+        VidaPlus.db.session.rollback()
+    
+    assert removidas == 1
+    assert 'auditoria_202001' not in segmentos
+    assert atual.name in segmentos
+    with gzip.open(os.path.join(tmp_path, 'auditoria_202001.jsonl.gz'), 'rt', encoding='utf-8') as arquivo:
+        arquivado, = [json.loads(linha) for linha in arquivo]
+    assert (arquivado['acao'], arquivado['dados_anteriores']) == ('DELETE', '{"status": "agendada"}')
+
+def test_recriar_banco_remove_os_segmentos(app, cliente):
+    with app.app_context():
+        VidaPlus.garantir_segmento_auditoria('auditoria_202001')
+    assert cliente.post('/api/recreate-db').status_code == 200
+    
+    with app.app_context():
+        assert 'auditoria_202001' not in nomes_dos_segmentos()
+        # Sem o cache do roteador, o segmento volta a ser criado quando necessário
+        VidaPlus.garantir_segmento_auditoria('auditoria_202001')
+        assert 'auditoria_202001' in nomes_dos_segmentos()
@@ -0,0 +1,48 @@
+"""Autocompletar nomes de pacientes a partir do índice ordenado em memória"""
+
+import VidaPlus
+
+def sugestoes(cliente, cabecalhos, q, limite=10):
+    resposta = cliente.get(f'/api/pacientes/autocomplete?q={q}&limite={limite}', headers=cabecalhos)
+    assert resposta.status_code == 200, resposta.get_json()
+    return [paciente['nome'] for paciente in resposta.get_json()['pacientes']]
+
+def test_indice_por_prefixo_de_nome_e_sobrenome():
+    indice = VidaPlus.IndiceAutocomplete()
+    indice.reconstruir([(1, 'João da Silva'), (2, 'Joana Silveira Silva'), (3, 'Marcos Prado')])
+    
+    assert [item['id'] for item in indice.buscar('jo')] == [2, 1]
+    assert [item['id'] for item in indice.buscar('SILV')] == [1, 2]
+    assert [item['id'] for item in indice.buscar('joão d')] == [1]
+    assert indice.buscar('silv', limite=1) == [{'id': 1, 'nome': 'João da Silva'}]
+    assert indice.buscar('   ') == []
+    
+    indice.atualizar(3, 'Marcos Joaquim')
+    indice.remover(1)
+    assert [item['id'] for item in indice.buscar('jo')] == [2, 3]
+    assert indice.buscar('prado') == []
+
+def test_endpoint_acompanha_cadastro_alteracao_e_exclusao(app, cliente, admin, api):
+    joao = api.paciente(nome='João da Silva')
+    api.paciente(nome='Joana Prado')
+    assert sugestoes(cliente, admin, 'joa') == ['Joana Prado', 'João da Silva']
+    assert sugestoes(cliente, admin, 'joa', limite=1) == ['Joana Prado']
+    
+    cliente.put(f"/api/pacientes/{joao['id']}", json={'nome': 'Pedro da Silva'}, headers=admin)
+    assert sugestoes(cliente, admin, 'joa') == ['Joana Prado']
+    assert sugestoes(cliente, admin, 'silva') == ['Pedro da Silva']
+    
+    cliente.delete(f"/api/pacientes/{joao['id']}", headers=admin)
+    assert sugestoes(cliente, admin, 'pedro') == []
+    
+    # Na inicialização o índice é reconstruído do banco, sem os excluídos
+    VidaPlus.autocomplete_pacientes.reconstruir([])
+    with app.app_context():
+        VidaPlus.preparar_banco()
+    assert sugestoes(cliente, admin, 'j') == ['Joana Prado']
+
+def test_parametros_invalidos(cliente, admin):
+    assert cliente.get('/api/pacientes/autocomplete', headers=admin).status_code == 400
+    assert cliente.get('/api/pacientes/autocomplete?q=%20%20', headers=admin).status_code == 400
+    assert cliente.get('/api/pacientes/autocomplete?q=jo&limite=dez', headers=admin).status_code == 400
+    assert cliente.get('/api/pacientes/autocomplete?q=jo').status_code == 401
@@ -0,0 +1,52 @@
+"""Busca textual de pacientes e profissionais: índice FTS5 e volta ao LIKE sem ele"""
+
+import pytest
+
+import VidaPlus
+
+def nomes(resposta, chave):
+    assert resposta.status_code == 200, resposta.get_json()
+    return [registro['nome'] for registro in resposta.get_json()[chave]]
+
+@pytest.fixture
+def sem_fts(monkeypatch):
+    monkeypatch.setitem(VidaPlus.busca_textual, 'disponivel', False)
+
+def test_busca_fts_ignora_acentos_e_acompanha_alteracoes(cliente, admin, api):
+    assert VidaPlus.busca_textual['disponivel'] is True
+    joao = api.paciente(nome='João da Silva', plano_saude='Unimed')
+    api.paciente(nome='Joana Prado', plano_saude='Amil')
+    api.paciente(nome='Marcos Silveira')
+    
+    assert nomes(cliente.get('/api/pacientes/?nome=joao', headers=admin), 'pacientes') == ['João da Silva']
+    assert nomes(cliente.get('/api/pacientes/?nome=jo', headers=admin), 'pacientes') == ['Joana Prado', 'João da Silva']
+    assert nomes(cliente.get('/api/pacientes/?nome=silv&plano_saude=unimed', headers=admin), 'pacientes') == ['João da Silva']
+    
+    # Os triggers mantêm o índice a cada alteração
+    cliente.put(f"/api/pacientes/{joao['id']}", json={'nome': 'João Batista'}, headers=admin)
+    assert nomes(cliente.get('/api/pacientes/?nome=batista', headers=admin), 'pacientes') == ['João Batista']
+    assert nomes(cliente.get('/api/pacientes/?nome=silva', headers=admin), 'pacientes') == []
+    
+    api.profissional(nome='Dra. Mônica Araújo', especialidade='Dermatologia')
+    assert nomes(cliente.get('/api/profissionais/?nome=monica&especialidade=derma', headers=admin), 'profissionais') == [
+        'Dra. Mônica Araújo'
+    ]
+
+def test_busca_sem_fts5_usa_like(cliente, admin, api, sem_fts):
+    api.paciente(nome='João da Silva', plano_saude='Unimed')
+    api.paciente(nome='Marcos Silveira', plano_saude='Amil')
+    api.profissional(nome='Dra. Mônica Araújo', especialidade='Dermatologia')
+    api.profissional(nome='Dr. Paulo Reis', especialidade='Cardiologia')
+    
+    # LIKE: trecho em qualquer posição da palavra, sem normalizar acentos
+    assert nomes(cliente.get('/api/pacientes/?nome=ilv', headers=admin), 'pacientes') == ['João da Silva', 'Marcos Silveira']
+    assert nomes(cliente.get('/api/pacientes/?nome=João&plano_saude=nim', headers=admin), 'pacientes') == ['João da Silva']
+    assert nomes(cliente.get('/api/pacientes/?nome=joao', headers=admin), 'pacientes') == []
+    assert nomes(cliente.get('/api/profissionais/?especialidade=cardio', headers=admin), 'profissionais') == ['Dr. Paulo Reis']
+    assert nomes(cliente.get('/api/profissionais/?nome=Mônica', headers=admin), 'profissionais') == ['Dra. Mônica Araújo']
+
+def test_termos_sem_palavras_nao_quebram_a_busca(cliente, admin, api):
+    api.paciente(nome='João da Silva')
+    assert nomes(cliente.get('/api/pacientes/?nome=%22*(', headers=admin), 'pacientes') == []
+    assert nomes(cliente.get('/api/pacientes/?nome=jo%C3%A3o%22%20OR%20x', headers=admin), 'pacientes') == []
+    assert nomes(cliente.get('/api/profissionais/?especialidade=--', headers=admin), 'profissionais') == []
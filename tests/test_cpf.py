@@ -0,0 +1,41 @@
+"""CPF numérico (pacientes.cpf_numero): unicidade e busca independentes da formatação"""
+
+import VidaPlus
+
+def test_cpf_com_zeros_a_esquerda_em_qualquer_formatacao(app, cliente, admin, api, gerar_cpf):
+    cpf = gerar_cpf(1234567)
+    assert cpf.startswith('001.234.567-')
+    paciente = api.paciente(cpf=cpf.replace('.', '').replace('-', ''))
+    assert paciente['cpf'] == cpf
+    
+    with app.app_context():
+        assert VidaPlus.db.session.get(VidaPlus.Paciente, paciente['id']).cpf_numero == int(cpf.replace('.', '').replace('-', ''))
+    for busca in (cpf, cpf[1:].replace('.', '').replace('-', ''), cpf.replace('.', ' ')):
+        encontrados = cliente.get(f'/api/pacientes/?cpf={busca}', headers=admin).get_json()['pacientes']
+        assert [encontrado['id'] for encontrado in encontrados] == [paciente['id']]
+
+def test_migracao_preenche_cpf_numero_de_bancos_antigos(app, api, gerar_cpf):
+    cpf = gerar_cpf(98765432)
+    paciente = api.paciente(cpf=cpf)
+    with app.app_context():
+        VidaPlus.db.session.execute(VidaPlus.Paciente.__table__.update().values(cpf_numero=None))
+        VidaPlus.db.session.commit()
+        VidaPlus.migrar_cpf_numerico()
+        assert VidaPlus.db.session.get(VidaPlus.Paciente, paciente['id']).cpf_numero == int(cpf.replace('.', '').replace('-', ''))
+
+def test_cpf_duplicado_invalido_ou_sem_digitos(cliente, admin, api, gerar_cpf):
+    cpf = gerar_cpf(123456789)
+    api.paciente(cpf=cpf)
+    resposta = cliente.post('/api/pacientes/', json={
+        'email': 'outro@teste.com', 'senha': 'Paciente123!', 'cpf': cpf.replace('.', '').replace('-', ''),
+        'nome': 'Outra Pessoa', 'data_nascimento': '1990-01-01', 'sexo': 'M'
+    }, headers=admin)
+    assert resposta.status_code == 409
+    
+    resposta = cliente.post('/api/pacientes/', json={
+        'email': 'invalido@teste.com', 'senha': 'Paciente123!', 'cpf': '123.456.789-00',
+        'nome': 'CPF Inválido', 'data_nascimento': '1990-01-01', 'sexo': 'M'
+    }, headers=admin)
+    assert resposta.status_code == 400
+    
+    assert cliente.get('/api/pacientes/?cpf=abc', headers=admin).get_json()['pacientes'] == []
@@ -0,0 +1,73 @@
+"""Exclusão física em conjunto e exclusão lógica de pacientes e profissionais (?modo=)"""
+
+import VidaPlus
+
+def test_exclusao_logica_oculta_cadastro_da_busca_em_lote(cliente, admin, api):
+    excluido = api.paciente(nome='Ana Souza')
+    ativo = api.paciente(nome='Bruno Lima')
+    
+    resposta = cliente.delete(f"/api/pacientes/{excluido['id']}?modo=logica", headers=admin)
+    assert resposta.status_code == 200
+    
+    lote = cliente.get(f"/api/pacientes/?ids={excluido['id']},{ativo['id']}", headers=admin).get_json()
+    assert [paciente['id'] for paciente in lote['pacientes']] == [ativo['id']]
+    assert lote['nao_encontrados'] == [excluido['id']]
+    assert cliente.get(f"/api/pacientes/{excluido['id']}", headers=admin).status_code == 404
+    listagem = cliente.get('/api/pacientes/', headers=admin).get_json()
+    assert excluido['id'] not in [paciente['id'] for paciente in listagem['pacientes']]
+
+def test_busca_em_lote_ignora_profissional_excluido_ja_carregado_na_sessao(app, cliente, admin, api):
+    profissional = api.profissional()
+    assert cliente.delete(f"/api/profissionais/{profissional['id']}?modo=logica", headers=admin).status_code == 200
+    
+    with app.app_context():
+        # Com o objeto no identity map, a busca em lote não vai ao banco para ele
+        carregado = VidaPlus.db.session.get(VidaPlus.Profissional, profissional['id'])
+        assert carregado.excluido_em is not None
+        lote = VidaPlus.buscar_em_lote(VidaPlus.Profissional, [profissional['id']])
+    assert lote == {'encontrados': [], 'nao_encontrados': [profissional['id']]}
+    
+    resposta = cliente.get(f"/api/profissionais/?ids={profissional['id']}", headers=admin).get_json()
+    assert resposta['profissionais'] == []
+    assert resposta['nao_encontrados'] == [profissional['id']]
+
+def test_feed_rotula_cada_registro_do_flush_com_exclusao_logica(app, cliente, admin, api):
+    pacientes = [api.paciente(nome=f'Paciente {numero}')['id'] for numero in range(4)]
+    seq = cliente.get('/api/changes?since=0&limit=1000', headers=admin).get_json()['proximo_since']
+    
+    with app.app_context():
+        excluido, *renomeados = [VidaPlus.db.session.get(VidaPlus.Paciente, paciente_id) for paciente_id in pacientes]
+        excluido.excluido_em = VidaPlus.datetime.utcnow()
+        for paciente in renomeados:
+            paciente.nome += ' Lima'
+        VidaPlus.db.session.commit()
+    
+    eventos = cliente.get(f'/api/changes?since={seq}', headers=admin).get_json()['alteracoes']
+    assert sorted((evento['registro_id'], evento['operacao']) for evento in eventos) == [
+        (pacientes[0], 'DELETE'), (pacientes[1], 'UPDATE'), (pacientes[2], 'UPDATE'), (pacientes[3], 'UPDATE')
+    ]
+
+def test_exclusao_fisica_recusada_com_historico_e_logica_preserva_consultas(cliente, admin, api):
+    paciente = api.paciente()
+    profissional = api.profissional()
+    consulta = api.consulta(paciente['id'], profissional['id'])
+    
+    resposta = cliente.delete(f"/api/pacientes/{paciente['id']}", headers=admin)
+    assert resposta.status_code == 400
+    assert 'consultas associadas' in resposta.get_json()['erro']
+    
+    assert cliente.delete(f"/api/pacientes/{paciente['id']}?modo=logica", headers=admin).status_code == 200
+    assert cliente.get(f"/api/consultas/{consulta['id']}", headers=admin).status_code == 200
+
+def test_exclusao_fisica_sem_historico_remove_cadastro_e_usuario(cliente, admin, api):
+    paciente = api.paciente()
+    assert cliente.delete(f"/api/pacientes/{paciente['id']}", headers=admin).status_code == 200
+    assert cliente.get(f"/api/pacientes/{paciente['id']}", headers=admin).status_code == 404
+    login = cliente.post('/api/auth/login', json={'email': paciente['email'], 'senha': 'Paciente123!'})
+    assert login.status_code == 401
+
+def test_modo_de_exclusao_invalido(cliente, admin, api):
+    paciente = api.paciente()
+    resposta = cliente.delete(f"/api/pacientes/{paciente['id']}?modo=parcial", headers=admin)
+    assert resposta.status_code == 400
+    assert cliente.get(f"/api/pacientes/{paciente['id']}", headers=admin).status_code == 200
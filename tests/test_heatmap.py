@@ -0,0 +1,37 @@
+"""Mapas de calor da agenda (hora × dia da semana) calculados com NumPy"""
+
+import VidaPlus
+
+def test_heatmap_por_unidade_e_especialidade(cliente, admin, api):
+    paciente = api.paciente()
+    carlos = api.profissional(nome='Dr. Carlos Mendes', especialidade='Cardiologia')
+    paulo = api.profissional(nome='Dr. Paulo Reis', especialidade='Dermatologia')
+    # 03/06/2030 é uma segunda-feira
+    api.consulta(paciente['id'], carlos['id'], data_hora='2030-06-03T09:00:00')
+    api.consulta(paciente['id'], paulo['id'], data_hora='2030-06-03T09:30:00')
+    api.consulta(paciente['id'], carlos['id'], data_hora='2030-06-04T14:30:00')
+    cancelada = api.consulta(paciente['id'], carlos['id'], data_hora='2030-06-05T08:00:00')
+    cliente.put(f"/api/consultas/{cancelada['id']}", json={'status': 'cancelada'}, headers=admin)
+    intervalo = 'data_inicio=2030-06-01&data_fim=2030-06-14'
+    
+    resposta = cliente.get(f'/api/relatorios/heatmap?{intervalo}', headers=admin)
+    assert resposta.status_code == 200, resposta.get_json()
+    grupo, = resposta.get_json()['grupos']
+    assert (grupo['grupo_id'], grupo['total']) == (1, 3)
+    celulas = {(dia, hora): total for dia, linha in enumerate(grupo['heatmap']) for hora, total in enumerate(linha) if total}
+    assert celulas == {(0, 9): 2, (1, 14): 1}
+    assert grupo['media_semanal'][0][9] == 1.0
+    assert grupo['percentis_por_hora'] == {'p50': 1.5, 'p90': 1.9, 'p99': 1.99, 'max': 2}
+    assert grupo['percentis_profissional_dia']['max'] == 1
+    
+    grupos = cliente.get(f'/api/relatorios/heatmap?agrupar_por=especialidade&{intervalo}', headers=admin).get_json()['grupos']
+    assert [(grupo['grupo'], grupo['total']) for grupo in grupos] == [('Cardiologia', 2), ('Dermatologia', 1)]
+    
+    vazio = cliente.get('/api/relatorios/heatmap?unidade_id=999&' + intervalo, headers=admin).get_json()
+    assert vazio['grupos'] == []
+
+def test_parametros_invalidos_e_numpy_ausente(cliente, admin, monkeypatch):
+    assert cliente.get('/api/relatorios/heatmap?agrupar_por=profissional', headers=admin).status_code == 400
+    assert cliente.get('/api/relatorios/heatmap?data_inicio=junho', headers=admin).status_code == 400
+    monkeypatch.setattr(VidaPlus, 'np', None)
+    assert cliente.get('/api/relatorios/heatmap', headers=admin).status_code == 503
@@ -0,0 +1,99 @@
+"""Idempotency-Key nos endpoints de criação: repetição, conflito de corpo, espera e chaves inválidas"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import VidaPlus
+
+def total_de_consultas(cliente, admin, paciente_id):
+    return cliente.get(f'/api/consultas/?paciente_id={paciente_id}', headers=admin).get_json()['paginacao']['total_registros']
+
+def reservar(app, chave, corpo, status='processando', data_criacao=None):
+    """Grava a reserva da chave como se outra requisição do administrador a tivesse feito"""
+    with app.app_context():
+        registro = VidaPlus.RespostaIdempotente(
+            usuario_id=VidaPlus.Usuario.query.filter_by(tipo='admin').first().id,
+            chave=chave,
+            impressao=hashlib.sha256(b'POST /api/consultas/\n' + corpo).hexdigest(),
+            status=status,
+            data_criacao=data_criacao or datetime.utcnow(),
+            expira_em=datetime.utcnow() + timedelta(hours=1)
+        )
+        VidaPlus.db.session.add(registro)
+        VidaPlus.db.session.commit()
+        return registro.id
+
+def test_repeticao_devolve_a_resposta_gravada_sem_criar_outra(cliente, admin, api):
+    paciente = api.paciente()
+    profissional = api.profissional()
+    dados = {'paciente_id': paciente['id'], 'profissional_id': profissional['id'], 'unidade_id': 1,
+             'data_hora': '2030-01-10T10:00:00', 'tipo': 'presencial'}
+    cabecalhos = {**admin, 'Idempotency-Key': 'consulta-1'}
+    
+    primeira = cliente.post('/api/consultas/', json=dados, headers=cabecalhos)
+    repetida = cliente.post('/api/consultas/', json=dados, headers=cabecalhos)
+    assert primeira.status_code == repetida.status_code == 201
+    assert repetida.get_json() == primeira.get_json()
+    assert 'Idempotent-Replayed' not in primeira.headers
+    assert repetida.headers['Idempotent-Replayed'] == 'true'
+    assert total_de_consultas(cliente, admin, paciente['id']) == 1
+    
+    # Outra chave é outra criação; respostas 4xx também são gravadas e repetidas
+    assert cliente.post('/api/consultas/', json=dados, headers={**admin, 'Idempotency-Key': 'consulta-2'}).status_code == 201
+    assert total_de_consultas(cliente, admin, paciente['id']) == 2
+    invalida = {**dados, 'data_hora': '2020-01-10T10:00:00'}
+    for _ in range(2):
+        resposta = cliente.post('/api/consultas/', json=invalida, headers={**admin, 'Idempotency-Key': 'consulta-3'})
+        assert resposta.status_code == 400
+    assert resposta.headers['Idempotent-Replayed'] == 'true'
+
+def test_duplicata_concorrente_aguarda_a_primeira(app, cliente, admin):
+    corpo = json.dumps({'paciente_id': 1}).encode()
+    reserva = reservar(app, 'em-andamento', corpo)
+    
+    def concluir():
+        time.sleep(0.2)
+        with app.app_context():
+            VidaPlus.RespostaIdempotente.query.filter_by(id=reserva).update({
+                'status': 'concluida', 'codigo_http': 201, 'corpo': '{"mensagem": "Consulta agendada"}',
+                'tipo_conteudo': 'application/json'
+            })
+            VidaPlus.db.session.commit()
+    
+    concluinte = threading.Thread(target=concluir)
+    concluinte.start()
+    resposta = cliente.post('/api/consultas/', data=corpo, content_type='application/json',
+                            headers={**admin, 'Idempotency-Key': 'em-andamento'})
+    concluinte.join()
+    assert resposta.status_code == 201
+    assert resposta.get_json() == {'mensagem': 'Consulta agendada'}
+    assert resposta.headers['Idempotent-Replayed'] == 'true'
+
+def test_chave_reutilizada_invalida_ou_ainda_em_processamento(app, cliente, admin, api, monkeypatch):
+    paciente = api.paciente()
+    profissional = api.profissional()
+    dados = {'paciente_id': paciente['id'], 'profissional_id': profissional['id'], 'unidade_id': 1,
+             'data_hora': '2030-01-10T10:00:00', 'tipo': 'presencial'}
+    cabecalhos = {**admin, 'Idempotency-Key': 'consulta-1'}
+    assert cliente.post('/api/consultas/', json=dados, headers=cabecalhos).status_code == 201
+    
+    outra = cliente.post('/api/consultas/', json={**dados, 'tipo': 'online'}, headers=cabecalhos)
+    assert outra.status_code == 422
+    assert cliente.post('/api/consultas/', json=dados, headers={**admin, 'Idempotency-Key': ''}).status_code == 400
+    assert cliente.post('/api/consultas/', json=dados, headers={**admin, 'Idempotency-Key': 'x' * 256}).status_code == 400
+    assert total_de_consultas(cliente, admin, paciente['id']) == 1
+    
+    # Reserva que não termina dentro da espera: 409; reserva abandonada é liberada e a requisição executa
+    monkeypatch.setitem(app.config, 'IDEMPOTENCIA_ESPERA_SEGUNDOS', 0)
+    corpo = json.dumps(dados).encode()
+    reservar(app, 'travada', corpo)
+    assert cliente.post('/api/consultas/', data=corpo, content_type='application/json',
+                        headers={**admin, 'Idempotency-Key': 'travada'}).status_code == 409
+    abandonada = datetime.utcnow() - timedelta(seconds=app.config['IDEMPOTENCIA_ABANDONO_SEGUNDOS'] + 1)
+    reservar(app, 'abandonada', corpo, data_criacao=abandonada)
+    assert cliente.post('/api/consultas/', data=corpo, content_type='application/json',
+                        headers={**admin, 'Idempotency-Key': 'abandonada'}).status_code == 201
+    assert total_de_consultas(cliente, admin, paciente['id']) == 2
@@ -0,0 +1,45 @@
+"""Side-loading de recursos relacionados (?include=) em consultas e receitas"""
+
+def test_include_em_consultas_sem_repeticao_e_com_uma_consulta_por_tipo(cliente, admin, api, contar_selects):
+    paciente = api.paciente(nome='Ana Souza')
+    carlos = api.profissional(nome='Dr. Carlos Mendes')
+    beatriz = api.profissional(nome='Dra. Beatriz Costa')
+    for numero, profissional in enumerate((carlos, beatriz, carlos, beatriz)):
+        api.consulta(paciente['id'], profissional['id'], data_hora=f'2030-06-0{numero + 1}T10:00:00')
+    
+    resposta = cliente.get('/api/consultas/?include=paciente,profissional,unidade,paciente', headers=admin)
+    assert resposta.status_code == 200
+    incluidos = resposta.get_json()['incluidos']
+    assert [registro['id'] for registro in incluidos['pacientes']] == [paciente['id']]
+    assert [registro['id'] for registro in incluidos['profissionais']] == sorted([carlos['id'], beatriz['id']])
+    assert [registro['id'] for registro in incluidos['unidades']] == [1]
+    assert 'incluidos' not in cliente.get('/api/consultas/', headers=admin).get_json()
+    
+    # O número de SELECTs não depende da quantidade de consultas da página
+    def selects(per_page):
+        with contar_selects() as comandos:
+            assert cliente.get(f'/api/consultas/?include=paciente,profissional,unidade&per_page={per_page}',
+                               headers=admin).status_code == 200
+        return len(comandos)
+    assert selects(4) == selects(1)
+
+def test_include_no_detalhe_de_consulta_e_de_receita(cliente, admin, api):
+    paciente = api.paciente()
+    profissional = api.profissional()
+    consulta = api.consulta(paciente['id'], profissional['id'])
+    prescricao = api.prescricao(paciente['id'], profissional['id'])
+    
+    detalhe = cliente.get(f"/api/consultas/{consulta['id']}?include=profissional", headers=admin).get_json()
+    assert list(detalhe['incluidos']) == ['profissionais']
+    assert detalhe['incluidos']['profissionais'][0]['nome'] == profissional['nome']
+    
+    receita = cliente.get(f"/api/receitas/{prescricao['id']}?include=paciente", headers=admin).get_json()
+    assert receita['incluidos']['pacientes'][0]['id'] == paciente['id']
+    lista = cliente.get('/api/receitas/?include=paciente,profissional', headers=admin).get_json()
+    assert set(lista['incluidos']) == {'pacientes', 'profissionais'}
+
+def test_include_invalido_ou_registro_inexistente(cliente, admin, api):
+    prescricao = api.prescricao(api.paciente()['id'], api.profissional()['id'])
+    assert cliente.get('/api/consultas/?include=medicamento', headers=admin).status_code == 400
+    assert cliente.get(f"/api/receitas/{prescricao['id']}?include=unidade", headers=admin).status_code == 400
+    assert cliente.get('/api/consultas/999?include=paciente', headers=admin).status_code == 404
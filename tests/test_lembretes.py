@@ -0,0 +1,66 @@
+"""Lembretes de consulta: roda de tempo hierárquica, disparo em lote e lease entre processos"""
+
+from datetime import datetime, timedelta
+
+import VidaPlus
+
+def test_roda_dispara_cada_item_no_minuto_exato():
+    roda = VidaPlus.RodaTemporal(minuto_atual=1000, dias=3)
+    horarios = {'minutos': 1005, 'horas': 1000 + 3 * 60 + 7, 'dias': 1000 + 2 * 1440 + 11, 'cancelado': 1100}
+    for chave, minuto in horarios.items():
+        assert roda.agendar(chave, minuto)
+    assert roda.agendar('passado', 900)  # horário já passado: próximo minuto
+    assert not roda.agendar('alem_do_horizonte', 1000 + 4 * 1440)
+    roda.cancelar('cancelado')
+    assert len(roda) == 4
+    
+    disparos = {}
+    for minuto in range(1001, 1000 + 3 * 1440):
+        for chave in roda.avancar(minuto):
+            disparos[chave] = minuto
+    assert disparos == {'passado': 1001, 'minutos': 1005, 'horas': horarios['horas'], 'dias': horarios['dias']}
+    assert len(roda) == 0
+    
+    # Reagendar substitui o horário anterior
+    roda.agendar('x', roda.minuto + 10)
+    roda.agendar('x', roda.minuto + 2)
+    assert roda.avancar(roda.minuto + 2) == ['x']
+    assert roda.avancar(roda.minuto + 20) == []
+
+def test_lembrete_vencido_vira_notificacao_uma_unica_vez(app, cliente, admin, api, login):
+    paciente = api.paciente()
+    profissional = api.profissional(nome='Dra. Beatriz Costa')
+    # T-1h foi há 5 minutos (dentro da tolerância); T-24h já passou há muito e não é enviado
+    inicio = (datetime.utcnow() + timedelta(minutes=55)).replace(microsecond=0)
+    consulta = api.consulta(paciente['id'], profissional['id'], data_hora=inicio.isoformat())
+    cancelada = api.consulta(paciente['id'], profissional['id'], data_hora=(inicio + timedelta(minutes=1)).isoformat())
+    cliente.put(f"/api/consultas/{cancelada['id']}", json={'status': 'cancelada'}, headers=admin)
+    
+    agendador = VidaPlus.AgendadorLembretes()
+    with app.app_context():
+        assert agendador.sincronizar() == 1
+        assert set(agendador.roda.posicoes) == {(consulta['id'], '1h')}
+        chaves = [(consulta['id'], '1h'), (cancelada['id'], '1h')]
+        assert agendador.disparar(chaves) == 1
+        assert agendador.disparar(chaves) == 0
+    
+    titulos = [notificacao['mensagem'] for notificacao in cliente.get(
+        '/api/notificacoes/', headers=login(paciente['email'], 'Paciente123!')
+    ).get_json()['notificacoes'] if notificacao['titulo'] == 'Lembrete de consulta']
+    assert len(titulos) == 1
+    assert 'Dra. Beatriz Costa' in titulos[0] and 'em 1 hora' in titulos[0]
+
+def test_so_o_detentor_do_lease_mantem_a_roda(app, cliente):
+    agendador = VidaPlus.AgendadorLembretes()
+    with app.app_context():
+        assert VidaPlus.obter_lideranca('lembretes', 'outro-processo', 60)
+        assert not VidaPlus.obter_lideranca('lembretes', agendador.dono, 60)
+        assert agendador.executar() == 0
+        assert agendador.roda is None
+        
+        # Lease vencido: o próximo processo assume
+        VidaPlus.Lideranca.query.filter_by(nome='lembretes').update({'expira_em': datetime.utcnow() - timedelta(seconds=1)})
+        VidaPlus.db.session.commit()
+        assert agendador.executar() == 0
+        assert agendador.roda is not None
+        assert VidaPlus.db.session.get(VidaPlus.Lideranca, 'lembretes').dono == agendador.dono
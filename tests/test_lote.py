@@ -0,0 +1,48 @@
+"""Busca em lote por ids (?ids=1,2,3) nas listagens"""
+
+def test_lote_de_consultas_preserva_ordem_e_informa_nao_encontrados(cliente, admin, api):
+    profissional = api.profissional()
+    consultas = [api.consulta(api.paciente()['id'], profissional['id'], data_hora=f'2030-01-1{dia}T10:00:00')
+                 for dia in range(3)]
+    ids = [consultas[2]['id'], 999, consultas[0]['id']]
+    
+    resposta = cliente.get(f"/api/consultas/?ids={','.join(map(str, ids))}", headers=admin)
+    assert resposta.status_code == 200
+    dados = resposta.get_json()
+    assert [consulta['id'] for consulta in dados['consultas']] == [consultas[2]['id'], consultas[0]['id']]
+    assert dados['nao_encontrados'] == [999]
+    assert dados['consultas'][0]['unidade'] and dados['consultas'][0]['profissional'] == profissional['nome']
+
+def test_lote_nao_faz_uma_consulta_por_registro(cliente, admin, api, contar_selects):
+    profissional = api.profissional()
+    consultas, prescricoes = [], []
+    for numero in range(6):
+        paciente = api.paciente(nome=f'Paciente {numero}')
+        consultas.append(api.consulta(paciente['id'], profissional['id'], data_hora=f'2030-02-0{numero + 1}T10:00:00')['id'])
+        prescricoes.append(api.prescricao(paciente['id'], profissional['id'])['id'])
+    
+    def selects(caminho, ids):
+        with contar_selects() as comandos:
+            resposta = cliente.get(f"{caminho}?ids={','.join(map(str, ids))}", headers=admin)
+        assert resposta.status_code == 200
+        return len(comandos)
+    
+    for caminho, ids in (('/api/consultas/', consultas), ('/api/receitas/', prescricoes)):
+        assert selects(caminho, ids) == selects(caminho, ids[:1])
+
+def test_ids_invalidos(cliente, admin):
+    for valor in ('abc', '1,,x', ','.join(str(numero) for numero in range(1, 502))):
+        resposta = cliente.get(f'/api/consultas/?ids={valor}', headers=admin)
+        assert resposta.status_code == 400
+        assert 'erro' in resposta.get_json()
+
+def test_ids_com_digitos_nao_ascii_ou_grandes_demais(cliente, admin):
+    for url in ('/api/pacientes/', '/api/profissionais/', '/api/consultas/', '/api/receitas/'):
+        for valor in ('²', '1,٣', '99999999999999999999999'):
+            resposta = cliente.get(url, query_string={'ids': valor}, headers=admin)
+            assert resposta.status_code == 400, (url, valor)
+            assert resposta.get_json()['erro'].startswith('ID inválido')
+    
+    resposta = cliente.get('/api/pacientes/', query_string={'ids': '999999999999999999'}, headers=admin)
+    assert resposta.status_code == 200
+    assert resposta.get_json()['nao_encontrados'] == [999999999999999999]
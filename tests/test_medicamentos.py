@@ -0,0 +1,114 @@
+"""Catálogo de medicamentos: extração do texto livre, vínculos e busca reversa medicamento → pacientes"""
+
+import pytest
+
+import VidaPlus
+
+@pytest.mark.parametrize('texto, esperados', [
+    ('Amoxicilina 500mg; Losartana potássica 50 mg', {'amoxicilina', 'losartana potassica'}),
+    ('Dipirona gotas 500mg/ml + Clavulanato 125mg, 1 cp', {'dipirona', 'clavulanato'}),
+    ('Tomar 1 comprimido de dipirona', {'dipirona'}),
+    ('Tomar 1 comprimido de dipirona 500mg a cada 8 horas', {'dipirona'}),
+    ('Usar pomada de hidrocortisona 2x ao dia', {'hidrocortisona'}),
+    ('Carbonato de cálcio 500mg', {'carbonato de calcio'}),
+    ('Omeprazol 20mg em jejum', {'omeprazol'}),
+    ('Vitamina D', {'vitamina d'}),
+    ('Losartana; nega outros', {'losartana'}),
+])
+def test_extrai_nomes_sem_dose_posologia_e_forma(texto, esperados):
+    assert VidaPlus.extrair_medicamentos(texto) == esperados
+
+@pytest.mark.parametrize('texto', [
+    'Nenhum', 'Nenhuma', 'Não faz uso de medicamentos', 'Nao usa', 'Sem medicamentos', 'Sem uso contínuo', '-', '', None,
+])
+def test_textos_que_negam_o_uso_nao_viram_medicamento(texto):
+    assert VidaPlus.extrair_medicamentos(texto) == set()
+
+def test_paciente_sem_medicamentos_nao_entra_no_catalogo(cliente, admin, api):
+    api.paciente(medicamentos_uso='Nenhum')
+    api.paciente(medicamentos_uso='Não faz uso de medicamentos')
+    
+    catalogo = cliente.get('/api/medicamentos/', headers=admin).get_json()['medicamentos']
+    assert catalogo == []
+
+def test_busca_reversa_por_prescricao_e_uso_declarado(cliente, admin, api):
+    ana = api.paciente(nome='Ana Souza', medicamentos_uso='Losartana 50mg')
+    bruno = api.paciente(nome='Bruno Lima')
+    profissional = api.profissional()
+    api.prescricao(ana['id'], profissional['id'], medicamentos='Tomar 1 comprimido de dipirona')
+    prescricao = api.prescricao(bruno['id'], profissional['id'], medicamentos='Dipirona 500mg; Amoxicilina 875mg')
+    
+    catalogo = cliente.get('/api/medicamentos/?q=dip', headers=admin).get_json()['medicamentos']
+    assert [medicamento['nome'] for medicamento in catalogo] == ['dipirona']
+    dipirona = catalogo[0]['id']
+    
+    resposta = cliente.get(f'/api/medicamentos/{dipirona}/pacientes', headers=admin).get_json()
+    assert [(paciente['id'], paciente['origens']) for paciente in resposta['pacientes']] == [
+        (ana['id'], ['prescricao']), (bruno['id'], ['prescricao'])
+    ]
+    
+    pagina = cliente.get(f'/api/medicamentos/{dipirona}/pacientes?limite=1', headers=admin).get_json()
+    assert [paciente['id'] for paciente in pagina['pacientes']] == [ana['id']]
+    seguinte = cliente.get(f"/api/medicamentos/{dipirona}/pacientes?limite=1&cursor={pagina['proximo_cursor']}",
+                           headers=admin).get_json()
+    assert [paciente['id'] for paciente in seguinte['pacientes']] == [bruno['id']]
+    assert seguinte['proximo_cursor'] is None
+    
+    # A troca do texto da prescrição refaz os vínculos
+    cliente.put(f"/api/receitas/{prescricao['id']}", json={'medicamentos': 'Azitromicina 500mg'}, headers=admin)
+    resposta = cliente.get(f'/api/medicamentos/{dipirona}/pacientes', headers=admin).get_json()
+    assert [paciente['id'] for paciente in resposta['pacientes']] == [ana['id']]
+    
+    losartana = cliente.get('/api/medicamentos/?q=losartana', headers=admin).get_json()['medicamentos'][0]['id']
+    resposta = cliente.get(f'/api/medicamentos/{losartana}/pacientes?origem=uso', headers=admin).get_json()
+    assert [(paciente['id'], paciente['origens']) for paciente in resposta['pacientes']] == [(ana['id'], ['uso'])]
+
+def test_busca_reversa_so_prescricoes_vigentes(app, cliente, admin, api):
+    profissional = api.profissional()
+    continuo, vigente, vencido, encerrado = (api.paciente(nome=nome) for nome in ('Ana', 'Bruno', 'Carla', 'Davi'))
+    api.prescricao(continuo['id'], profissional['id'], duracao='uso contínuo')
+    api.prescricao(vigente['id'], profissional['id'], duracao='10 dias')
+    vencida = api.prescricao(vencido['id'], profissional['id'])
+    encerrada = api.prescricao(encerrado['id'], profissional['id'], duracao='uso contínuo')
+    cliente.put(f"/api/receitas/{encerrada['id']}", json={'status': 'encerrada'}, headers=admin)
+    with app.app_context():
+        VidaPlus.db.session.get(VidaPlus.Prescricao, vencida['id']).data_fim = VidaPlus.datetime.utcnow() - VidaPlus.timedelta(days=1)
+        VidaPlus.db.session.commit()
+    
+    dipirona = cliente.get('/api/medicamentos/?q=dipirona', headers=admin).get_json()['medicamentos'][0]['id']
+    resposta = cliente.get(f'/api/medicamentos/{dipirona}/pacientes?ativas=true', headers=admin).get_json()
+    assert [paciente['id'] for paciente in resposta['pacientes']] == [continuo['id'], vigente['id']]
+    
+    pagina = cliente.get(f"/api/medicamentos/{dipirona}/pacientes?ativas=true&cursor={continuo['id']}", headers=admin).get_json()
+    assert [paciente['id'] for paciente in pagina['pacientes']] == [vigente['id']]
+    assert pagina['pacientes'][0]['origens'] == ['prescricao']
+
+def test_busca_reversa_erros_e_acesso(cliente, admin, api, login):
+    paciente = api.paciente()
+    assert cliente.get('/api/medicamentos/999/pacientes', headers=admin).status_code == 404
+    
+    api.prescricao(paciente['id'], api.profissional()['id'])
+    dipirona = cliente.get('/api/medicamentos/?q=dipirona', headers=admin).get_json()['medicamentos'][0]['id']
+    assert cliente.get(f'/api/medicamentos/{dipirona}/pacientes?origem=outra', headers=admin).status_code == 400
+    assert cliente.get(f'/api/medicamentos/{dipirona}/pacientes?cursor=abc', headers=admin).status_code == 400
+    
+    cabecalhos_paciente = login(paciente['email'], 'Paciente123!')
+    assert cliente.get(f'/api/medicamentos/{dipirona}/pacientes', headers=cabecalhos_paciente).status_code == 403
+
+def test_nova_versao_das_regras_reindexa_vinculos_antigos(app, cliente, api):
+    paciente = api.paciente(medicamentos_uso='Losartana 50mg')
+    with app.app_context():
+        # Simula um banco indexado por regras anteriores, com um nome indevido no catálogo
+        medicamento = VidaPlus.Medicamento(nome='nenhum')
+        VidaPlus.db.session.add(medicamento)
+        VidaPlus.db.session.flush()
+        VidaPlus.db.session.add(VidaPlus.PacienteMedicamento(paciente_id=paciente['id'], medicamento_id=medicamento.id))
+        VidaPlus.db.session.get(VidaPlus.Sequencia, 'extracao_medicamentos').valor = 1
+        VidaPlus.db.session.commit()
+        
+        VidaPlus.preparar_banco()
+        
+        nomes = [nome for (nome,) in VidaPlus.db.session.query(VidaPlus.Medicamento.nome).order_by(VidaPlus.Medicamento.nome)]
+        versao = VidaPlus.db.session.get(VidaPlus.Sequencia, 'extracao_medicamentos').valor
+    assert nomes == ['losartana']
+    assert versao == VidaPlus.VERSAO_EXTRACAO_MEDICAMENTOS
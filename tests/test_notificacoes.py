@@ -0,0 +1,103 @@
+"""Notificações: listagem por cursor, contador de não lidas, marcação em lote e canal SSE (/stream)"""
+
+import pytest
+
+import VidaPlus
+
+@pytest.fixture
+def paciente_logado(api, login):
+    """Paciente recém-cadastrado (já com a notificação de boas-vindas) e seus cabeçalhos"""
+    paciente = api.paciente()
+    return paciente, login(paciente['email'], 'Paciente123!')
+
+def notificar(app, paciente, quantidade):
+    """Cria `quantidade` notificações num único lote (mesma data_criacao) e devolve o usuario_id"""
+    with app.app_context():
+        usuario_id = VidaPlus.db.session.get(VidaPlus.Paciente, paciente['id']).usuario_id
+        VidaPlus.criar_notificacoes_em_lote([(usuario_id, f'Aviso {numero}', 'Texto') for numero in range(quantidade)])
+    return usuario_id
+
+def test_listagem_por_cursor_e_contador_de_nao_lidas(app, cliente, paciente_logado):
+    paciente, cabecalhos = paciente_logado
+    notificar(app, paciente, 4)
+    
+    vistos = []
+    pagina = cliente.get('/api/notificacoes/?limite=2', headers=cabecalhos).get_json()
+    assert pagina['nao_lidas'] == 5
+    vistos += pagina['notificacoes']
+    while pagina['proximo_cursor']:
+        pagina = cliente.get(f"/api/notificacoes/?limite=2&cursor={pagina['proximo_cursor']}", headers=cabecalhos).get_json()
+        vistos += pagina['notificacoes']
+    ids = [notificacao['id'] for notificacao in vistos]
+    assert len(ids) == len(set(ids)) == 5
+    assert vistos[-1]['titulo'].startswith('Bem-vindo')
+    
+    marcar = cliente.patch('/api/notificacoes/lidas', json={'ids': ids[:2]}, headers=cabecalhos).get_json()
+    assert (marcar['marcadas'], marcar['nao_lidas']) == (2, 3)
+    # Repetir não conta duas vezes
+    assert cliente.patch('/api/notificacoes/lidas', json={'ids': ids[:2]}, headers=cabecalhos).get_json()['marcadas'] == 0
+    nao_lidas = cliente.get('/api/notificacoes/?nao_lidas=true', headers=cabecalhos).get_json()['notificacoes']
+    assert [notificacao['id'] for notificacao in nao_lidas] == ids[2:]
+    
+    assert cliente.patch('/api/notificacoes/lidas', json={}, headers=cabecalhos).get_json()['marcadas'] == 3
+    assert cliente.get('/api/notificacoes/nao-lidas', headers=cabecalhos).get_json() == {'nao_lidas': 0}
+
+def test_marcacao_so_alcanca_as_proprias_notificacoes_e_valida_o_corpo(app, cliente, api, login, paciente_logado):
+    paciente, cabecalhos = paciente_logado
+    outro = api.paciente(nome='Bruno Lima')
+    notificar(app, outro, 2)
+    alheias = [notificacao['id'] for notificacao in
+               cliente.get('/api/notificacoes/', headers=login(outro['email'], 'Paciente123!')).get_json()['notificacoes']]
+    
+    assert cliente.patch('/api/notificacoes/lidas', json={'ids': alheias}, headers=cabecalhos).get_json()['marcadas'] == 0
+    assert cliente.patch('/api/notificacoes/lidas', json={'ate': '2000-01-01T00:00:00'}, headers=cabecalhos).get_json()['marcadas'] == 0
+    
+    for corpo in ({'ids': []}, {'ids': ['1']}, {'ids': list(range(501))}, {'ate': 'ontem'}):
+        assert cliente.patch('/api/notificacoes/lidas', json=corpo, headers=cabecalhos).status_code == 400
+    assert cliente.get('/api/notificacoes/?cursor=invalido', headers=cabecalhos).status_code == 400
+    assert cliente.get('/api/notificacoes/').status_code == 401
+
+def test_stream_retoma_pelo_last_event_id_e_libera_ao_fechar(cliente, paciente_logado):
+    _, cabecalhos = paciente_logado
+    resposta = cliente.get('/api/notificacoes/stream', headers={**cabecalhos, 'Last-Event-ID': '0'}, buffered=False)
+    assert resposta.status_code == 200
+    assert resposta.mimetype == 'text/event-stream'
+    assert VidaPlus.hub_eventos.conexoes == 1
+    
+    corpo = (parte.decode() for parte in resposta.response)
+    assert next(corpo) == 'retry: 3000\n\n'
+    evento = next(corpo)
+    assert evento.startswith('id: ') and 'event: notificacao' in evento and 'Bem-vindo' in evento
+    
+    resposta.close()
+    assert VidaPlus.hub_eventos.conexoes == 0
+
+def test_stream_nao_lido_libera_a_conexao_ao_fechar(app, cliente, paciente_logado):
+    _, cabecalhos = paciente_logado
+    app.config['SSE_MAX_CONEXOES'] = 1
+    try:
+        primeira = cliente.get('/api/notificacoes/stream', headers=cabecalhos, buffered=False)
+        assert primeira.status_code == 200
+        recusada = cliente.get('/api/notificacoes/stream', headers=cabecalhos, buffered=False)
+        assert recusada.status_code == 503
+        assert recusada.headers['Retry-After'] == '30'
+        
+        # O corpo da primeira nunca foi lido: fechar a resposta basta para liberar a vaga
+        primeira.close()
+        segunda = cliente.get('/api/notificacoes/stream', headers=cabecalhos, buffered=False)
+        assert segunda.status_code == 200
+        segunda.close()
+    finally:
+        app.config['SSE_MAX_CONEXOES'] = 1000
+    assert VidaPlus.hub_eventos.conexoes == 0
+
+def test_erro_apos_assinar_libera_a_conexao(cliente, paciente_logado, monkeypatch):
+    _, cabecalhos = paciente_logado
+    def falhar(notificacao):
+        raise RuntimeError('falha simulada')
+    monkeypatch.setattr(VidaPlus, 'serializar_notificacao', falhar)
+    
+    resposta = cliente.get('/api/notificacoes/stream', headers={**cabecalhos, 'Last-Event-ID': '0'})
+    assert resposta.status_code == 500
+    assert 'falha simulada' in resposta.get_json()['erro']
+    assert VidaPlus.hub_eventos.conexoes == 0
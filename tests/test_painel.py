@@ -0,0 +1,83 @@
+"""Painel de indicadores: snapshot em segundo plano com stale-while-revalidate"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import VidaPlus
+
+@pytest.fixture
+def painel(app):
+    VidaPlus.painel_kpi.kpis = VidaPlus.painel_kpi.computed_at = None
+    yield VidaPlus.painel_kpi
+    VidaPlus.painel_kpi.kpis = VidaPlus.painel_kpi.computed_at = None
+    app.config['PAINEL_INTERVALO_SEGUNDOS'] = 60
+
+def test_painel_servido_do_snapshot(cliente, admin, api, painel):
+    paciente = api.paciente()
+    api.prescricao(paciente['id'], api.profissional()['id'])
+    
+    primeira = cliente.get('/api/relatorios/dashboard', headers=admin).get_json()
+    assert primeira['desatualizado'] is False
+    assert primeira['kpis']['prescricoes_ativas'] == 1
+    
+    # Novas escritas só aparecem no próximo recálculo: o snapshot é servido como está
+    api.prescricao(paciente['id'], api.profissional(nome='Dra. Beatriz Costa')['id'])
+    segunda = cliente.get('/api/relatorios/dashboard', headers=admin).get_json()
+    assert (segunda['computed_at'], segunda['kpis']) == (primeira['computed_at'], primeira['kpis'])
+
+def test_rajada_com_snapshot_vencido_dispara_uma_unica_revalidacao(app, cliente, admin, painel, monkeypatch):
+    cliente.get('/api/relatorios/dashboard', headers=admin)
+    app.config['PAINEL_INTERVALO_SEGUNDOS'] = 0
+    
+    liberar = threading.Event()
+    chamadas = []
+    def calcular_lento():
+        chamadas.append(1)
+        liberar.wait(5)
+        return {'recalculado': True}
+    monkeypatch.setattr(VidaPlus, 'calcular_kpis', calcular_lento)
+    
+    respostas = [cliente.get('/api/relatorios/dashboard', headers=admin).get_json()]
+    for _ in range(100):
+        if painel.lock.locked():
+            break
+        time.sleep(0.05)
+    # Com a revalidação em andamento, a rajada recebe o snapshot antigo sem disparar outras
+    respostas += [cliente.get('/api/relatorios/dashboard', headers=admin).get_json() for _ in range(4)]
+    assert all(resposta['desatualizado'] for resposta in respostas)
+    assert all('recalculado' not in resposta['kpis'] for resposta in respostas)
+    liberar.set()
+    with painel.lock:
+        pass
+    assert len(chamadas) == 1
+    assert painel.kpis == {'recalculado': True}
+
+def test_painel_exige_token_e_responde_500_se_o_calculo_falhar(cliente, admin, painel, monkeypatch):
+    assert cliente.get('/api/relatorios/dashboard').status_code == 401
+    def falhar():
+        raise RuntimeError('banco indisponível')
+    monkeypatch.setattr(VidaPlus, 'calcular_kpis', falhar)
+    resposta = cliente.get('/api/relatorios/dashboard', headers=admin)
+    assert resposta.status_code == 500
+    assert 'banco indisponível' in resposta.get_json()['erro']
+
+def test_importar_o_modulo_nao_inicia_tarefas(tmp_path):
+    ambiente = {
+        **os.environ,
+        'DATABASE_URL': 'sqlite:///' + str(tmp_path / 'vidaplus.db'),
+        'TAREFAS_BACKGROUND': 'true',
+        'SNAPSHOT_DIR': str(tmp_path / 'snapshots'),
+        'RELATORIOS_DIR': str(tmp_path / 'relatorios'),
+    }
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    resultado = subprocess.run(
+        [sys.executable, '-c', 'import threading, VidaPlus; print([t.name for t in threading.enumerate()])'],
+        cwd=raiz, env=ambiente, capture_output=True, text=True, timeout=120
+    )
+    assert resultado.returncode == 0, resultado.stderr
+    assert "['MainThread']" in resultado.stdout
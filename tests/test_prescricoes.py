@@ -0,0 +1,81 @@
+"""Prescrições: data_fim calculada da duração, ?ativas_em= e encerramento das vencidas"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import VidaPlus
+
+INICIO = datetime(2030, 1, 1, 9, 0)
+
+@pytest.mark.parametrize('duracao, dias', [
+    ('7 dias', 7),
+    ('por 10 dias', 10),
+    ('10 dias de uso', 10),
+    ('Durante 2 semanas', 14),
+    ('1 mês', 30),
+    ('3 meses', 90),
+    ('1 ano', 365),
+    ('15', 15),
+])
+def test_fim_por_duracao_reconhece_prazo_em_qualquer_posicao(duracao, dias):
+    assert VidaPlus.fim_por_duracao(INICIO, duracao) == INICIO + timedelta(days=dias)
+
+@pytest.mark.parametrize('duracao', [
+    'uso contínuo', 'Uso contínuo, reavaliar em 30 dias', 'tempo indeterminado', 'conforme orientação', '', None,
+])
+def test_fim_por_duracao_nulo_para_uso_continuo_ou_sem_prazo(duracao):
+    assert VidaPlus.fim_por_duracao(INICIO, duracao) is None
+
+def test_prescricao_com_prazo_vigora_ate_data_fim(cliente, admin, api):
+    paciente = api.paciente()
+    profissional = api.profissional()
+    prescricao = api.prescricao(paciente['id'], profissional['id'], duracao='por 10 dias')
+    continua = api.prescricao(paciente['id'], profissional['id'], medicamentos='Losartana 50mg', duracao='uso contínuo')
+    assert prescricao['data_fim'] is not None
+    assert continua['data_fim'] is None
+    
+    fim = datetime.fromisoformat(prescricao['data_fim'])
+    def ativas_em(dia):
+        resposta = cliente.get(f"/api/receitas/?paciente_id={paciente['id']}&ativas_em={dia:%Y-%m-%d}", headers=admin)
+        assert resposta.status_code == 200
+        return sorted(item['id'] for item in resposta.get_json()['prescricoes'])
+    
+    assert ativas_em(fim - timedelta(days=1)) == sorted([prescricao['id'], continua['id']])
+    assert ativas_em(fim + timedelta(days=1)) == [continua['id']]
+
+def test_ativas_em_e_status_invalidos(cliente, admin, api):
+    prescricao = api.prescricao(api.paciente()['id'], api.profissional()['id'])
+    assert cliente.get('/api/receitas/?ativas_em=01/02/2030', headers=admin).status_code == 400
+    resposta = cliente.put(f"/api/receitas/{prescricao['id']}", json={'status': 'suspensa'}, headers=admin)
+    assert resposta.status_code == 400
+
+def test_encerramento_fecha_vencidas_e_encerrar_antes_do_prazo_ajusta_data_fim(app, cliente, admin, api):
+    paciente = api.paciente()
+    profissional = api.profissional()
+    vencida = api.prescricao(paciente['id'], profissional['id'], duracao='5 dias')
+    vigente = api.prescricao(paciente['id'], profissional['id'], duracao='30 dias')
+    with app.app_context():
+        registro = VidaPlus.db.session.get(VidaPlus.Prescricao, vencida['id'])
+        registro.data_prescricao = datetime.utcnow() - timedelta(days=10)
+        VidaPlus.definir_data_fim(registro)
+        VidaPlus.db.session.commit()
+        
+        assert VidaPlus.encerrar_prescricoes_vencidas() == 1
+        status = dict(VidaPlus.db.session.query(VidaPlus.Prescricao.id, VidaPlus.Prescricao.status))
+    assert status == {vencida['id']: 'encerrada', vigente['id']: 'ativa'}
+    
+    resposta = cliente.put(f"/api/receitas/{vigente['id']}", json={'status': 'encerrada'}, headers=admin).get_json()
+    assert datetime.fromisoformat(resposta['prescricao']['data_fim']) <= datetime.utcnow()
+
+def test_nova_versao_das_regras_recalcula_datas_nulas(app, api):
+    prescricao = api.prescricao(api.paciente()['id'], api.profissional()['id'], duracao='10 dias de uso')
+    with app.app_context():
+        # Simula uma prescrição gravada pelas regras anteriores, que não reconheciam o texto
+        VidaPlus.db.session.get(VidaPlus.Prescricao, prescricao['id']).data_fim = None
+        VidaPlus.db.session.get(VidaPlus.Sequencia, 'regras_duracao').valor = 1
+        VidaPlus.db.session.commit()
+        
+        VidaPlus.preparar_banco()
+        registro = VidaPlus.db.session.get(VidaPlus.Prescricao, prescricao['id'])
+        assert registro.data_fim == registro.data_prescricao + timedelta(days=10)
@@ -0,0 +1,78 @@
+"""Relatórios assíncronos: fila persistente, execução pelos workers e download do resultado"""
+
+import pytest
+
+import VidaPlus
+
+def processar(app):
+    with app.app_context():
+        return VidaPlus.fila_relatorios.processar_proxima()
+
+def test_exportacao_csv_enfileirada_processada_e_baixada(app, cliente, admin, api):
+    paciente = api.paciente()
+    profissional = api.profissional()
+    consultas = [api.consulta(paciente['id'], profissional['id'], data_hora=f'2030-04-0{dia}T09:00:00') for dia in (1, 2)]
+    
+    resposta = cliente.post('/api/relatorios/jobs', json={
+        'tipo': 'consultas_csv', 'parametros': {'data_inicio': '2030-04-01', 'data_fim': '2030-04-30'}
+    }, headers=admin)
+    assert resposta.status_code == 202
+    corpo = resposta.get_json()
+    assert corpo['mensagem'] == 'Relatório enfileirado'
+    assert corpo['tarefa']['status'] == 'pendente'
+    assert resposta.headers['Location'] == f"/api/relatorios/jobs/{corpo['tarefa']['id']}"
+    
+    assert cliente.get(f"{resposta.headers['Location']}/resultado", headers=admin).status_code == 409
+    assert processar(app) is True
+    assert processar(app) is False
+    
+    tarefa = cliente.get(resposta.headers['Location'], headers=admin).get_json()['tarefa']
+    assert (tarefa['status'], tarefa['progresso']) == ('concluida', 100)
+    
+    arquivo = cliente.get(tarefa['resultado'], headers=admin)
+    assert arquivo.status_code == 200
+    linhas = arquivo.get_data(as_text=True).splitlines()
+    assert linhas[0].startswith('id,data_hora')
+    assert [int(linha.split(',')[0]) for linha in linhas[1:]] == [consulta['id'] for consulta in consultas]
+    
+    parcial = cliente.get(tarefa['resultado'], headers={**admin, 'Range': 'bytes=0-1'})
+    assert (parcial.status_code, parcial.get_data()) == (206, b'id')
+
+def test_parametros_invalidos_terminam_a_tarefa_com_erro(app, cliente, admin):
+    resposta = cliente.post('/api/relatorios/jobs', json={
+        'tipo': 'consultas_csv', 'parametros': {'data_inicio': 'ontem'}
+    }, headers=admin)
+    assert resposta.status_code == 202
+    processar(app)
+    tarefa = cliente.get(resposta.headers['Location'], headers=admin).get_json()['tarefa']
+    assert tarefa['status'] == 'erro'
+    assert tarefa['erro']
+    assert cliente.get(f"{resposta.headers['Location']}/resultado", headers=admin).status_code == 409
+
+def test_validacao_limite_e_acesso_de_outro_usuario(app, cliente, admin, api, login):
+    assert cliente.post('/api/relatorios/jobs', json={'tipo': 'outro'}, headers=admin).status_code == 400
+    assert cliente.post('/api/relatorios/jobs', json={'tipo': 'consultas', 'parametros': ['mes']}, headers=admin).status_code == 400
+    
+    app.config['RELATORIOS_MAX_PENDENTES'] = 1
+    try:
+        primeira = cliente.post('/api/relatorios/jobs', json={'tipo': 'consultas'}, headers=admin)
+        assert primeira.status_code == 202
+        assert cliente.post('/api/relatorios/jobs', json={'tipo': 'consultas'}, headers=admin).status_code == 429
+    finally:
+        app.config['RELATORIOS_MAX_PENDENTES'] = 5
+    
+    paciente = api.paciente()
+    outro = login(paciente['email'], 'Paciente123!')
+    assert cliente.get(primeira.headers['Location'], headers=outro).status_code == 404
+    assert cliente.get('/api/relatorios/jobs/999', headers=admin).status_code == 404
+
+def test_resultado_expirado_responde_410(app, cliente, admin):
+    resposta = cliente.post('/api/relatorios/jobs', json={'tipo': 'consultas'}, headers=admin)
+    processar(app)
+    tarefa_id = resposta.get_json()['tarefa']['id']
+    with app.app_context():
+        tarefa = VidaPlus.db.session.get(VidaPlus.TarefaRelatorio, tarefa_id)
+        tarefa.expira_em = VidaPlus.datetime.utcnow() - VidaPlus.timedelta(minutes=1)
+        VidaPlus.db.session.commit()
+        assert VidaPlus.limpar_relatorios_expirados() == 1
+    assert cliente.get(f'/api/relatorios/jobs/{tarefa_id}/resultado', headers=admin).status_code == 410
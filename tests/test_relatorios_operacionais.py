@@ -0,0 +1,51 @@
+"""Relatórios operacionais agregados no banco (consultas, cancelamentos e prescrições)"""
+
+from datetime import datetime, timedelta
+
+def linhas(cliente, admin, caminho, **parametros):
+    resposta = cliente.get(caminho, query_string=parametros, headers=admin)
+    assert resposta.status_code == 200, resposta.get_json()
+    return [(linha['periodo'], linha['grupo'], linha['total']) for linha in resposta.get_json()['linhas']]
+
+def test_consultas_por_semana_mes_e_especialidade(cliente, admin, api):
+    paciente = api.paciente()
+    carlos = api.profissional(nome='Dr. Carlos Mendes', especialidade='Cardiologia')
+    beatriz = api.profissional(nome='Dra. Beatriz Costa', especialidade='Cardiologia')
+    paulo = api.profissional(nome='Dr. Paulo Reis', especialidade='Dermatologia')
+    # 03/06/2030 é uma segunda-feira; o domingo 09/06 ainda pertence à mesma semana
+    for profissional, data_hora in ((carlos, '2030-06-03T09:00:00'), (beatriz, '2030-06-05T09:00:00'),
+                                    (paulo, '2030-06-09T09:00:00'), (carlos, '2030-06-10T09:00:00'),
+                                    (carlos, '2030-07-01T09:00:00')):
+        api.consulta(paciente['id'], profissional['id'], data_hora=data_hora)
+    intervalo = {'data_inicio': '2030-06-01', 'data_fim': '2030-06-30'}
+    
+    assert linhas(cliente, admin, '/api/relatorios/consultas', periodo='semana', agrupar_por='especialidade', **intervalo) == [
+        ('2030-06-03', 'Cardiologia', 2), ('2030-06-03', 'Dermatologia', 1), ('2030-06-10', 'Cardiologia', 1)
+    ]
+    assert linhas(cliente, admin, '/api/relatorios/consultas', periodo='mes', agrupar_por='profissional', **intervalo) == [
+        ('2030-06-01', 'Dr. Carlos Mendes', 2), ('2030-06-01', 'Dr. Paulo Reis', 1), ('2030-06-01', 'Dra. Beatriz Costa', 1)
+    ]
+    assert linhas(cliente, admin, '/api/relatorios/consultas', periodo='mes', agrupar_por='unidade', **intervalo)[0][2] == 4
+
+def test_taxa_de_cancelamento_e_prescricoes_por_profissional(cliente, admin, api):
+    paciente = api.paciente()
+    profissional = api.profissional()
+    consultas = [api.consulta(paciente['id'], profissional['id'], data_hora=f'2030-06-0{dia}T09:00:00') for dia in (3, 4, 5, 6)]
+    cliente.put(f"/api/consultas/{consultas[0]['id']}", json={'status': 'cancelada'}, headers=admin)
+    cliente.put(f"/api/consultas/{consultas[1]['id']}", json={'status': 'realizada'}, headers=admin)
+    
+    resposta = cliente.get('/api/relatorios/cancelamentos?periodo=mes&data_inicio=2030-06-01&data_fim=2030-06-30', headers=admin)
+    linha, = resposta.get_json()['linhas']
+    assert (linha['total'], linha['canceladas'], linha['realizadas'], linha['taxa_cancelamento']) == (4, 1, 1, 0.25)
+    
+    api.prescricao(paciente['id'], profissional['id'])
+    api.prescricao(paciente['id'], profissional['id'])
+    hoje = datetime.utcnow().date()
+    assert linhas(cliente, admin, '/api/relatorios/prescricoes', data_inicio=(hoje - timedelta(days=1)).isoformat(),
+                  data_fim=(hoje + timedelta(days=1)).isoformat()) == [(hoje.isoformat(), profissional['nome'], 2)]
+
+def test_parametros_invalidos(cliente, admin):
+    assert cliente.get('/api/relatorios/prescricoes?agrupar_por=unidade', headers=admin).status_code == 400
+    assert cliente.get('/api/relatorios/cancelamentos?periodo=trimestre', headers=admin).status_code == 400
+    assert cliente.get('/api/relatorios/cancelamentos?data_inicio=2030-06-30&data_fim=2030-06-01', headers=admin).status_code == 400
+    assert cliente.get('/api/relatorios/consultas').status_code == 401
@@ -0,0 +1,52 @@
+"""Resumos diários mantidos na transação das escritas e os relatórios lidos deles"""
+
+from datetime import date
+
+from sqlalchemy import event
+
+import VidaPlus
+
+def linhas_resumo(app):
+    with app.app_context():
+        return sorted(tuple(linha) for linha in VidaPlus.db.session.query(
+            VidaPlus.ResumoConsultaDiario.dia, VidaPlus.ResumoConsultaDiario.status, VidaPlus.ResumoConsultaDiario.total
+        ).filter(VidaPlus.ResumoConsultaDiario.total != 0))
+
+def test_resumo_acompanha_as_escritas_e_bate_com_a_reconstrucao(app, cliente, admin, api):
+    paciente = api.paciente()
+    profissional = api.profissional()
+    consultas = [api.consulta(paciente['id'], profissional['id'], data_hora=f'2030-05-0{dia}T09:00:00') for dia in (1, 1, 2)]
+    cliente.put(f"/api/consultas/{consultas[1]['id']}", json={'status': 'cancelada'}, headers=admin)
+    cliente.delete(f"/api/consultas/{consultas[2]['id']}", headers=admin)
+    
+    mantido = linhas_resumo(app)
+    assert mantido == [(date(2030, 5, 1), 'agendada', 1), (date(2030, 5, 1), 'cancelada', 1)]
+    with app.app_context():
+        VidaPlus.reconstruir_resumos()
+    assert linhas_resumo(app) == mantido
+    
+    relatorio = cliente.get('/api/relatorios/consultas?agrupar_por=profissional&data_inicio=2030-05-01&data_fim=2030-05-31',
+                            headers=admin).get_json()
+    assert [(linha['periodo'], linha['total']) for linha in relatorio['linhas']] == [('2030-05-01', 2)]
+
+def test_ajuste_e_um_unico_upsert(app):
+    chave = {'dia': date(2031, 1, 1), 'unidade_id': 1, 'profissional_id': 1, 'status': 'agendada', 'tipo': 'presencial'}
+    with app.app_context():
+        comandos = []
+        def registrar(conexao, cursor, sql, parametros, contexto, executemany):
+            comandos.append(sql)
+        event.listen(VidaPlus.db.engine, 'before_cursor_execute', registrar)
+        try:
+            VidaPlus.ajustar_resumo(VidaPlus.ResumoConsultaDiario, chave, 1)
+            VidaPlus.ajustar_resumo(VidaPlus.ResumoConsultaDiario, chave, 2)
+        finally:
+            event.remove(VidaPlus.db.engine, 'before_cursor_execute', registrar)
+        total = VidaPlus.db.session.get(VidaPlus.ResumoConsultaDiario, tuple(chave.values())).total
+        VidaPlus.db.session.rollback()
+    assert total == 3
+    assert [comando.split()[0] for comando in comandos] == ['INSERT', 'INSERT']
+    assert all('ON CONFLICT' in comando for comando in comandos)
+
+def test_relatorio_rejeita_parametros_invalidos(cliente, admin):
+    for parametros in ('agrupar_por=paciente', 'periodo=ano', 'status=perdida', 'data_inicio=ontem'):
+        assert cliente.get(f'/api/relatorios/consultas?{parametros}', headers=admin).status_code == 400
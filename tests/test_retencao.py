@@ -0,0 +1,64 @@
+"""Retenção: purgas em faixas da chave primária, contadores e relatório de espaço recuperado"""
+
+from datetime import datetime, timedelta
+
+import VidaPlus
+
+def envelhecer(modelo, coluna, dias, *condicoes):
+    VidaPlus.db.session.execute(modelo.__table__.update().where(*condicoes).values(
+        {coluna: datetime.utcnow() - timedelta(days=dias)}
+    ))
+    VidaPlus.db.session.commit()
+
+def test_purga_em_faixas_para_na_primeira_linha_mais_nova(app, cliente):
+    with app.app_context():
+        usuario_id = VidaPlus.Usuario.query.first().id
+        notificacoes = VidaPlus.criar_notificacoes_em_lote([(usuario_id, f'Aviso {numero}', 'Texto') for numero in range(7)])
+        ids = [notificacao.id for notificacao in notificacoes]
+        envelhecer(VidaPlus.Notificacao, 'data_criacao', 400, VidaPlus.Notificacao.id.in_(ids[:5]))
+        
+        removidas = VidaPlus.purgar_em_lotes(
+            VidaPlus.Notificacao, VidaPlus.Notificacao.data_criacao, datetime.utcnow() - timedelta(days=365),
+            antes_de_excluir=VidaPlus.descontar_nao_lidas, tamanho_lote=2, pausa=0
+        )
+        restantes = [notificacao_id for notificacao_id, in VidaPlus.db.session.query(VidaPlus.Notificacao.id).filter(
+            VidaPlus.Notificacao.usuario_id == usuario_id
+        )]
+        assert removidas == 5
+        assert restantes == ids[5:]
+        assert VidaPlus.contar_nao_lidas(usuario_id) == 2
+        
+        assert VidaPlus.purgar_em_lotes(VidaPlus.Notificacao, VidaPlus.Notificacao.data_criacao, datetime(2000, 1, 1)) == 0
+
+def test_aplicar_retencao_respeita_as_politicas(app, cliente, admin, api, login):
+    ana = api.paciente()
+    api.paciente(nome='Bruno Lima')
+    cliente.patch('/api/notificacoes/lidas', json={}, headers=login(ana['email'], 'Paciente123!'))
+    with app.app_context():
+        # Com 100 dias, só as lidas venceram (90 dias); as não lidas ficam até 365
+        envelhecer(VidaPlus.Notificacao, 'data_criacao', 100)
+        envelhecer(VidaPlus.Alteracao, 'data_hora', 40)
+        lidas = VidaPlus.Notificacao.query.filter_by(lida=True).count()
+        nao_lidas = VidaPlus.Notificacao.query.filter_by(lida=False).count()
+        alteracoes = VidaPlus.Alteracao.query.count()
+        assert lidas and nao_lidas
+        
+        relatorio = VidaPlus.aplicar_retencao()
+        
+        assert relatorio['linhas_removidas']['notificacoes_lidas'] == lidas
+        assert relatorio['linhas_removidas']['notificacoes'] == 0
+        assert VidaPlus.Notificacao.query.count() == nao_lidas
+        # O feed mantém a alteração mais recente para que consumidores atrasados recebam 410
+        assert relatorio['linhas_removidas']['alteracoes'] == alteracoes - 1
+        assert VidaPlus.Alteracao.query.count() == 1
+        assert relatorio['bytes_recuperados'] >= 0 and relatorio['bytes_livres'] >= 0
+    assert cliente.get('/api/changes?since=0', headers=admin).status_code == 410
+
+def test_comando_purgar_dados_e_lease(app, cliente):
+    resultado = app.test_cli_runner().invoke(args=['purgar-dados'])
+    assert resultado.exit_code == 0, resultado.output
+    assert 'linhas removidas' in resultado.output and 'bytes recuperados' in resultado.output
+    
+    with app.app_context():
+        assert VidaPlus.obter_lideranca('retencao', 'outro-processo', 600)
+        assert VidaPlus.executar_retencao() is None
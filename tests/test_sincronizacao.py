@@ -0,0 +1,64 @@
+"""Sincronização incremental (?modified_since=): registros alterados, tombstones e marcas inválidas"""
+
+from datetime import datetime, timedelta
+
+import VidaPlus
+
+def envelhecer(app, modelo, horas=1):
+    """Recua o atualizado_em de todos os registros, como se tivessem sido gravados há `horas`"""
+    with app.app_context():
+        VidaPlus.db.session.execute(modelo.__table__.update().values(atualizado_em=datetime.utcnow() - timedelta(hours=horas)))
+        VidaPlus.db.session.commit()
+
+def test_consultas_alteradas_e_excluidas_desde_a_marca(app, cliente, admin, api):
+    paciente = api.paciente()
+    outro = api.paciente(nome='Bruno Lima')
+    profissional = api.profissional()
+    alterada = api.consulta(paciente['id'], profissional['id'], data_hora='2030-01-10T10:00:00')
+    excluida = api.consulta(paciente['id'], profissional['id'], data_hora='2030-01-11T10:00:00')
+    api.consulta(paciente['id'], profissional['id'], data_hora='2030-01-12T10:00:00')
+    de_outro = api.consulta(outro['id'], profissional['id'], data_hora='2030-01-13T10:00:00')
+    envelhecer(app, VidaPlus.Consulta)
+    marca = (datetime.utcnow() - timedelta(minutes=30)).isoformat()
+    
+    cliente.put(f"/api/consultas/{alterada['id']}", json={'status': 'realizada'}, headers=admin)
+    cliente.delete(f"/api/consultas/{excluida['id']}", headers=admin)
+    cliente.delete(f"/api/consultas/{de_outro['id']}", headers=admin)
+    
+    resposta = cliente.get(f"/api/consultas/?paciente_id={paciente['id']}&modified_since={marca}", headers=admin)
+    assert resposta.status_code == 200
+    dados = resposta.get_json()
+    assert [(consulta['id'], consulta['status']) for consulta in dados['consultas']] == [(alterada['id'], 'realizada')]
+    assert dados['excluidos'] == [excluida['id']]
+    assert datetime.fromisoformat(dados['sincronizado_em']) <= datetime.utcnow() - VidaPlus.MARGEM_SINCRONIZACAO
+    
+    # Sem escritas desde a marca devolvida, a próxima sincronização só repete a margem
+    seguinte = cliente.get(f"/api/consultas/?paciente_id={paciente['id']}&modified_since={dados['sincronizado_em']}",
+                           headers=admin).get_json()
+    assert {consulta['id'] for consulta in seguinte['consultas']} <= {alterada['id']}
+    assert 'excluidos' not in cliente.get(f"/api/consultas/?paciente_id={paciente['id']}", headers=admin).get_json()
+
+def test_prescricoes_alteradas_e_excluidas_desde_a_marca(app, cliente, admin, api):
+    paciente = api.paciente()
+    profissional = api.profissional()
+    alterada = api.prescricao(paciente['id'], profissional['id'])
+    excluida = api.prescricao(paciente['id'], profissional['id'], medicamentos='Amoxicilina 500mg')
+    api.prescricao(paciente['id'], profissional['id'], medicamentos='Losartana 50mg')
+    envelhecer(app, VidaPlus.Prescricao)
+    marca = (datetime.utcnow() - timedelta(minutes=30)).isoformat() + 'Z'
+    
+    cliente.put(f"/api/receitas/{alterada['id']}", json={'observacoes': 'Após as refeições'}, headers=admin)
+    cliente.delete(f"/api/receitas/{excluida['id']}", headers=admin)
+    
+    dados = cliente.get(f"/api/receitas/?paciente_id={paciente['id']}&modified_since={marca}", headers=admin).get_json()
+    assert [prescricao['id'] for prescricao in dados['prescricoes']] == [alterada['id']]
+    assert dados['excluidos'] == [excluida['id']]
+
+def test_marca_invalida_ou_anterior_a_retencao(app, cliente, admin):
+    for url in ('/api/consultas/', '/api/receitas/'):
+        assert cliente.get(f'{url}?modified_since=ontem', headers=admin).status_code == 400
+        
+        antiga = (datetime.utcnow() - timedelta(days=app.config['RETENCAO_EXCLUSOES_DIAS'] + 1)).isoformat()
+        resposta = cliente.get(f'{url}?modified_since={antiga}', headers=admin)
+        assert resposta.status_code == 410
+        assert 'sincronização completa' in resposta.get_json()['erro']
@@ -0,0 +1,50 @@
+"""Snapshots colunares para BI: pseudonimização e exportação incremental pela marca d'água"""
+
+import hashlib
+import hmac
+import os
+
+import pytest
+
+import VidaPlus
+
+@pytest.fixture
+def chave(app):
+    app.config['SNAPSHOT_PSEUDONIMO_CHAVE'] = 'chave-exclusiva-dos-pseudonimos'
+    yield app.config['SNAPSHOT_PSEUDONIMO_CHAVE']
+    app.config['SNAPSHOT_PSEUDONIMO_CHAVE'] = ''
+
+@pytest.mark.parametrize('valor', ['', 'SECRET_KEY', 'JWT_SECRET_KEY'])
+def test_exportacao_recusada_sem_chave_exclusiva(app, cliente, tmp_path, valor):
+    app.config['SNAPSHOT_PSEUDONIMO_CHAVE'] = app.config[valor] if valor else ''
+    with app.app_context(), pytest.raises(RuntimeError, match='SNAPSHOT_PSEUDONIMO_CHAVE'):
+        VidaPlus.exportar_snapshot(str(tmp_path))
+    app.config['SNAPSHOT_PSEUDONIMO_CHAVE'] = ''
+    assert os.listdir(tmp_path) == []
+
+def test_snapshot_completo_e_incremental(app, cliente, admin, api, chave, tmp_path):
+    paciente = api.paciente()
+    profissional = api.profissional()
+    primeira = api.consulta(paciente['id'], profissional['id'], data_hora='2030-03-01T10:00:00')
+    segunda = api.consulta(paciente['id'], profissional['id'], data_hora='2030-03-02T10:00:00')
+    
+    with app.app_context():
+        completo = VidaPlus.exportar_snapshot(str(tmp_path))
+    assert completo['tipo'] == 'completo'
+    assert completo['tabelas']['consultas']['linhas'] == 2
+    
+    # Pseudônimo com a chave dedicada, e não com a SECRET_KEY pública
+    esperado = hmac.new(chave.encode(), f"paciente:{paciente['id']}".encode(), hashlib.sha256).hexdigest()[:16]
+    publico = hmac.new(app.config['SECRET_KEY'].encode(), f"paciente:{paciente['id']}".encode(), hashlib.sha256).hexdigest()[:16]
+    with app.app_context():
+        assert VidaPlus.pseudonimo_paciente(paciente['id']) == esperado != publico
+    
+    cliente.put(f"/api/consultas/{segunda['id']}", json={'status': 'cancelada'}, headers=admin)
+    cliente.delete(f"/api/consultas/{primeira['id']}", headers=admin)
+    with app.app_context():
+        incremental = VidaPlus.exportar_snapshot(str(tmp_path))
+    assert incremental['tipo'] == 'incremental'
+    assert incremental['marca_dagua_anterior'] == completo['marca_dagua']
+    assert incremental['tabelas']['consultas']['linhas'] == 1
+    assert incremental['tabelas']['consultas']['excluidos'] == [primeira['id']]
+    assert incremental['tabelas']['profissionais']['linhas'] == 0
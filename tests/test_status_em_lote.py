@@ -0,0 +1,85 @@
+"""Alteração de status em lote (/api/consultas/status-em-lote): simulação, cancelamento, reagendamento e validações"""
+
+URL = '/api/consultas/status-em-lote'
+
+def cenario(api):
+    """Duas consultas do profissional no intervalo, uma fora dele e uma de outro profissional"""
+    paciente = api.paciente()
+    profissional = api.profissional()
+    outro = api.profissional(nome='Dra. Marina Alves')
+    afetadas = [api.consulta(paciente['id'], profissional['id'], data_hora=f'2030-01-1{dia}T10:00:00')['id'] for dia in (0, 1)]
+    fora = [
+        api.consulta(paciente['id'], profissional['id'], data_hora='2030-02-10T10:00:00')['id'],
+        api.consulta(paciente['id'], outro['id'], data_hora='2030-01-10T11:00:00')['id'],
+    ]
+    filtros = {'profissional_id': profissional['id'], 'data_inicio': '2030-01-01', 'data_fim': '2030-01-31'}
+    return paciente, afetadas, fora, filtros
+
+def consultas_por_id(cliente, admin, paciente_id):
+    consultas = cliente.get(f'/api/consultas/?paciente_id={paciente_id}', headers=admin).get_json()['consultas']
+    return {consulta['id']: consulta for consulta in consultas}
+
+def test_cancelamento_em_lote_notifica_e_audita_uma_vez(cliente, admin, api, login):
+    paciente, afetadas, fora, filtros = cenario(api)
+    
+    simulacao = cliente.post(URL, json={**filtros, 'acao': 'cancelar', 'simular': True}, headers=admin).get_json()
+    assert simulacao == {'simulacao': True, 'acao': 'cancelar', 'total': 2}
+    assert {consulta['status'] for consulta in consultas_por_id(cliente, admin, paciente['id']).values()} == {'agendada'}
+    
+    resposta = cliente.post(URL, json={**filtros, 'acao': 'cancelar', 'motivo': 'Profissional afastado'}, headers=admin)
+    assert resposta.status_code == 200
+    assert sorted(resposta.get_json()['consultas']) == sorted(afetadas)
+    
+    consultas = consultas_por_id(cliente, admin, paciente['id'])
+    assert [consultas[consulta_id]['status'] for consulta_id in afetadas] == ['cancelada', 'cancelada']
+    assert [consultas[consulta_id]['status'] for consulta_id in fora] == ['agendada', 'agendada']
+    
+    notificacoes = cliente.get('/api/notificacoes/', headers=login(paciente['email'], 'Paciente123!')).get_json()['notificacoes']
+    canceladas = [notificacao for notificacao in notificacoes if notificacao['titulo'] == 'Consulta cancelada']
+    assert len(canceladas) == 2
+    assert all('Motivo: Profissional afastado.' in notificacao['mensagem'] for notificacao in canceladas)
+    
+    registro, = cliente.get('/api/auditoria/?tabela=consultas&acao=UPDATE_LOTE', headers=admin).get_json()['registros']
+    assert (registro['dados_novos']['total'], sorted(registro['dados_novos']['consultas'])) == (2, sorted(afetadas))
+    
+    eventos = cliente.get('/api/changes?since=0&limit=1000', headers=admin).get_json()['alteracoes']
+    assert sorted(evento['registro_id'] for evento in eventos if evento['tabela'] == 'consultas' and evento['operacao'] == 'UPDATE') == sorted(afetadas)
+
+def test_reagendamento_desloca_as_consultas(cliente, admin, api, login):
+    paciente, afetadas, fora, filtros = cenario(api)
+    
+    resposta = cliente.post(URL, json={**filtros, 'acao': 'reagendar', 'deslocamento_dias': 7}, headers=admin)
+    assert resposta.get_json()['total'] == 2
+    
+    consultas = consultas_por_id(cliente, admin, paciente['id'])
+    assert [consultas[consulta_id]['data_hora'] for consulta_id in afetadas] == ['2030-01-17T10:00:00', '2030-01-18T10:00:00']
+    assert {consultas[consulta_id]['status'] for consulta_id in afetadas} == {'agendada'}
+    assert consultas[fora[0]]['data_hora'] == '2030-02-10T10:00:00'
+    
+    notificacoes = cliente.get('/api/notificacoes/', headers=login(paciente['email'], 'Paciente123!')).get_json()['notificacoes']
+    assert any(notificacao['titulo'] == 'Consulta reagendada' and 'de 10/01/2030 às 10:00 foi reagendada para 17/01/2030' in notificacao['mensagem']
+               for notificacao in notificacoes)
+    
+    # As consultas deslocadas saíram do período de 1 a 15/01: nada mais a alterar nele
+    assert cliente.post(URL, json={**filtros, 'data_fim': '2030-01-15', 'acao': 'cancelar'}, headers=admin).get_json()['total'] == 0
+
+def test_validacoes_e_acesso(cliente, admin, api, login):
+    paciente, afetadas, fora, filtros = cenario(api)
+    
+    for corpo in (
+        {},
+        {**filtros, 'acao': 'excluir'},
+        {'acao': 'cancelar', 'data_inicio': '2030-01-01', 'data_fim': '2030-01-31'},
+        {**filtros, 'acao': 'cancelar', 'data_fim': None},
+        {**filtros, 'acao': 'cancelar', 'data_inicio': '2030-02-01'},
+        {**filtros, 'acao': 'reagendar'},
+        {**filtros, 'acao': 'reagendar', 'deslocamento_dias': 0},
+        {**filtros, 'acao': 'reagendar', 'deslocamento_dias': True},
+        {**filtros, 'acao': 'reagendar', 'deslocamento_dias': 366},
+    ):
+        assert cliente.post(URL, json=corpo, headers=admin).status_code == 400, corpo
+    
+    assert cliente.post(URL, json={**filtros, 'acao': 'cancelar'}, headers=login(paciente['email'], 'Paciente123!')).status_code == 403
+    assert cliente.post(URL, json={**filtros, 'acao': 'cancelar'}).status_code == 401
+    assert {consulta['status'] for consulta in consultas_por_id(cliente, admin, paciente['id']).values()} == {'agendada'}
+    assert cliente.get('/api/auditoria/?tabela=consultas&acao=UPDATE_LOTE', headers=admin).get_json()['registros'] == []